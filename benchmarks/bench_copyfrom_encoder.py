@@ -0,0 +1,92 @@
+"""Benchmark of the COPY FROM csv encoders used by `Dataset.upload`.
+
+Compares the rows/second of the legacy row by row generator (`iterrows`)
+against the columnar encoder in `cartoframes.data.encoders`.
+
+Usage:
+
+    python benchmarks/bench_copyfrom_encoder.py [--rows 100000 1000000 5000000]
+"""
+from __future__ import print_function
+
+import argparse
+import binascii
+import struct
+import time
+
+import numpy as np
+import pandas as pd
+
+from cartoframes.data.encoders import csv_chunks
+from cartoframes.data.utils import decode_geometry
+
+
+def legacy_rows(df, cols, geom_col):
+    """Row generator used by `Dataset._copyfrom` before the columnar encoder"""
+    for i, row in df.iterrows():
+        csv_row = ''
+        the_geom_val = None
+        for col in cols:
+            val = row[col]
+            if pd.isnull(val) or val is None:
+                val = ''
+            if col == geom_col:
+                the_geom_val = row[col]
+            else:
+                csv_row += '{val}|'.format(val=val)
+
+        if the_geom_val is not None:
+            geom = decode_geometry(the_geom_val)
+            if geom:
+                csv_row += 'SRID=4326;{geom}'.format(geom=geom.wkt)
+
+        csv_row += '\n'
+        yield csv_row.encode()
+
+
+def make_dataframe(rows):
+    rng = np.random.RandomState(0)
+    lng = rng.uniform(-180, 180, rows)
+    lat = rng.uniform(-90, 90, rows)
+    return pd.DataFrame({
+        'id': np.arange(rows),
+        'value': rng.normal(size=rows),
+        'name': rng.choice(['alpha', 'beta', 'gamma|delta', None], rows),
+        'flag': rng.rand(rows) > 0.5,
+        'date': pd.Timestamp('2019-01-01') + pd.to_timedelta(rng.randint(0, 10 ** 6, rows), unit='s'),
+        'geom': ['0101000000' + binascii.hexlify(struct.pack('<dd', x, y)).decode() for x, y in zip(lng, lat)]
+    })
+
+
+def measure(generator):
+    start = time.time()
+    size = sum(len(chunk) for chunk in generator)
+    return time.time() - start, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000, 5000000])
+    parser.add_argument('--legacy-max-rows', type=int, default=1000000,
+                        help='skip the legacy generator above this size (it takes minutes)')
+    args = parser.parse_args()
+
+    columns = ['id', 'value', 'name', 'flag', 'date']
+    print('{:>10} {:>12} {:>16} {:>16} {:>8}'.format('rows', 'encoder', 'rows/s', 'MB', 'speedup'))
+
+    for rows in args.rows:
+        df = make_dataframe(rows)
+
+        elapsed, size = measure(csv_chunks(df, columns, 'geom'))
+        columnar = rows / elapsed
+        print('{:>10} {:>12} {:>16,.0f} {:>16.1f} {:>8}'.format(rows, 'columnar', columnar, size / 1e6, ''))
+
+        if rows <= args.legacy_max_rows:
+            elapsed, size = measure(legacy_rows(df, columns + ['geom'], 'geom'))
+            legacy = rows / elapsed
+            print('{:>10} {:>12} {:>16,.0f} {:>16.1f} {:>7.1f}x'.format(
+                rows, 'iterrows', legacy, size / 1e6, columnar / legacy))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,5 @@
+import sys
+
 from .context import CartoContext
 from .credentials import Credentials
 from .layer import BaseMap, QueryLayer, Layer
@@ -14,3 +16,7 @@ __all__ = [
     'Layer',
     'BinMethod'
 ]
+
+if sys.version_info >= (3, 5):
+    from .async_context import AsyncCartoContext  # noqa
+    __all__.append('AsyncCartoContext')
@@ -0,0 +1,89 @@
+"""What a context checks of a CARTO account when it's created: that the API
+key is valid and whether the user belongs to an organization"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from threading import Lock
+
+ACCOUNT_CACHE_FILE_NAME = 'accounts.json'
+
+
+class AccountCache(object):
+    """Accounts already checked, by base URL and API key.
+
+    They are kept in memory for the life of the process and, with a `ttl`,
+    in a file in `directory` for `ttl` seconds, so short-lived processes
+    don't check the same account every time. API keys are only stored
+    hashed.
+    """
+    def __init__(self, directory):
+        self.path = os.path.join(directory, ACCOUNT_CACHE_FILE_NAME)
+        self._accounts = {}
+        self._lock = Lock()
+
+    def get(self, base_url, api_key, ttl=None):
+        """Account data (`is_org`) for the credentials, or None if they weren't checked"""
+        key = _account_key(base_url, api_key)
+        with self._lock:
+            account = self._accounts.get(key)
+
+        if account is None and ttl:
+            account = self._read_file().get(key)
+            if account is None or account['checked_at'] + ttl < time.time():
+                return None
+
+            with self._lock:
+                self._accounts[key] = account
+
+        return account
+
+    def set(self, base_url, api_key, is_org, ttl=None):
+        key = _account_key(base_url, api_key)
+        account = {'is_org': is_org, 'checked_at': time.time()}
+        with self._lock:
+            self._accounts[key] = account
+
+        if ttl:
+            now = time.time()
+            accounts = {k: a for k, a in self._read_file().items() if a['checked_at'] + ttl >= now}
+            accounts[key] = account
+            self._write_file(accounts)
+
+    def invalidate(self, base_url, api_key):
+        """Forget the credentials, to check them again"""
+        key = _account_key(base_url, api_key)
+        with self._lock:
+            self._accounts.pop(key, None)
+
+        accounts = self._read_file()
+        if accounts.pop(key, None) is not None:
+            self._write_file(accounts)
+
+    def _read_file(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write_file(self, accounts):
+        directory = os.path.dirname(self.path)
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+
+            # write to a temporary file first, so an interrupted write is never read
+            fd, tmp_path = tempfile.mkstemp(dir=directory)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(accounts, f)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError):
+            # the cache is only an optimization
+            pass
+
+
+def _account_key(base_url, api_key):
+    return hashlib.sha256('{}|{}'.format(base_url, api_key).encode('utf-8')).hexdigest()
@@ -0,0 +1,85 @@
+"""CartoContext with coroutine versions of its network methods, to use with
+asyncio (Python 3.5+)"""
+import asyncio
+import functools
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .context import CartoContext
+from .data import Dataset
+from .session import create_session, DEFAULT_POOL_SIZE
+
+# concurrent calls to the APIs of a context
+DEFAULT_MAX_WORKERS = 10
+
+
+class AsyncCartoContext(CartoContext):
+    """:py:class:`CartoContext <cartoframes.context.CartoContext>` whose
+    `afetch`, `aexecute`, `aread`, `aupload` and `adownload` coroutines run
+    the SQL, COPY and Batch API calls concurrently, so many reads and writes
+    can be awaited together from notebooks and services.
+
+    The CARTO clients are blocking, so the calls are run in a pool of
+    `max_workers` threads sharing the connections of the context session.
+
+    Example:
+
+        .. code:: python
+
+            import asyncio
+            from cartoframes import AsyncCartoContext
+
+            acc = AsyncCartoContext(BASEURL, APIKEY)
+            dfs = await asyncio.gather(*[acc.afetch(query) for query in queries])
+    """
+    def __init__(self, base_url=None, api_key='default_public', creds=None, session=None,
+                 verbose=0, lazy=False, account_cache_ttl=None, max_workers=DEFAULT_MAX_WORKERS):
+        # keep a connection open for every worker
+        session = session or create_session(pool_size=max(max_workers, DEFAULT_POOL_SIZE))
+        super(AsyncCartoContext, self).__init__(base_url=base_url, api_key=api_key, creds=creds,
+                                                session=session, verbose=verbose, lazy=lazy,
+                                                account_cache_ttl=account_cache_ttl)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    async def afetch(self, query, **kwargs):
+        """Coroutine version of :py:meth:`fetch <cartoframes.context.CartoContext.fetch>`"""
+        return await self._run(self.fetch, query, **kwargs)
+
+    async def aexecute(self, query):
+        """Coroutine version of :py:meth:`execute <cartoframes.context.CartoContext.execute>`"""
+        return await self._run(self.execute, query)
+
+    async def aread(self, table_name, **kwargs):
+        """Coroutine version of :py:meth:`read <cartoframes.context.CartoContext.read>`"""
+        return await self._run(self.read, table_name, **kwargs)
+
+    async def aupload(self, df, table_name, if_exists=Dataset.FAIL, **kwargs):
+        """Upload a DataFrame to a table with :py:meth:`Dataset.upload
+        <cartoframes.data.Dataset.upload>`.
+
+        Returns:
+            :py:class:`Dataset <cartoframes.data.Dataset>`
+        """
+        dataset = Dataset.from_dataframe(df)
+        return await self._run(dataset.upload, table_name=table_name, context=self, if_exists=if_exists, **kwargs)
+
+    async def adownload(self, table_name=None, query=None, **kwargs):
+        """Download a table or query into a DataFrame with
+        :py:meth:`Dataset.download <cartoframes.data.Dataset.download>`"""
+        if (table_name is None) == (query is None):
+            raise ValueError('You should provide a table_name or a query to download data.')
+
+        if query is not None:
+            dataset = Dataset.from_query(query, context=self)
+        else:
+            dataset = Dataset.from_table(table_name, context=self)
+        return await self._run(dataset.download, **kwargs)
+
+    def close(self):
+        """Wait for the running calls and release the worker threads"""
+        self._executor.shutdown(wait=True)
+
+    def _run(self, method, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self._executor, functools.partial(method, *args, **kwargs))
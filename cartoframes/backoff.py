@@ -0,0 +1,116 @@
+"""Waits between the retries of the CARTO API calls, and between the polls of
+the work CARTO does in the background"""
+import random
+import time
+
+from threading import Lock
+
+# the first wait is short, as most calls succeed, and most polled work is
+# done, after a few hundred milliseconds
+DEFAULT_INITIAL_DELAY = 0.1
+DEFAULT_MAX_DELAY = 10
+DEFAULT_MULTIPLIER = 2
+
+
+class Backoff(object):
+    """Jittered exponential backoff of one operation.
+
+    Every wait is `multiplier` times longer than the previous one, from
+    `initial_delay` up to `max_delay` seconds, and is randomly shortened by
+    up to a half so concurrent clients don't retry at the same time. When
+    the API asks to retry after some time (`retry_after`), the wait is at
+    least that long.
+
+    There are no more waits after `max_retries` retries, or when waiting
+    would end after `deadline` seconds since the backoff was created.
+
+    The waits of every operation `name` are counted in :py:func:`get_stats`.
+
+    Example:
+
+        .. code:: python
+
+            backoff = Backoff('read', max_retries=3)
+            while True:
+                try:
+                    return read()
+                except CartoRateLimitException as err:
+                    if not backoff.sleep(err.retry_after):
+                        raise
+    """
+    def __init__(self, name, initial_delay=DEFAULT_INITIAL_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                 multiplier=DEFAULT_MULTIPLIER, max_retries=None, deadline=None):
+        self.name = name
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.max_retries = max_retries
+        self.deadline = deadline
+        self.retries = 0
+        self._delay = initial_delay
+        self._start = time.time()
+
+    def next_delay(self, retry_after=None):
+        """Seconds to wait before the next retry, or None if there are no more retries"""
+        delay = min(self._delay, self.max_delay)
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        if retry_after:
+            delay = max(delay, retry_after)
+
+        if (self.max_retries is not None and self.retries >= self.max_retries) or \
+           (self.deadline is not None and time.time() - self._start + delay > self.deadline):
+            _stats.add(self.name, exhausted=1)
+            return None
+
+        self.retries += 1
+        self._delay *= self.multiplier
+        _stats.add(self.name, retries=1, seconds=delay)
+        return delay
+
+    def sleep(self, retry_after=None):
+        """Wait before the next retry. Returns False, without waiting, if there are no more retries"""
+        delay = self.next_delay(retry_after)
+        if delay is None:
+            return False
+
+        time.sleep(delay)
+        return True
+
+
+class BackoffStats(object):
+    """Number of retries, seconds waited and times the retries were exhausted, by operation"""
+    def __init__(self):
+        self._stats = {}
+        self._lock = Lock()
+
+    def add(self, name, retries=0, seconds=0, exhausted=0):
+        with self._lock:
+            stats = self._stats.setdefault(name, {'retries': 0, 'seconds': 0.0, 'exhausted': 0})
+            stats['retries'] += retries
+            stats['seconds'] += seconds
+            stats['exhausted'] += exhausted
+
+    def get(self):
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+_stats = BackoffStats()
+
+
+def get_stats():
+    """Retries made by the operations of every context of the process, by
+    operation: `metadata` (waiting for CARTO to register new tables), `read`
+    and `write` (COPY), and `batch` (Batch SQL job polls).
+
+    Returns:
+        dict: `{operation: {'retries': int, 'seconds': float, 'exhausted': int}}`
+    """
+    return _stats.get()
+
+
+def reset_stats():
+    _stats.reset()
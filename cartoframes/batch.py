@@ -0,0 +1,112 @@
+"""Batch SQL API jobs that run in the background while the caller does
+other work"""
+from carto.exceptions import CartoException
+
+from .backoff import Backoff
+
+BATCH_JOBS_PENDING_STATUSES = ('pending', 'running')
+BATCH_JOBS_FAILED_STATUSES = ('failed', 'canceled', 'cancelled', 'unknown')
+
+# the status of a job is read after up to MIN_POLL_SECONDS, and then waiting
+# POLL_BACKOFF times longer every time, up to MAX_POLL_SECONDS (see Backoff)
+MIN_POLL_SECONDS = 0.5
+MAX_POLL_SECONDS = 10
+POLL_BACKOFF = 1.5
+
+
+class BatchJob(object):
+    """Handle of a Batch SQL API job, created with :py:meth:`CartoContext.execute_async
+    <cartoframes.context.CartoContext.execute_async>`.
+
+    The job runs in CARTO, so the handle doesn't block: `done` reads its
+    status once, `wait` polls it until the job finishes, more frequently
+    at the beginning so short jobs return quickly, and `cancel` stops it.
+
+    Example:
+
+        .. code:: python
+
+            jobs = [cc.execute_async(query) for query in queries]
+            upload_data()
+            wait_all(jobs)
+    """
+    def __init__(self, context, query, on_done=None):
+        self._cc = context
+        self._on_done = on_done
+        self.query = query
+        self._job = context.batch_sql_client.create(query)
+        self.job_id = self._job['job_id']
+        self._check_done()
+
+    @property
+    def status(self):
+        """Last read status: `pending`, `running`, `done`, `failed`, `cancelled` or `unknown`"""
+        return self._job['status']
+
+    @property
+    def failed_reason(self):
+        return self._job.get('failed_reason')
+
+    def done(self):
+        """Whether the job has finished, reading its status if it was running"""
+        if self.status in BATCH_JOBS_PENDING_STATUSES:
+            self.update()
+        return self.status not in BATCH_JOBS_PENDING_STATUSES
+
+    def update(self):
+        """Read the status of the job"""
+        self._job = self._cc.batch_sql_client.read(self.job_id)
+        self._check_done()
+        return self.status
+
+    def wait(self, timeout=None, raise_errors=True):
+        """Wait for the job to finish and return its data.
+
+        Raises:
+            CartoException: if the job fails or is canceled (unless
+              `raise_errors` is False), or doesn't finish in `timeout` seconds.
+        """
+        return wait_all([self], timeout, raise_errors)[0]
+
+    def cancel(self):
+        """Cancel the job if it hasn't finished yet"""
+        if self.status in BATCH_JOBS_PENDING_STATUSES:
+            self._job['status'] = self._cc.batch_sql_client.cancel(self.job_id)
+            self._check_done()
+        return self.status
+
+    def _check_done(self):
+        if self._on_done is not None and self.status not in BATCH_JOBS_PENDING_STATUSES:
+            on_done, self._on_done = self._on_done, None
+            on_done()
+
+    def __repr__(self):
+        return 'BatchJob(job_id={}, status={})'.format(self.job_id, self.status)
+
+
+def wait_all(jobs, timeout=None, raise_errors=True):
+    """Wait for all the Batch SQL API jobs to finish and return their data,
+    reading the status of the pending ones in each poll.
+
+    Raises:
+        CartoException: if any job fails or is canceled, once all of them have
+          finished (unless `raise_errors` is False), or they don't finish in
+          `timeout` seconds.
+    """
+    backoff = Backoff('batch', initial_delay=MIN_POLL_SECONDS, max_delay=MAX_POLL_SECONDS,
+                      multiplier=POLL_BACKOFF, deadline=timeout)
+    pending = [job for job in jobs if job.status in BATCH_JOBS_PENDING_STATUSES]
+
+    while pending:
+        if not backoff.sleep():
+            raise CartoException('Batch SQL jobs {} did not finish in {} seconds.'.format(
+                ', '.join(job.job_id for job in pending), timeout))
+
+        pending = [job for job in pending if not job.done()]
+
+    failed = [job for job in jobs if job.status in BATCH_JOBS_FAILED_STATUSES]
+    if failed and raise_errors:
+        raise CartoException('Batch SQL job {} {}: {}'.format(
+            failed[0].job_id, failed[0].status, failed[0].failed_reason))
+
+    return [job._job for job in jobs]
@@ -26,18 +26,28 @@ class Column(object):
 
     @staticmethod
     def from_sql_api_fields(sql_api_fields):
-        return [Column(column, normalize=False, pgtype=sql_api_fields[column]['type']) for column in sql_api_fields]
+        return [Column(column, normalize=False, pgtype=sql_api_fields[column]['type'],
+                       dbtype=sql_api_fields[column].get('pgtype'))
+                for column in sql_api_fields]
 
-    def __init__(self, name, normalize=True, pgtype=None):
+    def __init__(self, name, normalize=True, pgtype=None, dbtype=None):
         if not name:
             raise ValueError('Column name cannot be null or empty')
 
         self.name = str(name)
         self.pgtype = pgtype
+        # the SQL API only gives a generic `type` (number, string...), and the
+        # database type in `pgtype` when it's available
+        self.dbtype = dbtype
         self.dtype = pg2dtypes(pgtype)
         if normalize:
             self.normalize()
 
+    @property
+    def compact_dtype(self):
+        """Smallest dtype that holds the values of the column"""
+        return pg2compact_dtypes(self.dbtype or self.pgtype) or self.dtype
+
     def normalize(self, forbidden_column_names=None):
         self._sanitize()
         self.name = self._truncate()
@@ -128,8 +138,8 @@ def normalize_name(column_name):
     return normalize_names([column_name])[0]
 
 
-def dtypes(columns, exclude_dates=False, exclude_the_geom=False):
-    return {x.name: x.dtype if not x.name == 'cartodb_id' else 'int64'
+def dtypes(columns, exclude_dates=False, exclude_the_geom=False, compact=False):
+    return {x.name: (x.compact_dtype if compact else x.dtype) if not x.name == 'cartodb_id' else 'int64'
             for x in columns if not (exclude_dates is True and x.dtype in Column.DATETIME_DTYPES)
             and not(exclude_the_geom is True and x.name in Column.SUPPORTED_GEOM_COL_NAMES)}
 
@@ -160,3 +170,21 @@ def pg2dtypes(pgtype):
         'USER-DEFINED': 'object',
     }
     return mapping.get(str(pgtype), 'object')
+
+
+def pg2compact_dtypes(pgtype):
+    """Returns the smallest dtype for input `pgtype`, or None if it's the one of `pg2dtypes`.
+
+    Integers use the pandas nullable integer types, so they don't need a float64 to hold nulls.
+    """
+    mapping = {
+        'smallint': 'Int16',
+        'int2': 'Int16',
+        'integer': 'Int32',
+        'int4': 'Int32',
+        'bigint': 'Int64',
+        'int8': 'Int64',
+        'real': 'float32',
+        'float4': 'float32',
+    }
+    return mapping.get(str(pgtype))
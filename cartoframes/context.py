@@ -7,11 +7,12 @@ import json
 import os
 import random
 import sys
+import time
 import collections
 from warnings import warn
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
-from IPython.display import HTML, Image
 import pandas as pd
 from tqdm import tqdm
 from appdirs import user_cache_dir
@@ -29,25 +30,25 @@ from .layer import BaseMap, AbstractLayer
 from .maps import (non_basemap_layers, get_map_name,
                    get_map_template, top_basemap_layer_url)
 from .analysis import Table
+from .account_cache import AccountCache
+from .batch import BatchJob
+from .session import create_session
 from .__version__ import __version__
 from .columns import dtypes, date_columns_names
 from .data import Dataset
-from .data.utils import decode_geometry, recursive_read, get_columns
+from .data.decoders import binary_read_query, read_binary
+from .data.schema_cache import SchemaCache
+from .data.result_cache import ResultCache, cached_read, CACHE_OFF
+from .data.utils import decode_geometries, recursive_read, get_columns, get_many_columns, compact_dataframe, \
+    COMPRESSION_GZIP, DEFAULT_COMPRESSION_LEVEL
 
 if sys.version_info >= (3, 0):
     from urllib.parse import urlparse, urlencode
 else:
     from urlparse import urlparse
     from urllib import urlencode
-try:
-    import matplotlib.image as mpi
-    import matplotlib.pyplot as plt
-    # set dpi based on CARTO Static Maps API dpi
-    mpi.rcParams['figure.dpi'] = 72.0
-except (ImportError, RuntimeError):
-    mpi = None
-    plt = None
-HAS_MATPLOTLIB = plt is not None
+# matplotlib is imported to draw the first static map
+HAS_MATPLOTLIB = utils.is_available('matplotlib')
 
 # Choose constant to avoid overview generation which are triggered at a
 # half million rows
@@ -62,6 +63,12 @@ CACHE_DIR = user_cache_dir('cartoframes')
 # cartoframes version
 DEFAULT_SQL_ARGS = dict(do_post=False)
 
+# accounts already checked by the contexts of this process
+_account_cache = AccountCache(CACHE_DIR)
+
+# concurrent queries of `fetch_many`
+DEFAULT_FETCH_WORKERS = 4
+
 # avoid _lock issue: https://github.com/tqdm/tqdm/issues/457
 tqdm(disable=True, total=0)  # initialise internal lock
 
@@ -117,9 +124,19 @@ class CartoContext(object):
         session (requests.Session, optional): requests session. See `requests
             documentation
             <http://docs.python-requests.org/en/master/user/advanced/>`__
-            for more information.
+            for more information. By default, a session from
+            :py:func:`create_session <cartoframes.session.create_session>`,
+            with a pool of connections and retries, is shared by all the
+            API clients of the context.
         verbose (bool, optional): Output underlying process states (True), or
             suppress (False, default)
+        lazy (bool, optional): If True, the API key is validated and the
+            organization of the user is looked up on first use instead of
+            when the context is created.
+        account_cache_ttl (int, optional): Seconds to keep the result of
+            those checks in the user cache directory, so new processes using
+            the same credentials don't repeat them. They're always kept in
+            memory for the life of the process.
 
     Returns:
         :py:class:`CartoContext <cartoframes.context.CartoContext>`: A
@@ -169,9 +186,10 @@ class CartoContext(object):
     """
 
     def __init__(self, base_url=None, api_key='default_public', creds=None, session=None,
-                 verbose=0):
+                 verbose=0, lazy=False, account_cache_ttl=None):
 
         self.creds = Credentials(creds=creds, key=api_key, base_url=base_url)
+        session = session or create_session()
         self.auth_client = APIKeyAuthClient(
             base_url=self.creds.base_url(),
             api_key=self.creds.key(),
@@ -188,12 +206,38 @@ class CartoContext(object):
         self.copy_client = CopySQLClient(self.auth_client)
         self.batch_sql_client = BatchSQLClient(self.auth_client)
         self.creds.username(self.auth_client.username)
-        self._is_authenticated()
-        self.is_org = self._is_org_user()
+        self._account_cache_ttl = account_cache_ttl
+        self._is_org = None
+        if not lazy:
+            self._check_account()
 
         self._map_templates = {}
         self._srcdoc = None
         self._verbose = verbose
+        self._schema_cache = SchemaCache()
+        self._result_cache = ResultCache(os.path.join(CACHE_DIR, 'results'))
+
+    @property
+    def is_org(self):
+        """Whether the user is in a multiuser CARTO organization"""
+        if self._is_org is None:
+            self._check_account()
+        return self._is_org
+
+    @is_org.setter
+    def is_org(self, is_org):
+        self._is_org = is_org
+
+    def _check_account(self):
+        """Validate the credentials and find out if the user is in an
+        organization, unless they were already checked"""
+        base_url, api_key = self.creds.base_url(), self.creds.key()
+        account = _account_cache.get(base_url, api_key, self._account_cache_ttl)
+        if account is None:
+            self._is_authenticated()
+            account = {'is_org': self._is_org_user()}
+            _account_cache.set(base_url, api_key, account['is_org'], self._account_cache_ttl)
+        self._is_org = account['is_org']
 
     def _is_authenticated(self):
         """Checks if credentials allow for authenticated carto access"""
@@ -212,7 +256,7 @@ class CartoContext(object):
     def get_default_schema(self):
         return 'public' if not self.is_org else self.creds.username()
 
-    def read(self, table_name, limit=None, decode_geom=False, shared_user=None, retry_times=3):
+    def read(self, table_name, limit=None, decode_geom=False, shared_user=None, retry_times=3, cache=CACHE_OFF):
         """Read a table from CARTO into a pandas DataFrames. Column types are inferred from database types, to
           avoid problems with integer columns with NA or null values, they are automatically retrieved as float64
 
@@ -228,6 +272,8 @@ class CartoContext(object):
               specify the user name (schema) who shared it.
             retry_times (int, optional): If the read call is rate limited,
               number of retries to be made
+            cache (str, optional): ``off`` (default), ``use`` or ``refresh``.
+              See :py:meth:`CartoContext.fetch`.
 
         Returns:
             pandas.DataFrame: DataFrame representation of `table_name` from
@@ -245,7 +291,7 @@ class CartoContext(object):
             shared_user or self.creds.username())
 
         dataset = Dataset.from_table(table_name, schema=schema, context=self)
-        return dataset.download(limit, decode_geom, retry_times)
+        return dataset.download(limit, decode_geom, retry_times, cache=cache)
 
     @utils.temp_ignore_warnings
     def tables(self):
@@ -320,9 +366,12 @@ class CartoContext(object):
             **kwargs: Keyword arguments to control write operations. Options
                 are:
 
-                - `compression` to set compression for files sent to CARTO.
-                  This will cause write speedups depending on the dataset.
-                  Options are ``None`` (no compression, default) or ``gzip``.
+                - `compression` to set compression for the data streamed to
+                  CARTO. This will cause write speedups depending on the
+                  dataset. Options are ``gzip`` (default) or ``None`` (no
+                  compression).
+                - `compression_level` to set the gzip compression level, from
+                  1 (fastest, default) to 9 (smallest).
                 - Some arguments from CARTO's Import API. See the `params
                   listed in the documentation
                   <https://carto.com/developers/import-api/reference/#tag/Standard-Tables>`__
@@ -341,14 +390,17 @@ class CartoContext(object):
             an index called `cartodb_id` for every table that runs from 1 to
             the length of the DataFrame.
         """  # noqa
-        tqdm.write('Params: encode_geom, geom_col and everything in kwargs are deprecated and not being used any more')
+        tqdm.write('Params: encode_geom, geom_col and everything in kwargs but compression and compression_level '
+                   'are deprecated and not being used any more')
         dataset = Dataset.from_dataframe(df)
 
         if_exists = Dataset.FAIL
         if overwrite:
             if_exists = Dataset.REPLACE
 
-        dataset.upload(with_lnglat=lnglat, if_exists=if_exists, table_name=table_name, context=self)
+        dataset.upload(with_lnglat=lnglat, if_exists=if_exists, table_name=table_name, context=self,
+                       compression=kwargs.get('compression', COMPRESSION_GZIP),
+                       compression_level=kwargs.get('compression_level', DEFAULT_COMPRESSION_LEVEL))
 
         tqdm.write('Table successfully written to CARTO: {table_url}'.format(
             table_url=utils.join_url(self.creds.base_url(),
@@ -452,17 +504,30 @@ class CartoContext(object):
         return table_name
 
     def sync(self, dataframe, table_name):
-        """Depending on the size of the DataFrame or CARTO table, perform
-        granular operations on a DataFrame to only update the changed cells
-        instead of a bulk upload. If on the large side, perform granular
-        operations, if on the smaller side use Import API.
+        """Update a CARTO table with the changes of a DataFrame: only the
+        rows inserted, updated or deleted since the last sync are sent,
+        instead of a bulk upload. Rows are matched by `cartodb_id`, as a
+        column or the index of the DataFrame. See :py:meth:`Dataset.sync
+        <cartoframes.data.Dataset.sync>`.
+
+        Args:
+            dataframe (pandas.DataFrame): DataFrame with the new data of the table.
+            table_name (str): Table to update. It's created if it doesn't exist.
+
+        Returns:
+            dict: number of `inserted`, `updated` and `deleted` rows.
 
-        Note:
-            Not yet implemented.
+        Example:
+            .. code:: python
+
+                df = cc.read('my_table')
+                df.loc[df['value'] < 0, 'value'] = 0
+                cc.sync(df, 'my_table')
         """
-        pass
+        return Dataset.from_dataframe(dataframe).sync(table_name=table_name, context=self)
 
-    def fetch(self, query, decode_geom=False):
+    def fetch(self, query, decode_geom=False, chunksize=None, format='csv', compact_dtypes=False,
+              cache=CACHE_OFF):
         """Pull the result from an arbitrary SELECT SQL query from a CARTO account
         into a pandas DataFrame.
 
@@ -473,12 +538,37 @@ class CartoContext(object):
               `Shapely <https://github.com/Toblerity/Shapely>`__
               object that can be used, for example, in `GeoPandas
               <http://geopandas.org/>`__.
+            chunksize (int, optional): If set, the result is streamed and
+              returned as an iterator of DataFrames of `chunksize` rows, so
+              it can be processed without holding it all in memory.
+            format (str, optional): Format of the COPY TO result: ``csv``
+              (default) or ``binary``. In ``binary`` format, numbers and dates
+              are decoded directly into NumPy arrays instead of being parsed
+              from text, and integer columns with nulls are ``Int64``. It
+              cannot be used with `chunksize`.
+            compact_dtypes (bool, optional): If True, integer columns use the
+              pandas nullable integer types of their width (``Int16``,
+              ``Int32`` or ``Int64``), ``real`` columns ``float32`` and text
+              columns with few distinct values ``category``, to reduce the
+              memory used by the DataFrame. It needs pandas >= 0.24. With
+              `chunksize` text columns are not converted to ``category``,
+              as their distinct values are only known for each chunk.
+            cache (str, optional): ``off`` (default), ``use`` or ``refresh``.
+              With ``use`` the DataFrame is read from a local cache (in
+              the user cache directory) while the tables used by the query
+              don't change, which is checked with a single metadata query.
+              ``refresh`` always downloads the data and updates the cache.
+              The cache is stored as Parquet files, which needs ``pyarrow``
+              (``pip install cartoframes[arrow]``). It cannot be used with
+              `chunksize`.
 
         Returns:
             pandas.DataFrame: DataFrame representation of query supplied.
             Pandas data types are inferred from PostgreSQL data types.
             In the case of PostgreSQL date types, dates are attempted to be
             converted, but on failure a data type 'object' is used.
+            When `chunksize` is set, an iterator of DataFrames with the same
+            data types is returned instead.
 
         Examples:
             This query gets the 10 highest values from a table and
@@ -512,25 +602,136 @@ class CartoContext(object):
                     decode_geom=True
                 )
 
+            This query processes a big table in chunks of 100000 rows.
+
+            .. code:: python
+
+                for chunk_df in cc.fetch('SELECT * FROM my_big_table', chunksize=100000):
+                    process(chunk_df)
+
+        """
+        if format not in ('csv', 'binary'):
+            raise ValueError('Wrong format `{}`. You can use: csv, binary'.format(format))
+
+        if compact_dtypes and not hasattr(pd, 'Int64Dtype'):
+            raise ValueError('`compact_dtypes` needs pandas >= 0.24.')
+
+        if chunksize is not None and cache != CACHE_OFF:
+            raise ValueError('`cache` cannot be used with `chunksize`.')
+
+        options = dict(decode_geom=decode_geom, format=format, compact_dtypes=compact_dtypes)
+        return cached_read(self, query, cache, options,
+                           lambda: self._fetch(query, decode_geom, chunksize, format, compact_dtypes))
+
+    def fetch_many(self, queries, max_workers=DEFAULT_FETCH_WORKERS, coalesce=False, decode_geom=False,
+                   **kwargs):
+        """Pull the results of several SELECT SQL queries into pandas
+        DataFrames, running up to `max_workers` of them at the same time.
+
+        Args:
+            queries (list of str): SELECT queries to run.
+            max_workers (int, optional): Number of queries run concurrently.
+            coalesce (bool, optional): If True, all the queries are sent in a
+              single SQL API request that returns their rows as JSON, instead
+              of a COPY per query. Meant for small results, like aggregates
+              for a dashboard: the whole response is held in memory.
+            decode_geom (bool, optional): See :py:meth:`fetch
+              <cartoframes.context.CartoContext.fetch>`.
+            **kwargs: Other :py:meth:`fetch <cartoframes.context.CartoContext.fetch>`
+              arguments (`format`, `compact_dtypes`, `cache`). They cannot be
+              used with `coalesce`.
+
+        Returns:
+            list: DataFrames of the queries, in the same order. Its `timings`
+            attribute has the seconds taken by each query (with `coalesce`,
+            the time of the single request).
+
+        Example:
+
+            .. code:: python
+
+                dfs = cc.fetch_many([
+                    'SELECT count(*) FROM my_table',
+                    'SELECT category, avg(value) FROM my_table GROUP BY category'
+                ])
+                print(dfs.timings)
         """
+        if kwargs.get('chunksize') is not None:
+            raise ValueError('`chunksize` cannot be used with `fetch_many`.')
+
+        if coalesce:
+            if kwargs:
+                raise ValueError('{} cannot be used with `coalesce`.'.format(
+                    ', '.join('`{}`'.format(arg) for arg in sorted(kwargs))))
+
+            start = time.time()
+            dataframes = self._coalesced_fetch(queries, decode_geom)
+            return FetchManyResult(dataframes, [time.time() - start] * len(queries))
+
+        def timed_fetch(query):
+            start = time.time()
+            df = self.fetch(query, decode_geom=decode_geom, **kwargs)
+            return df, time.time() - start
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(timed_fetch, queries))
+
+        return FetchManyResult([df for df, _ in results], [elapsed for _, elapsed in results])
+
+    def _coalesced_fetch(self, queries, decode_geom):
+        """Run the queries in a single SQL API request, each one returned as a JSON array of rows"""
+        queries_columns = get_many_columns(self, queries)
+
+        selects = []
+        for i, (query, columns) in enumerate(zip(queries, queries_columns)):
+            names = []
+            for column in columns:
+                name = '"{}"'.format(column.name.replace('"', '""'))
+                # geometries as hex EWKB, like in the COPY result
+                if column.pgtype == 'geometry':
+                    name = 'encode(ST_AsEWKB({name}), \'hex\') AS {name}'.format(name=name)
+                names.append(name)
+            selects.append('(SELECT json_agg(_r) FROM (SELECT {names} FROM ({query}) _q) _r) AS q{i}'.format(
+                names=', '.join(names), query=query.strip().rstrip(';'), i=i))
+
+        response = self.sql_client.send('SELECT {}'.format(', '.join(selects)))
+        row = response['rows'][0]
+
+        return [_json_fetched_dataframe(row['q{}'.format(i)], columns, decode_geom)
+                for i, columns in enumerate(queries_columns)]
+
+    def _fetch(self, query, decode_geom, chunksize, format, compact_dtypes):
+        if format == 'binary':
+            if chunksize is not None:
+                raise ValueError('`chunksize` cannot be used with the binary format.')
+
+            query_columns = get_columns(self, query)
+            copy_query, wire_columns = binary_read_query(query, query_columns)
+            df = read_binary(recursive_read(self, copy_query), wire_columns, decode_geom)
+            return compact_dataframe(df, query_columns) if compact_dtypes else df
+
         copy_query = 'COPY ({query}) TO stdout WITH (FORMAT csv, HEADER true)'.format(query=query)
         result = recursive_read(self, copy_query)
 
         query_columns = get_columns(self, query)
-        df_types = dtypes(query_columns, exclude_dates=True, exclude_the_geom=True)
+        df_types = dtypes(query_columns, exclude_dates=True, exclude_the_geom=True, compact=compact_dtypes)
         date_column_names = date_columns_names(query_columns)
+        compact_columns = query_columns if compact_dtypes else None
 
-        df = pd.read_csv(result, dtype=df_types,
-                         parse_dates=date_column_names,
-                         true_values=['t'],
-                         false_values=['f'],
-                         index_col='cartodb_id' if 'cartodb_id' in df_types else False,
-                         converters={'the_geom': lambda x: decode_geometry(x) if decode_geom else x})
+        reader = pd.read_csv(result, dtype=df_types,
+                             parse_dates=date_column_names,
+                             true_values=['t'],
+                             false_values=['f'],
+                             index_col='cartodb_id' if 'cartodb_id' in df_types else False,
+                             converters={'the_geom': lambda x: x},
+                             chunksize=chunksize)
 
-        if decode_geom:
-            df.rename({'the_geom': 'geometry'}, axis='columns', inplace=True)
+        if chunksize is None:
+            return _clean_fetched_dataframe(reader, date_column_names, decode_geom, compact_columns)
 
-        return df
+        # every chunk has the same dtypes, so the text is not converted to categories
+        return (_clean_fetched_dataframe(df, date_column_names, decode_geom, compact_columns, categories=False)
+                for df in reader)
 
     def execute(self, query):
         """Runs an arbitrary query to a CARTO account.
@@ -581,7 +782,36 @@ class CartoContext(object):
                 )
 
         """
-        self.batch_sql_client.create_and_wait_for_completion(query)
+        self.execute_async(query).wait()
+
+    def execute_async(self, query):
+        """Runs an arbitrary query to a CARTO account in a Batch SQL API job,
+        without waiting for it to finish, like :py:meth:`execute
+        <cartoframes.context.CartoContext.execute>`.
+
+        Args:
+            query (str): An SQL query to run against CARTO user database.
+
+        Returns:
+            :py:class:`BatchJob <cartoframes.batch.BatchJob>`: handle to
+            check the status of the job, wait for it or cancel it.
+
+        Example:
+
+            Builds two tables at the same time and waits for both
+
+            .. code:: python
+
+                from cartoframes.batch import wait_all
+
+                jobs = [
+                    cc.execute_async('CREATE TABLE a AS SELECT ...'),
+                    cc.execute_async('CREATE TABLE b AS SELECT ...')
+                ]
+                wait_all(jobs)
+        """
+        # the query may have changed any table
+        return BatchJob(self, query, on_done=self._schema_cache.invalidate)
 
     def query(self, query, table_name=None, decode_geom=False, is_select=None):
         """Pull the result from an arbitrary SQL SELECT query from a CARTO account
@@ -901,6 +1131,9 @@ class CartoContext(object):
         html = '<img src="{url}" />'.format(url=static_url)
         self._debug_print(static_url=static_url)
 
+        from IPython.display import HTML, Image
+        mpi, plt = _import_matplotlib() if not interactive and HAS_MATPLOTLIB else (None, None)
+
         # TODO: write this as a private method
         if interactive:
             netloc = urlparse(self.creds.base_url()).netloc
@@ -983,7 +1216,7 @@ class CartoContext(object):
                      height=size[1],
                      img_html=img_html)
             return HTML(html)
-        elif HAS_MATPLOTLIB:
+        elif plt is not None:
             raw_data = mpi.imread(static_url, format='png')
             if ax is None:
                 dpi = mpi.rcParams['figure.dpi']
@@ -1760,3 +1993,60 @@ class CartoContext(object):
                                                      str_value[-50:])
             print('{key}: {value}'.format(key=key,
                                           value=str_value))
+
+
+def _import_matplotlib():
+    """matplotlib image and pyplot modules, or None if they can't be used"""
+    try:
+        import matplotlib.image as mpi
+        import matplotlib.pyplot as plt
+    except (ImportError, RuntimeError):
+        return None, None
+
+    # set dpi based on CARTO Static Maps API dpi
+    mpi.rcParams['figure.dpi'] = 72.0
+    return mpi, plt
+
+
+class FetchManyResult(list):
+    """DataFrames returned by `fetch_many`, with the seconds taken by each query in `timings`"""
+    def __init__(self, dataframes, timings):
+        super(FetchManyResult, self).__init__(dataframes)
+        self.timings = timings
+
+
+def _json_fetched_dataframe(records, columns, decode_geom):
+    """DataFrame of the JSON rows of a query, with the dtypes of a fetched one"""
+    df = pd.DataFrame.from_records(records or [], columns=[column.name for column in columns])
+
+    for name, dtype in dtypes(columns, exclude_dates=True, exclude_the_geom=True).items():
+        if dtype in ('int64', 'float64'):
+            df[name] = pd.to_numeric(df[name]).astype(dtype)
+        elif dtype == 'bool' and df[name].notnull().all():
+            df[name] = df[name].astype(dtype)
+
+    date_column_names = date_columns_names(columns)
+    for name in date_column_names:
+        df[name] = pd.to_datetime(df[name])
+
+    if 'cartodb_id' in df:
+        df.set_index('cartodb_id', inplace=True)
+
+    return _clean_fetched_dataframe(df, date_column_names, decode_geom)
+
+
+def _clean_fetched_dataframe(df, date_column_names, decode_geom, compact_columns=None, categories=True):
+    # a chunk with only nulls in a date column is not parsed as a date
+    for column in date_column_names:
+        if column in df and df[column].isnull().all():
+            df[column] = pd.to_datetime(df[column])
+
+    if compact_columns is not None:
+        compact_dataframe(df, compact_columns, categories)
+
+    if decode_geom:
+        if 'the_geom' in df:
+            df['the_geom'] = decode_geometries(df['the_geom'])
+        df.rename({'the_geom': 'geometry'}, axis='columns', inplace=True)
+
+    return df
@@ -0,0 +1,223 @@
+"""Apache Arrow tables read from and written to CARTO in the binary COPY format,
+without going through a pandas DataFrame"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+from .decoders import _gather, field_data, iter_fields, timestamp_nulls, NULL_BOOL, READ_CHUNK_BYTES, WIRE_FLOAT8, \
+    WIRE_INT4, WIRE_INT8, WIRE_NULLABLE_INT8, WIRE_TIMESTAMP, WIRE_GEOMETRY
+from .encoders import binary_pgtype, PGCOPY_HEADER, PGCOPY_TRAILER, PG_EPOCH_OFFSET_US, BINARY_DTYPES, \
+    DEFAULT_CHUNK_ROWS, _binary_lnglat, _ewkb, _fixed_width_field, _pack_tuples, _to_wkb, _variable_width_field
+from .utils import decode_geometries
+from ..utils import is_available, LazyModule
+
+# imported when an Arrow table is used
+pa = LazyModule('pyarrow')
+HAS_PYARROW = is_available('pyarrow')
+
+
+def is_arrow_table(data):
+    # there can't be Arrow tables if pyarrow hasn't been imported
+    return 'pyarrow' in sys.modules and isinstance(data, pa.Table)
+
+
+def check_pyarrow():
+    if not HAS_PYARROW:
+        raise ImportError('The Python package `pyarrow` needs to be installed to use Arrow tables.')
+
+
+def to_arrow_table(data):
+    """Arrow table of a Table or a sequence of RecordBatches"""
+    check_pyarrow()
+    if isinstance(data, pa.Table):
+        return data
+    if isinstance(data, pa.RecordBatch):
+        return pa.Table.from_batches([data])
+    return pa.Table.from_batches(list(data))
+
+
+def dataframe_to_arrow(df, geom_col=None):
+    """Arrow table of a DataFrame, with the geometries as WKB"""
+    check_pyarrow()
+    if geom_col is not None:
+        df = df.assign(**{geom_col: _to_wkb(decode_geometries(df[geom_col]), hex=False)})
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def read_arrow(stream, wire_columns):
+    """Decode a binary COPY TO stream into an Arrow table"""
+    return pa.Table.from_batches(list(read_arrow_batches(stream, wire_columns)), schema=arrow_schema(wire_columns))
+
+
+def read_arrow_batches(stream, wire_columns, chunk_bytes=READ_CHUNK_BYTES):
+    """Decode a binary COPY TO stream into Arrow record batches, one for
+    every `chunk_bytes` read from the stream.
+
+    Numbers, booleans and timestamps go from the COPY buffer to Arrow arrays
+    through NumPy, text is copied into string arrays and geometries are kept
+    as EWKB binary values.
+    """
+    check_pyarrow()
+    schema = arrow_schema(wire_columns)
+    columns = sorted(wire_columns, key=lambda c: c.position)
+
+    for data, fields in iter_fields(stream, wire_columns, chunk_bytes):
+        arrays = []
+        for column in columns:
+            if column.is_fixed:
+                arrays.append(_fixed_array(column, fields[column.name]))
+            else:
+                offsets, lengths = fields[column.name]
+                arrays.append(_variable_array(column, data, offsets, lengths))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def arrow_schema(wire_columns):
+    """Arrow schema of the tables read with the binary COPY TO query of `wire_columns`"""
+    check_pyarrow()
+    types = {
+        WIRE_FLOAT8: pa.float64(),
+        WIRE_INT8: pa.int64(),
+        WIRE_NULLABLE_INT8: pa.int64(),
+        WIRE_INT4: pa.bool_(),
+        WIRE_TIMESTAMP: pa.timestamp('us'),
+        WIRE_GEOMETRY: pa.binary()
+    }
+    return pa.schema([(column.name, types.get(column.wire_type, pa.string()))
+                      for column in sorted(wire_columns, key=lambda c: c.position)])
+
+
+def arrow_chunks(table, columns, geom_col=None, with_lnglat=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Encode an Arrow table in the PostgreSQL binary COPY format (PGCOPY).
+
+    The target columns must have the types given by `arrow_pgtype`.
+    """
+    yield PGCOPY_HEADER
+
+    for start in range(0, table.num_rows, chunk_rows):
+        chunk = table.slice(start, chunk_rows)
+
+        fields = [_binary_array(chunk.column(col).combine_chunks()) for col in columns]
+        if with_lnglat is not None:
+            fields.append(_binary_lnglat(*[_float_series(chunk.column(col)) for col in with_lnglat]))
+        elif geom_col is not None:
+            fields.append(_binary_geometry_array(chunk.column(geom_col).combine_chunks()))
+        else:
+            fields.append((np.empty(0, dtype=np.uint8), np.full(chunk.num_rows, -1, dtype=np.int64)))
+
+        yield _pack_tuples(fields, chunk.num_rows)
+
+    yield PGCOPY_TRAILER
+
+
+def arrow_pgtype(arrow_type):
+    """Returns the PostgreSQL type whose binary representation is sent for `arrow_type`"""
+    if pa.types.is_timestamp(arrow_type):
+        return 'timestamp'
+    if pa.types.is_boolean(arrow_type) or pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type):
+        return binary_pgtype(np.dtype(arrow_type.to_pandas_dtype()))
+    return 'text'
+
+
+def arrow_geom_type(table, geom_col):
+    """Geometry type of the first geometry of an Arrow table column"""
+    values = table.column(geom_col).drop_null()
+    if len(values) > 0:
+        geom = decode_geometries([values[0].as_py()])[0]
+        if geom is not None:
+            return geom.geom_type
+
+
+def _fixed_array(column, values):
+    if column.wire_type == WIRE_TIMESTAMP:
+        nulls = timestamp_nulls(values)
+        micros = np.where(nulls, 0, values) + PG_EPOCH_OFFSET_US
+        return pa.array(micros.astype('datetime64[us]'), mask=nulls, type=pa.timestamp('us'))
+
+    if column.wire_type == WIRE_INT4:
+        # booleans
+        return pa.array(values == 1, mask=values == NULL_BOOL, type=pa.bool_())
+
+    if column.wire_type == WIRE_FLOAT8:
+        return pa.array(values, mask=np.isnan(values), type=pa.float64())
+
+    if column.wire_type == WIRE_INT8:
+        return pa.array(values, type=pa.int64())
+
+    return pa.array(values)
+
+
+def _variable_array(column, data, offsets, lengths):
+    """Build a string or binary array from the fields of `data` at `offsets`.
+
+    The values of a chunk of tuples are smaller than 2GB, so they fit in
+    arrays with 32 bit offsets.
+    """
+    valid = lengths >= 0
+
+    if column.wire_type == WIRE_NULLABLE_INT8:
+        values = np.zeros(len(lengths), dtype=np.int64)
+        values[valid] = _gather(data, offsets[valid], np.dtype('>i8'))
+        return pa.array(values, mask=~valid, type=pa.int64())
+
+    values, value_offsets = field_data(data, offsets, lengths)
+    validity = pa.py_buffer(np.packbits(valid, bitorder='little')) if not valid.all() else None
+
+    return pa.Array.from_buffers(pa.binary() if column.wire_type == WIRE_GEOMETRY else pa.string(), len(lengths), [
+        validity,
+        pa.py_buffer(value_offsets.astype(np.int32)),
+        pa.py_buffer(values)
+    ], null_count=int((~valid).sum()))
+
+
+def _binary_array(array):
+    """Returns the concatenated binary values of an Arrow array and the length of each field (-1 for nulls)"""
+    null_mask = np.asarray(array.is_null().to_numpy(zero_copy_only=False))
+    arrow_type = array.type
+
+    if pa.types.is_timestamp(arrow_type):
+        micros = array.cast(pa.timestamp('us', tz=arrow_type.tz)).cast(pa.int64()).fill_null(0)
+        return _fixed_width_field(micros.to_numpy() - PG_EPOCH_OFFSET_US, '>i8', null_mask)
+
+    if arrow_pgtype(arrow_type) != 'text':
+        binary_type = BINARY_DTYPES[str(np.dtype(arrow_type.to_pandas_dtype()))][1]
+        values = array.fill_null(False if pa.types.is_boolean(arrow_type) else 0)
+        return _fixed_width_field(values.to_numpy(zero_copy_only=False), binary_type, null_mask)
+
+    if not (pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)):
+        array = array.cast(pa.string())
+
+    return _string_field(array, null_mask)
+
+
+def _string_field(array, null_mask):
+    """Take the text of a string array directly from its buffers"""
+    offset_type = np.int64 if pa.types.is_large_string(array.type) else np.int32
+    _, offsets_buffer, data_buffer = array.buffers()
+    offsets = np.frombuffer(offsets_buffer, dtype=offset_type)[array.offset:array.offset + len(array) + 1]
+    lengths = np.diff(offsets).astype(np.int64)
+
+    if (lengths[null_mask] != 0).any():
+        # the nulls of the array take space in its data, so it can't be copied in one go
+        return _variable_width_field([value.encode('utf-8') if value is not None else None
+                                      for value in array.to_pylist()])
+
+    if data_buffer is None or len(array) == 0:
+        data = np.empty(0, dtype=np.uint8)
+    else:
+        data = np.frombuffer(data_buffer, dtype=np.uint8)[offsets[0]:offsets[-1]]
+    return data, np.where(null_mask, -1, lengths)
+
+
+def _binary_geometry_array(array):
+    if pa.types.is_binary(array.type) or pa.types.is_large_binary(array.type):
+        wkbs = array.to_pylist()
+    else:
+        wkbs = _to_wkb(decode_geometries(array.to_pylist()), hex=False)
+
+    return _variable_width_field([_ewkb(wkb) if wkb else None for wkb in wkbs])
+
+
+def _float_series(array):
+    return pd.Series(array.cast(pa.float64()).to_numpy(zero_copy_only=False))
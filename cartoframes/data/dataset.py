@@ -1,15 +1,116 @@
+import uuid
+
 import pandas as pd
 
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil
 from tqdm import tqdm
 from warnings import warn
 
 from carto.exceptions import CartoException
 
-from .utils import decode_geometry, compute_query, compute_geodataframe, get_columns, DEFAULT_RETRY_TIMES
+from .utils import decode_geometry, compute_query, compute_geodataframe, get_columns, recursive_read, \
+    recursive_write, validate_compression, compact_dataframe, DEFAULT_RETRY_TIMES, COMPRESSION_GZIP, \
+    DEFAULT_COMPRESSION_LEVEL
 from .dataset_info import DatasetInfo
+from .table_metadata import get_table_metadata
+from ..batch import BatchJob
+from .encoders import csv_chunks, binary_chunks, binary_pgtype
+from .decoders import binary_read_query
+from .arrow import read_arrow, read_arrow_batches, arrow_chunks, arrow_pgtype, arrow_geom_type, is_arrow_table, \
+    to_arrow_table, dataframe_to_arrow, check_pyarrow
+from .schema_cache import table_key
+from .result_cache import cached_read, CACHE_OFF
 from ..columns import Column, normalize_names, normalize_name
 from ..geojson import load_geojson
 
+# parallel uploads split the DataFrame in several chunks per worker, so retrying
+# a failed chunk only resends a small part of the data
+UPLOAD_CHUNKS_PER_WORKER = 4
+MIN_UPLOAD_CHUNK_ROWS = 10000
+
+# hash of the data of every row, stored in the tables updated with `sync`
+ROW_HASH_COLUMN = '_cartoframes_row_hash'
+
+# columns of the tables that are not read into DataFrames
+NOT_READ_COLUMNS = ['the_geom_webmercator', ROW_HASH_COLUMN]
+
+# sampling `sample_rows` rows of a table reads this many times more rows than
+# the estimated fraction, so stale estimates still give `sample_rows` rows
+SAMPLE_ROWS_MARGIN = 1.2
+
+# PostGIS geometry types of the Dataset point, line and polygon geometry types
+POSTGIS_GEOM_TYPES = ('Point', 'MultiPoint', 'LineString', 'MultiLineString', 'Polygon', 'MultiPolygon')
+
+# replace a table with its shadow table. The views that depend on the table
+# (and on those views) are dropped with it and created again on the new table,
+# and the grants of the table and the views are kept. The sequence, indexes and
+# triggers created by cartodbfy are named after the table instead of the shadow
+SWAP_TABLE_QUERY = '''DO $swap$
+DECLARE
+    old_table regclass := to_regclass(quote_ident('{table_name}'));
+    new_table regclass := quote_ident('{shadow_table}')::regclass;
+    statements text[] := ARRAY[]::text[];
+    command text;
+    item record;
+BEGIN
+    IF old_table IS NOT NULL THEN
+        FOR item IN
+            WITH RECURSIVE dependents(oid, depth) AS (
+                SELECT old_table::oid, 0
+                UNION
+                SELECT r.ev_class, dependents.depth + 1
+                FROM dependents
+                JOIN pg_depend d ON d.refobjid = dependents.oid AND d.classid = 'pg_rewrite'::regclass
+                JOIN pg_rewrite r ON r.oid = d.objid
+                WHERE r.ev_class <> dependents.oid
+            )
+            SELECT c.oid::regclass::text AS name, c.relkind, c.relacl, d.depth,
+                   CASE WHEN d.depth > 0 THEN pg_get_viewdef(c.oid) END AS definition
+            FROM (SELECT oid, max(depth) AS depth FROM dependents GROUP BY oid) d
+            JOIN pg_class c ON c.oid = d.oid
+            ORDER BY d.depth
+        LOOP
+            IF item.depth > 0 THEN
+                statements := statements || format('CREATE %sVIEW %s AS %s',
+                    CASE WHEN item.relkind = 'm' THEN 'MATERIALIZED ' ELSE '' END, item.name, item.definition);
+            END IF;
+            statements := statements || ARRAY(
+                SELECT format('GRANT %s ON %s TO %s%s', a.privilege_type, item.name,
+                    CASE WHEN a.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(a.grantee)) END,
+                    CASE WHEN a.is_grantable THEN ' WITH GRANT OPTION' ELSE '' END)
+                FROM aclexplode(item.relacl) a);
+        END LOOP;
+        EXECUTE format('DROP TABLE %s CASCADE', old_table);
+    END IF;
+
+    EXECUTE format('ALTER TABLE %s RENAME TO %I', new_table, '{table_name}');
+
+    FOR item IN
+        SELECT 'INDEX' AS kind, c.oid::regclass::text AS name, c.relname
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = new_table
+        UNION ALL
+        SELECT 'SEQUENCE', c.oid::regclass::text, c.relname
+        FROM pg_depend d JOIN pg_class c ON c.oid = d.objid
+        WHERE d.refobjid = new_table AND c.relkind = 'S'
+        UNION ALL
+        SELECT 'TRIGGER', format('%I ON %s', t.tgname, new_table), t.tgname
+        FROM pg_trigger t
+        WHERE t.tgrelid = new_table AND NOT t.tgisinternal
+    LOOP
+        IF strpos(item.relname, '{shadow_table}') > 0 THEN
+            EXECUTE format('ALTER %s %s RENAME TO %I', item.kind, item.name,
+                           replace(item.relname, '{shadow_table}', '{table_name}'));
+        END IF;
+    END LOOP;
+
+    FOREACH command IN ARRAY statements LOOP
+        EXECUTE command;
+    END LOOP;
+END
+$swap$'''
+
 # avoid _lock issue: https://github.com/tqdm/tqdm/issues/457
 tqdm(disable=True, total=0)  # initialise internal lock
 
@@ -18,6 +119,13 @@ class Dataset(object):
     FAIL = 'fail'
     REPLACE = 'replace'
     APPEND = 'append'
+    UPSERT = 'upsert'
+
+    FORMAT_CSV = 'csv'
+    FORMAT_BINARY = 'binary'
+
+    SAMPLE_BERNOULLI = 'bernoulli'
+    SAMPLE_SYSTEM = 'system'
 
     PRIVATE = DatasetInfo.PRIVATE
     PUBLIC = DatasetInfo.PUBLIC
@@ -31,7 +139,7 @@ class Dataset(object):
     GEOM_TYPE_POLYGON = 'polygon'
 
     def __init__(self, table_name=None, schema=None,
-                 query=None, df=None, gdf=None,
+                 query=None, df=None, gdf=None, arrow=None,
                  state=None, is_saved_in_carto=False, context=None):
         from ..auth import _default_context
         self._cc = context or _default_context
@@ -41,16 +149,19 @@ class Dataset(object):
         self._query = query
         self._df = df
         self._gdf = gdf
+        self._arrow = arrow
 
         if not self._validate_init():
             raise ValueError('Wrong Dataset creation. You should use one of the class methods: '
-                             'from_table, from_query, from_dataframe, from_geodataframe, from_geojson')
+                             'from_table, from_query, from_dataframe, from_geodataframe, from_geojson, from_arrow')
 
         self._state = state
         self._is_saved_in_carto = is_saved_in_carto
         self._dataset_info = None
+        self._table_metadata = None
 
         self._normalized_column_names = None
+        self._watermark = None
 
         if self._table_name != table_name:
             warn('Table will be named `{}`'.format(table_name))
@@ -80,6 +191,16 @@ class Dataset(object):
     def from_geojson(cls, geojson):
         return cls(gdf=load_geojson(geojson), state=cls.STATE_LOCAL)
 
+    @classmethod
+    def from_arrow(cls, table):
+        """Create a Dataset from an Arrow table or a sequence of record batches.
+
+        The geometry column (`the_geom`, `geom` or `geometry`) can have WKB or
+        EWKB binary values. The table is uploaded in the binary COPY format
+        directly from its Arrow buffers.
+        """
+        return cls(arrow=to_arrow_table(table), state=cls.STATE_LOCAL)
+
     @property
     def dataframe(self):
         return self._df
@@ -107,6 +228,7 @@ class Dataset(object):
     @context.setter
     def context(self, context):
         self._cc = context
+        self._table_metadata = None
 
     @property
     def is_saved_in_carto(self):
@@ -131,18 +253,59 @@ class Dataset(object):
         self._dataset_info = self.dataset_info
         self._dataset_info.update(privacy=privacy, name=name)
 
-    def upload(self, with_lnglat=None, if_exists=FAIL, table_name=None, schema=None, context=None):
+    def upload(self, with_lnglat=None, if_exists=FAIL, table_name=None, schema=None, context=None,
+               format=FORMAT_CSV, max_workers=1, retry_times=DEFAULT_RETRY_TIMES,
+               compression=COMPRESSION_GZIP, compression_level=DEFAULT_COMPRESSION_LEVEL, upsert_keys=None):
+        """Upload the Dataset to a CARTO table.
+
+        DataFrames are streamed with COPY FROM. `format='binary'` sends them in
+        the PostgreSQL binary COPY format: numbers, booleans and timestamps
+        travel as fixed width values and geometries as EWKB. New tables are then
+        created with `bigint`, `double precision`, ... columns, and tables being
+        appended to must use those same types.
+
+        With `max_workers` > 1 the DataFrame is split in row chunks that are
+        copied concurrently into the table. Each COPY is retried up to
+        `retry_times` times when it is rate limited or can't connect to CARTO,
+        without resending the chunks already uploaded. Timeouts and server
+        errors are not retried, as the chunk may have been inserted.
+
+        The data is gzip compressed (`compression_level` 1 to 9) while it is
+        streamed, unless `compression` is None.
+
+        `if_exists='replace'` loads the data into a new table that replaces the
+        table at the end, in a single transaction. The views on the table are
+        created again on the new one (owned by the user uploading it) and its
+        grants and CARTO privacy are kept. Triggers and indexes added to the
+        table by hand, and indexes on materialized views over it, are not.
+
+        `if_exists='upsert'` inserts the rows into an existing table, updating
+        the ones with the same `upsert_keys` columns instead. The rows are copied
+        into a staging table and merged into the table in a single transaction,
+        so the table is never dropped or cartodbfied again. A unique index on
+        `upsert_keys` is created in the table if it doesn't have it.
+        """
+        if format not in (Dataset.FORMAT_CSV, Dataset.FORMAT_BINARY):
+            raise ValueError('Wrong format `{}`. You can use: {}, {}'.format(
+                format, Dataset.FORMAT_CSV, Dataset.FORMAT_BINARY))
+        validate_compression(compression, compression_level)
+
         if table_name:
             self._table_name = normalize_name(table_name)
         if schema:
             self._schema = schema
         if context:
             self._cc = context
+        if table_name or schema or context:
+            self._table_metadata = None
 
         if self._table_name is None or self._cc is None:
             raise ValueError('You should provide a table_name and context to upload data.')
 
-        if self._gdf is None and self._df is None and self._query is None:
+        if (if_exists == Dataset.UPSERT) != bool(upsert_keys):
+            raise ValueError('`upsert_keys` must be used with if_exists="upsert".')
+
+        if self._gdf is None and self._df is None and self._arrow is None and self._query is None:
             raise ValueError('Nothing to upload.'
                              'We need data in a DataFrame or GeoDataFrame or a query to upload data to CARTO.')
 
@@ -157,22 +320,35 @@ class Dataset(object):
             # TODO: uncomment when we support GeoDataFrame
             # self._normalized_column_names = _normalize_column_names(self._gdf)
 
-        if self._df is not None:
-            self._normalized_column_names = _normalize_column_names(self._df)
+        if self._arrow is not None:
+            # Arrow tables are always sent in the binary format
+            format = Dataset.FORMAT_BINARY
+
+        if self._df is not None or self._arrow is not None:
+            self._normalized_column_names = _normalize_column_names(self._local_data())
+            keys = self._get_upsert_keys(upsert_keys) if upsert_keys else None
 
-            if if_exists == Dataset.REPLACE or not self.exists():
-                self._create_table(with_lnglat)
-                if if_exists != Dataset.APPEND:
+            exists = self.exists()
+            if if_exists == Dataset.REPLACE and exists:
+                self._replace_table(with_lnglat, format, max_workers, retry_times, compression, compression_level)
+                self._is_saved_in_carto = True
+                return self
+            elif if_exists == Dataset.REPLACE or not exists:
+                self._create_table(with_lnglat, format)
+                if if_exists not in (Dataset.APPEND, Dataset.UPSERT):
                     self._is_saved_in_carto = True
             elif if_exists == Dataset.FAIL:
                 raise already_exists_error
+            elif if_exists == Dataset.UPSERT:
+                self._upsert(keys, with_lnglat, format, max_workers, retry_times, compression, compression_level)
+                return self
 
-            self._copyfrom(with_lnglat)
+            self._copyfrom(with_lnglat, format, max_workers, retry_times, compression, compression_level)
 
         elif self._query is not None:
-            if if_exists == Dataset.APPEND:
-                raise CartoException('Error using append with a query Dataset.'
-                                     'It is not possible to append data to a query')
+            if if_exists in (Dataset.APPEND, Dataset.UPSERT):
+                raise CartoException('Error using {} with a query Dataset.'
+                                     'It is not possible to {} data to a query'.format(if_exists, if_exists))
             elif if_exists == Dataset.REPLACE or not self.exists():
                 self._create_table_from_query()
                 self._is_saved_in_carto = True
@@ -181,19 +357,350 @@ class Dataset(object):
 
         return self
 
-    def download(self, limit=None, decode_geom=False, retry_times=DEFAULT_RETRY_TIMES):
+    def sync(self, table_name=None, schema=None, context=None, retry_times=DEFAULT_RETRY_TIMES):
+        """Update a CARTO table with the rows of the Dataset DataFrame that
+        were inserted, updated or deleted since the last sync, keyed on
+        `cartodb_id`.
+
+        A hash of every row is kept in the table, so only the changed rows are
+        sent: they are copied into a staging table and merged into the table in
+        a single transaction. Rows changed in CARTO since the last sync are
+        overwritten only when they change in the DataFrame too. The table is
+        created if it doesn't exist.
+
+        The hashes are stored in a `_cartoframes_row_hash` text column that
+        `sync` adds to the table. cartoframes doesn't read it into DataFrames,
+        but other queries like `SELECT *` return it. The rows of a table that
+        was not created by `sync` have no hash yet, so its first sync sends
+        every row.
+
+        Returns:
+            dict: number of `inserted`, `updated` and `deleted` rows.
+        """
+        if table_name:
+            self._table_name = normalize_name(table_name)
+        if schema:
+            self._schema = schema
+        if context:
+            self._cc = context
+        if table_name or schema or context:
+            self._table_metadata = None
+
+        if self._table_name is None or self._cc is None or self._df is None:
+            raise ValueError('You should provide a DataFrame, a table_name and context to sync data.')
+
+        if 'cartodb_id' not in self._df and self._df.index.name != 'cartodb_id':
+            raise ValueError('Sync needs a `cartodb_id` column or index to match the rows with the table.')
+
+        # frames read from a synced table have the hashes of the last sync
+        local_df = self._df.drop(columns=[ROW_HASH_COLUMN]) if ROW_HASH_COLUMN in self._df else self._df
+
+        self._normalized_column_names = _normalize_column_names(local_df)
+        if not self.exists():
+            self._create_table()
+            self._is_saved_in_carto = True
+        self._cc.sql_client.send('ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {hash_column} text'.format(
+            table=self._qualified_table_name(), hash_column=ROW_HASH_COLUMN))
+        self._invalidate_table()
+
+        missing_columns = set(norm for norm, orig in self._normalized_column_names) - \
+            set(column.name for column in self.get_table_columns())
+        if missing_columns:
+            raise CartoException('The columns {} are not in the table {}. Use `upload` with `if_exists="replace"` '
+                                 'to change the table columns.'.format(', '.join(sorted(missing_columns)),
+                                                                       self._table_name))
+
+        df = local_df if 'cartodb_id' in local_df else local_df.reset_index()
+        df = df.set_index('cartodb_id', drop=False)
+        if not df.index.is_unique:
+            raise ValueError('The `cartodb_id` values must be unique.')
+
+        geom_col = _get_geom_col_name(df)
+        orig_columns = [orig for norm, orig in self._normalized_column_names]
+        hashes = _row_hashes(df[orig_columns + ([geom_col] if geom_col else [])])
+
+        remote_hashes = self._cc.fetch('SELECT cartodb_id, {hash_column} FROM {table}'.format(
+            hash_column=ROW_HASH_COLUMN, table=self._qualified_table_name()))[ROW_HASH_COLUMN]
+
+        changed = hashes.ne(remote_hashes.reindex(hashes.index)).values
+        deleted_ids = remote_hashes.index.difference(hashes.index)
+        result = {
+            'inserted': int((~hashes.index.isin(remote_hashes.index)).sum()),
+            'updated': int((changed & hashes.index.isin(remote_hashes.index)).sum()),
+            'deleted': len(deleted_ids)
+        }
+
+        if changed.any() or len(deleted_ids):
+            changed_rows = df.loc[changed].assign(**{ROW_HASH_COLUMN: hashes[changed]})
+            deleted_rows = pd.DataFrame({'cartodb_id': deleted_ids})
+            columns = ['cartodb_id'] + [norm for norm, orig in self._normalized_column_names] + [ROW_HASH_COLUMN]
+
+            def merge_query(staging_table):
+                return _merge_query(self._qualified_table_name(), staging_table, columns, ['cartodb_id'],
+                                    delete_column=ROW_HASH_COLUMN, with_geometry=geom_col is not None)
+
+            def copy(staging_table):
+                copies = [(changed_rows, ['cartodb_id'] + orig_columns + [ROW_HASH_COLUMN], columns, geom_col),
+                          (deleted_rows, ['cartodb_id'], ['cartodb_id'], None)]
+                for rows, rows_columns, table_columns, rows_geom_col in copies:
+                    if len(rows) == 0:
+                        continue
+                    query = """COPY {table}({columns},the_geom)
+                           FROM stdin WITH (FORMAT csv, DELIMITER '|');""".format(
+                        table=staging_table, columns=','.join(table_columns))
+                    recursive_write(self._cc, query,
+                                    lambda rows=rows, rows_columns=rows_columns, rows_geom_col=rows_geom_col:
+                                        csv_chunks(rows, rows_columns, rows_geom_col),
+                                    retry_times=retry_times)
+
+            self._merge_with_staging(copy, merge_query)
+
+        return result
+
+    def _upsert(self, keys, with_lnglat=None, format=FORMAT_CSV, max_workers=1, retry_times=DEFAULT_RETRY_TIMES,
+                compression=COMPRESSION_GZIP, compression_level=DEFAULT_COMPRESSION_LEVEL):
+        columns = [norm for norm, orig in self._normalized_column_names]
+        with_geometry = with_lnglat is not None or _get_geom_col_name(self._local_data()) is not None
+
+        def copy(staging_table):
+            self._copyfrom(with_lnglat, format, max_workers, retry_times, compression, compression_level,
+                           table_name=staging_table)
+
+        def merge_query(staging_table):
+            return '{index}; {merge}'.format(
+                index=_unique_index_query(self._qualified_table_name(), self._table_name, keys),
+                merge=_merge_query(self._qualified_table_name(), staging_table, columns, keys,
+                                   with_geometry=with_geometry))
+
+        self._merge_with_staging(copy, merge_query)
+
+    def _get_upsert_keys(self, upsert_keys):
+        """Table columns of the `upsert_keys` DataFrame columns"""
+        upsert_keys = [upsert_keys] if isinstance(upsert_keys, str) else list(upsert_keys)
+        normalized = {orig: norm for norm, orig in self._normalized_column_names}
+
+        missing_keys = [key for key in upsert_keys if key not in normalized]
+        if missing_keys:
+            raise ValueError('The upsert keys {} are not columns of the data.'.format(', '.join(missing_keys)))
+
+        data = self._local_data()
+        keys_df = data.select(upsert_keys).to_pandas() if is_arrow_table(data) else data[upsert_keys]
+        if keys_df.duplicated().any():
+            raise ValueError('The upsert keys {} have duplicated values.'.format(', '.join(upsert_keys)))
+
+        return [normalized[key] for key in upsert_keys]
+
+    def _merge_with_staging(self, copy, merge_query):
+        """Copy the data into a staging table like the table with
+        `copy(staging_table)`, and merge it into the table with
+        `merge_query(staging_table)` in one transaction.
+        """
+        staging_table = _staging_table_name(self._table_name)
+        qualified_staging_table = '"{}"."{}"'.format(self._schema, staging_table)
+
+        self._cc.sql_client.send('CREATE TABLE {staging} AS SELECT * FROM {table} LIMIT 0'.format(
+            staging=qualified_staging_table, table=self._qualified_table_name()))
+        try:
+            copy(qualified_staging_table)
+
+            job = BatchJob(self._cc, 'BEGIN; {merge}; COMMIT;'.format(
+                merge=merge_query(qualified_staging_table))).wait(raise_errors=False)
+            if job['status'] != 'done':
+                raise CartoException('Cannot update table: {}.'.format(job['failed_reason']))
+        finally:
+            self._cc.sql_client.send('DROP TABLE IF EXISTS {}'.format(qualified_staging_table))
+
+    def _qualified_table_name(self):
+        return '"{}"."{}"'.format(self._schema, self._table_name)
+
+    def download(self, limit=None, decode_geom=False, retry_times=DEFAULT_RETRY_TIMES, chunksize=None,
+                 max_workers=1, format=FORMAT_CSV, compact_dtypes=False, cache=CACHE_OFF,
+                 sample=None, sample_rows=None, sample_method=SAMPLE_BERNOULLI, stratify_by=None):
+        """Download the table or query result into a DataFrame.
+
+        When `chunksize` is set an iterator of DataFrames of `chunksize` rows
+        is returned, and the Dataset does not keep the data.
+
+        With `max_workers` > 1 the rows are split in `cartodb_id` ranges that
+        are read concurrently, each one with its own COPY TO, and concatenated
+        in `cartodb_id` order.
+
+        `format='binary'` reads the data in the PostgreSQL binary COPY format,
+        decoding numbers and dates directly into NumPy arrays.
+
+        With `compact_dtypes` the columns use the smallest dtype that holds
+        their values: nullable integers of the column width, `float32` for
+        `real` columns and `category` for text with few distinct values
+        (except with `chunksize`, so all the chunks have the same dtypes).
+
+        `cache='use'` reuses the DataFrame stored in the local cache while the
+        table doesn't change, and `cache='refresh'` updates it.
+
+        `sample` (a fraction between 0 and 1) or `sample_rows` download a
+        random sample of the rows, selected in CARTO, instead of the first
+        `limit` ones. Tables are sampled with `TABLESAMPLE`, by rows with
+        `sample_method='bernoulli'` (default) or, faster but grouping the rows
+        stored together, by pages with `sample_method='system'`. `sample_rows`
+        uses the estimated number of rows of the table, and query results are
+        sampled with `random()`. With `stratify_by` every distinct value of that
+        column gets the same fraction of its rows, and at least one.
+        """
         if self._cc is None or (self._table_name is None and self._query is None):
             raise ValueError('You should provide a context and a table_name or query to download data.')
 
+        if chunksize is not None and max_workers > 1:
+            raise ValueError('`chunksize` and `max_workers` cannot be used at the same time.')
+
+        if chunksize is not None and cache != CACHE_OFF:
+            raise ValueError('`cache` cannot be used with `chunksize`.')
+
         # priority order: query, table
         table_columns = self.get_table_columns()
-        query = self._get_read_query(table_columns, limit)
-        self._df = self._cc.fetch(query, decode_geom=decode_geom)
+        query = self._get_read_query(table_columns, limit, sample, sample_rows, sample_method, stratify_by)
+        query_columns = _get_query_columns(table_columns)
+        self._cc._schema_cache.set(query, query_columns)
+
+        if chunksize is not None:
+            return self._cc.fetch(query, decode_geom=decode_geom, chunksize=chunksize, format=format,
+                                  compact_dtypes=compact_dtypes)
+
+        def read():
+            if max_workers > 1 and limit is None and sample is None and sample_rows is None:
+                if 'cartodb_id' in [column.name for column in table_columns]:
+                    return self._parallel_fetch(query, query_columns, decode_geom, max_workers, format,
+                                                compact_dtypes)
+                warn('Parallel download needs a `cartodb_id` column. Downloading it with a single request.')
+
+            return self._cc.fetch(query, decode_geom=decode_geom, format=format, compact_dtypes=compact_dtypes)
+
+        options = dict(decode_geom=decode_geom, format=format, compact_dtypes=compact_dtypes)
+        self._df = cached_read(self._cc, query, cache, options, read)
+        self._watermark = None
         return self._df
 
+    def download_changes(self, watermark_column='cartodb_id', decode_geom=False, format=FORMAT_CSV,
+                         compact_dtypes=False):
+        """Download only the rows added or changed since the last download and
+        merge them into the Dataset DataFrame.
+
+        The rows are selected with a high-water mark: the greatest value of
+        `watermark_column` already downloaded. With `cartodb_id` (default)
+        only new rows are found. With a timestamp column updated on every
+        change (e.g. `updated_at`) changed rows are found too, and they
+        replace the previous version of the row. Deleted rows are not
+        detected. The first call downloads the whole table.
+        """
+        if self._cc is None or (self._table_name is None and self._query is None):
+            raise ValueError('You should provide a context and a table_name or query to download data.')
+
+        table_columns = self.get_table_columns()
+        column_names = [column.name for column in table_columns]
+        if 'cartodb_id' not in column_names or watermark_column not in column_names:
+            raise ValueError('Incremental downloads need the `cartodb_id` and `{}` columns.'.format(
+                watermark_column))
+
+        watermark = self._get_watermark(watermark_column)
+        if watermark is None:
+            self.download(decode_geom=decode_geom, format=format, compact_dtypes=compact_dtypes)
+            self._watermark = (watermark_column, _max_value(self._df, watermark_column))
+        else:
+            query = self._get_read_query(table_columns)
+            query_columns = _get_query_columns(table_columns)
+            delta_query = self._get_delta_query(query, watermark_column, watermark)
+            self._cc._schema_cache.set(delta_query, query_columns)
+
+            delta = self._cc.fetch(delta_query, decode_geom=decode_geom, format=format,
+                                   compact_dtypes=compact_dtypes)
+            if len(delta) > 0:
+                self._df = pd.concat([self._df.drop(delta.index, errors='ignore'), delta]).sort_index()
+                self._watermark = (watermark_column, max(watermark, _max_value(delta, watermark_column)))
+
+        return self._df
+
+    def _get_watermark(self, watermark_column):
+        if self._df is None or len(self._df) == 0:
+            return None
+        if self._watermark is not None and self._watermark[0] == watermark_column:
+            return self._watermark[1]
+        return _max_value(self._df, watermark_column)
+
+    def _get_delta_query(self, query, watermark_column, watermark):
+        if watermark_column == 'cartodb_id':
+            condition = 'cartodb_id > {}'.format(int(watermark))
+        else:
+            # rows changed in the same instant as the mark may have been missed, so they are read again
+            condition = '"{column}" >= \'{value}\''.format(column=watermark_column, value=_sql_value(watermark))
+
+        return 'SELECT * FROM ({query}) _d WHERE {condition}'.format(query=query, condition=condition)
+
+    def to_arrow(self, limit=None, batches=False):
+        """Get the data of the Dataset as an Arrow table.
+
+        Tables and queries are read in the binary COPY format straight into
+        Arrow arrays, without building a DataFrame first. Geometries are
+        returned as EWKB binary values.
+
+        With `batches=True` an iterator of RecordBatches is returned instead,
+        and every batch is decoded while the rest of the data is being read.
+        """
+        check_pyarrow()
+
+        if self._arrow is not None or self._df is not None:
+            table = self._arrow if self._arrow is not None else \
+                dataframe_to_arrow(self._df, _get_geom_col_name(self._df))
+            return iter(table.to_batches()) if batches else table
+
+        if self._cc is None or (self._table_name is None and self._query is None):
+            raise ValueError('You should provide a context and a table_name or query to download data.')
+
+        table_columns = self.get_table_columns()
+        query = self._get_read_query(table_columns, limit)
+        query_columns = _get_query_columns(table_columns)
+        self._cc._schema_cache.set(query, query_columns)
+
+        copy_query, wire_columns = binary_read_query(query, get_columns(self._cc, query))
+        read = read_arrow_batches if batches else read_arrow
+        return read(recursive_read(self._cc, copy_query), wire_columns)
+
+    def _parallel_fetch(self, query, query_columns, decode_geom, max_workers, format=FORMAT_CSV,
+                        compact_dtypes=False):
+        partition_queries = self._get_partition_queries(query, max_workers)
+        if len(partition_queries) < 2:
+            return self._cc.fetch(query, decode_geom=decode_geom, format=format, compact_dtypes=compact_dtypes)
+
+        for partition_query in partition_queries:
+            self._cc._schema_cache.set(partition_query, query_columns)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            dfs = list(executor.map(lambda q: self._cc.fetch(q, decode_geom=decode_geom, format=format,
+                                                             compact_dtypes=compact_dtypes),
+                                    partition_queries))
+
+        df = pd.concat(dfs)
+        if compact_dtypes:
+            # the categories of every partition are different, so they are joined as text
+            compact_dataframe(df, query_columns)
+        return df
+
+    def _get_partition_queries(self, query, partitions):
+        """Split a read query in `cartodb_id` ranges of the same width"""
+        response = self._cc.sql_client.send(
+            'SELECT min(cartodb_id) AS min_id, max(cartodb_id) AS max_id FROM ({query}) _q'.format(query=query))
+        row = response['rows'][0]
+        if row['min_id'] is None:
+            return [query]
+
+        min_id, max_id = int(row['min_id']), int(row['max_id'])
+        step = max(int(ceil((max_id - min_id + 1) / float(partitions))), 1)
+
+        return ['SELECT * FROM ({query}) _p WHERE cartodb_id >= {start} AND cartodb_id < {end} '
+                'ORDER BY cartodb_id'.format(query=query, start=start, end=start + step)
+                for start in range(min_id, max_id + 1, step)]
+
     def delete(self):
         if self.exists():
             self._cc.sql_client.send(self._drop_table_query(False))
+            self._invalidate_table()
             self._unsync()
             return True
 
@@ -201,6 +708,10 @@ class Dataset(object):
 
     def exists(self):
         """Checks to see if table exists"""
+        metadata = self.get_table_metadata()
+        if metadata is not None:
+            return metadata.exists
+
         try:
             self._cc.sql_client.send(
                 'EXPLAIN SELECT * FROM "{table_name}"'.format(
@@ -212,19 +723,74 @@ class Dataset(object):
             self._cc._debug_print(err=err)
             return False
 
-    def _create_table(self, with_lnglat=None):
-        job = self._cc.batch_sql_client \
-                  .create_and_wait_for_completion(
-                      '''BEGIN; {drop}; {create}; {cartodbfy}; COMMIT;'''
-                      .format(drop=self._drop_table_query(),
-                              create=self._create_table_query(with_lnglat),
-                              cartodbfy=self._cartodbfy_query()))
+    def _create_table(self, with_lnglat=None, format=FORMAT_CSV, table_name=None):
+        table_name = table_name or self._table_name
+        job = BatchJob(self._cc,
+                       '''BEGIN; {drop}; {create}; {cartodbfy}; COMMIT;'''
+                       .format(drop=self._drop_table_query(table_name=table_name),
+                               create=self._create_table_query(with_lnglat, format, table_name),
+                               cartodbfy=self._cartodbfy_query(table_name))).wait(raise_errors=False)
+
+        self._invalidate_table(table_name)
 
         if job['status'] != 'done':
             raise CartoException('Cannot create table: {}.'.format(job['failed_reason']))
 
+    def _replace_table(self, with_lnglat=None, format=FORMAT_CSV, max_workers=1, retry_times=DEFAULT_RETRY_TIMES,
+                       compression=COMPRESSION_GZIP, compression_level=DEFAULT_COMPRESSION_LEVEL):
+        """Load the data into a new cartodbfied shadow table and swap it with
+        the table at the end, so the table is never empty or missing"""
+        shadow_table = _shadow_table_name(self._table_name)
+        privacy = self._get_privacy()
+        self._create_table(with_lnglat, format, table_name=shadow_table)
+        try:
+            self._copyfrom(with_lnglat, format, max_workers, retry_times, compression, compression_level,
+                           table_name=shadow_table)
+            self._swap_table(shadow_table)
+        except Exception:
+            self._cc.sql_client.send(self._drop_table_query(table_name=shadow_table))
+            raise
+        self._restore_privacy(privacy)
+
+    def _swap_table(self, shadow_table):
+        job = BatchJob(self._cc, 'BEGIN; {swap}; COMMIT;'.format(
+            swap=self._swap_table_query(shadow_table))).wait(raise_errors=False)
+
+        self._invalidate_table()
+
+        if job['status'] != 'done':
+            raise CartoException('Cannot replace table: {}.'.format(job['failed_reason']))
+
+    def _swap_table_query(self, shadow_table):
+        return SWAP_TABLE_QUERY.format(shadow_table=shadow_table, table_name=self._table_name)
+
+    def _get_privacy(self):
+        """CARTO privacy of the table, or None if it doesn't exist or can't be read"""
+        if not self.exists():
+            return None
+
+        try:
+            return self._get_dataset_info().privacy
+        except CartoException:
+            return None
+
+    def _restore_privacy(self, privacy):
+        """Set the privacy the table had before it was replaced, as CARTO
+        registers the new table as private"""
+        self._dataset_info = None
+        if privacy is None:
+            return
+
+        try:
+            self._dataset_info = self._get_dataset_info()
+            self._dataset_info.update(privacy=privacy)
+        except CartoException as err:
+            self._dataset_info = None
+            warn('The privacy of the table `{}` could not be set back to {}: {}'.format(
+                self._table_name, privacy, err))
+
     def _validate_init(self):
-        inputs = [self._table_name, self._query, self._df, self._gdf]
+        inputs = [self._table_name, self._query, self._df, self._gdf, self._arrow]
         inputs_number = sum(x is not None for x in inputs)
 
         if inputs_number != 1:
@@ -232,97 +798,117 @@ class Dataset(object):
 
         return True
 
-    def _cartodbfy_query(self):
+    def _cartodbfy_query(self, table_name=None):
         return "SELECT CDB_CartodbfyTable('{schema}', '{table_name}')" \
-            .format(schema=self._schema or self._cc.get_default_schema(), table_name=self._table_name)
-
-    def _copyfrom(self, with_lnglat=None):
-        geom_col = _get_geom_col_name(self._df)
+            .format(schema=self._schema or self._cc.get_default_schema(), table_name=table_name or self._table_name)
+
+    def _copyfrom(self, with_lnglat=None, format=FORMAT_CSV, max_workers=1, retry_times=DEFAULT_RETRY_TIMES,
+                  compression=COMPRESSION_GZIP, compression_level=DEFAULT_COMPRESSION_LEVEL, table_name=None):
+        table_name = table_name or self._table_name
+        data = self._local_data()
+        geom_col = _get_geom_col_name(data)
+        orig_columns = [orig for norm, orig in self._normalized_column_names]
+
+        if format == Dataset.FORMAT_BINARY:
+            options = 'FORMAT binary'
+            encoder = arrow_chunks if is_arrow_table(data) else binary_chunks
+        else:
+            options = "FORMAT csv, DELIMITER '|'"
+            encoder = csv_chunks
 
         columns = ','.join(norm for norm, orig in self._normalized_column_names)
-        self._cc.copy_client.copyfrom(
-            """COPY {table_name}({columns},the_geom)
-               FROM stdin WITH (FORMAT csv, DELIMITER '|');""".format(table_name=self._table_name, columns=columns),
-            self._rows(self._df, [c for c in self._df.columns if c != 'cartodb_id'], with_lnglat, geom_col)
-        )
-
-    def _rows(self, df, cols, with_lnglat, geom_col):
-        for i, row in df.iterrows():
-            csv_row = ''
-            the_geom_val = None
-            lng_val = None
-            lat_val = None
-            for col in cols:
-                if with_lnglat and col in Column.SUPPORTED_GEOM_COL_NAMES:
-                    continue
-                val = row[col]
-                if pd.isnull(val) or val is None:
-                    val = ''
-                if with_lnglat:
-                    if col == with_lnglat[0]:
-                        lng_val = row[col]
-                    if col == with_lnglat[1]:
-                        lat_val = row[col]
-                if col == geom_col:
-                    the_geom_val = row[col]
-                else:
-                    csv_row += '{val}|'.format(val=val)
-
-            if the_geom_val is not None:
-                geom = decode_geometry(the_geom_val)
-                if geom:
-                    csv_row += 'SRID=4326;{geom}'.format(geom=geom.wkt)
-            if with_lnglat is not None and lng_val is not None and lat_val is not None:
-                csv_row += 'SRID=4326;POINT({lng} {lat})'.format(lng=lng_val, lat=lat_val)
-
-            csv_row += '\n'
-            yield csv_row.encode()
-
-    def _drop_table_query(self, if_exists=True):
+        query = """COPY {table_name}({columns},the_geom)
+               FROM stdin WITH ({options});""".format(table_name=table_name, columns=columns, options=options)
+
+        def copy_chunk(df):
+            return recursive_write(self._cc, query, lambda: encoder(df, orig_columns, geom_col, with_lnglat),
+                                   retry_times=retry_times, compression=compression,
+                                   compression_level=compression_level)
+
+        if max_workers > 1:
+            chunks = _split_rows(data, max_workers * UPLOAD_CHUNKS_PER_WORKER)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(copy_chunk, chunk) for chunk in chunks]
+
+            errors = [future.exception() for future in futures if future.exception() is not None]
+            if errors:
+                raise CartoException('{failed} of {total} chunks could not be uploaded to the table {table_name}, '
+                                     'which contains the rest of the rows: {error}'.format(
+                                         failed=len(errors), total=len(chunks),
+                                         table_name=table_name, error=errors[0]))
+        else:
+            copy_chunk(data)
+
+    def _drop_table_query(self, if_exists=True, table_name=None):
         return '''DROP TABLE {if_exists} {table_name}'''.format(
-            table_name=self._table_name,
+            table_name=table_name or self._table_name,
             if_exists='IF EXISTS' if if_exists else '')
 
     def _create_table_from_query(self):
-        self._cc.batch_sql_client.create_and_wait_for_completion(
-            '''BEGIN; {drop}; {create}; {cartodbfy}; COMMIT;'''
-                .format(drop=self._drop_table_query(),
-                        create=self._get_query_to_create_table_from_query(),
-                        cartodbfy=self._cartodbfy_query()))
-
-    def _get_query_to_create_table_from_query(self):
-        return '''CREATE TABLE {table_name} AS ({query})'''.format(table_name=self._table_name, query=self._query)
-
-    def _create_table_query(self, with_lnglat=None):
+        # built in a shadow table that replaces the table at the end of the
+        # transaction, so the query can read the table being replaced
+        shadow_table = _shadow_table_name(self._table_name)
+        privacy = self._get_privacy()
+        BatchJob(self._cc,
+                 '''BEGIN; {drop}; {create}; {cartodbfy}; {swap}; COMMIT;'''
+                 .format(drop=self._drop_table_query(table_name=shadow_table),
+                         create=self._get_query_to_create_table_from_query(shadow_table),
+                         cartodbfy=self._cartodbfy_query(shadow_table),
+                         swap=self._swap_table_query(shadow_table))).wait()
+        self._invalidate_table()
+        self._restore_privacy(privacy)
+
+    def _get_query_to_create_table_from_query(self, table_name=None):
+        return '''CREATE TABLE {table_name} AS ({query})'''.format(table_name=table_name or self._table_name,
+                                                                   query=self._query)
+
+    def _create_table_query(self, with_lnglat=None, format=FORMAT_CSV, table_name=None):
+        data = self._local_data()
         if with_lnglat is None:
-            geom_type = _get_geom_col_type(self._df)
+            geom_type = _get_geom_col_type(data)
         else:
             geom_type = 'Point'
 
+        if is_arrow_table(data):
+            column_types = {field.name: arrow_pgtype(field.type) for field in data.schema}
+        else:
+            dtypes2pg = binary_pgtype if format == Dataset.FORMAT_BINARY else _dtypes2pg
+            column_types = {orig: dtypes2pg(data.dtypes[orig]) for norm, orig in self._normalized_column_names}
+
         col = ('{col} {ctype}')
         cols = ', '.join(col.format(col=norm,
-                                    ctype=_dtypes2pg(self._df.dtypes[orig]))
+                                    ctype=column_types[orig])
                          for norm, orig in self._normalized_column_names)
 
         if geom_type:
             cols += ', {geom_colname} geometry({geom_type}, 4326)'.format(geom_colname='the_geom', geom_type=geom_type)
 
-        create_query = '''CREATE TABLE {table_name} ({cols})'''.format(table_name=self._table_name, cols=cols)
+        create_query = '''CREATE TABLE {table_name} ({cols})'''.format(
+            table_name=table_name or self._table_name, cols=cols)
         return create_query
 
-    def _get_read_query(self, table_columns, limit=None):
+    def _get_read_query(self, table_columns, limit=None, sample=None, sample_rows=None,
+                        sample_method=SAMPLE_BERNOULLI, stratify_by=None):
         """Create the read (COPY TO) query"""
-        query_columns = [column.name for column in table_columns if column.name != 'the_geom_webmercator']
+        query_columns = [column.name for column in _get_query_columns(table_columns)]
 
         if self._query is not None:
-            query = 'SELECT {columns} FROM ({query}) _q'.format(
-                query=self._query,
-                columns=', '.join(query_columns))
+            source = '({query}) _q'.format(query=self._query)
         else:
-            query = 'SELECT {columns} FROM "{schema}"."{table_name}"'.format(
-                table_name=self._table_name,
-                schema=self._schema,
-                columns=', '.join(query_columns))
+            source = '"{schema}"."{table_name}"'.format(table_name=self._table_name, schema=self._schema)
+
+        if sample is None and sample_rows is None:
+            if stratify_by is not None:
+                raise ValueError('`stratify_by` must be used with `sample` or `sample_rows`.')
+            query = 'SELECT {columns} FROM {source}'.format(source=source, columns=', '.join(query_columns))
+        else:
+            _validate_sample(sample, sample_rows, sample_method, limit)
+            if stratify_by is not None:
+                if stratify_by not in [column.name for column in table_columns]:
+                    raise ValueError('`stratify_by` column `{}` not found.'.format(stratify_by))
+                query = _stratified_sample_query(query_columns, source, stratify_by, sample, sample_rows)
+            else:
+                query = self._get_sample_query(query_columns, source, sample, sample_rows, sample_method)
 
         if limit is not None:
             if isinstance(limit, int) and (limit >= 0):
@@ -332,31 +918,79 @@ class Dataset(object):
 
         return query
 
+    def _get_sample_query(self, query_columns, source, sample=None, sample_rows=None,
+                          sample_method=SAMPLE_BERNOULLI):
+        columns = ', '.join(query_columns)
+        # only tables can be read with TABLESAMPLE
+        is_table = self._query is None
+
+        if sample is not None:
+            if is_table:
+                return 'SELECT {columns} FROM {source} TABLESAMPLE {method} ({percent:.6g})'.format(
+                    columns=columns, source=source, method=sample_method.upper(), percent=100.0 * sample)
+            return 'SELECT {columns} FROM {source} WHERE random() < {sample:.6g}'.format(
+                columns=columns, source=source, sample=sample)
+
+        metadata = self.get_table_metadata() if is_table else None
+        if metadata is not None and metadata.row_estimate:
+            percent = min(100.0, 100.0 * SAMPLE_ROWS_MARGIN * sample_rows / metadata.row_estimate)
+            source += ' TABLESAMPLE {method} ({percent:.6g})'.format(method=sample_method.upper(), percent=percent)
+        return 'SELECT {columns} FROM {source} ORDER BY random() LIMIT {rows}'.format(
+            columns=columns, source=source, rows=sample_rows)
+
     def get_table_columns(self):
         """Get column names and types from a table or query result"""
         if self._query is not None:
-            query = 'SELECT * FROM ({}) _q limit 0'.format(self._query)
-            return get_columns(self._cc, query)
+            return get_columns(self._cc, self._query)
         else:
-            query = '''
-                SELECT column_name, data_type
-                FROM information_schema.columns
-                WHERE table_name = '{table}' AND table_schema = '{schema}'
-            '''.format(table=self._table_name, schema=self._schema)
+            cache_key = table_key(self._schema, self._table_name)
+            columns = self._cc._schema_cache.get(cache_key)
+            if columns is None:
+                columns = self._get_table_columns()
+                if columns:
+                    self._cc._schema_cache.set(cache_key, columns)
+            return columns
+
+    def _get_table_columns(self):
+        metadata = self.get_table_metadata()
+        if metadata is not None:
+            return metadata.columns
+
+        query = '''
+            SELECT *
+            FROM "{schema}"."{table}" LIMIT 0
+        '''.format(table=self._table_name, schema=self._schema)
+        return get_columns(self._cc, query)
+
+    def get_table_metadata(self):
+        """Existence, columns, estimated number of rows, geometry type and
+        public access of the table, read from the database catalog in a single
+        query.
+
+        It's kept until the Dataset creates, replaces or deletes the table.
+
+        Returns:
+            :py:class:`TableMetadata <cartoframes.data.table_metadata.TableMetadata>`,
+            or None for query Datasets, without a context or when the catalog
+            can't be read.
+        """
+        if self._table_name is None or self._cc is None:
+            return None
 
+        if self._table_metadata is None:
             try:
-                table_info = self._cc.sql_client.send(query)
-                return [Column(c['column_name'], pgtype=c['data_type']) for c in table_info['rows']]
+                self._table_metadata = get_table_metadata(self._cc, self._schema, self._table_name)
             except CartoException as e:
                 # this may happen when using the default_public API key
                 if str(e) == 'Access denied':
-                    query = '''
-                        SELECT *
-                        FROM "{schema}"."{table}" LIMIT 0
-                    '''.format(table=self._table_name, schema=self._schema)
-                    return get_columns(self._cc, query)
-                else:
-                    raise e
+                    return None
+                raise e
+
+        return self._table_metadata
+
+    def _invalidate_table(self, table_name=None):
+        self._cc._schema_cache.invalidate(table_name or self._table_name)
+        self._table_metadata = None
 
     def get_table_column_names(self, exclude=None):
         """Get column names and types from a table"""
@@ -370,6 +1004,9 @@ class Dataset(object):
     def compute_geom_type(self):
         """Compute the geometry type from the data"""
         if self._state == Dataset.STATE_REMOTE:
+            metadata = self.get_table_metadata() if self._query is None else None
+            if metadata is not None and metadata.geom_type in POSTGIS_GEOM_TYPES:
+                return self._map_geom_type(metadata.geom_type)
             return self._get_remote_geom_type(get_query(self))
         elif self._state == Dataset.STATE_LOCAL:
             return self._get_local_geom_type(get_geodataframe(self))
@@ -405,12 +1042,22 @@ class Dataset(object):
         }[geom_type]
 
     def _get_dataset_info(self):
+        # don't wait for CARTO to register a table that doesn't exist
+        metadata = self.get_table_metadata()
+        if metadata is not None and not metadata.exists:
+            raise CartoException('Table with name {t} and schema {s} does not exist in CARTO.'.format(
+                t=self._table_name, s=self._schema))
+
         return DatasetInfo(self._cc, self._table_name)
 
     def _unsync(self):
         self._is_saved_in_carto = False
+        self._table_metadata = None
         self._dataset_info = None
 
+    def _local_data(self):
+        return self._arrow if self._arrow is not None else self._df
+
     def _get_schema(self):
         if self._cc:
             return self._cc.get_default_schema()
@@ -434,6 +1081,73 @@ def get_geodataframe(dataset):
             return dataset.geodataframe
 
 
+def _row_hashes(df):
+    """Hash of the data of every row, as hexadecimal text"""
+    return pd.util.hash_pandas_object(df, index=False).map('{:016x}'.format)
+
+
+def _staging_table_name(table_name):
+    return '{}_staging_{}'.format(table_name[:Column.MAX_LENGTH - 17], uuid.uuid4().hex[:8])
+
+
+def _shadow_table_name(table_name):
+    return '{}_shadow_{}'.format(table_name[:Column.MAX_LENGTH - 16], uuid.uuid4().hex[:8])
+
+
+def _merge_query(table, staging_table, columns, keys, delete_column=None, with_geometry=False):
+    """Insert or update the rows of the staging table in the table, matching
+    them on the `keys` columns. With `delete_column`, the staging rows where
+    it's null delete the rows of the table instead.
+
+    `the_geom` is only merged `with_geometry` (or if it's in `columns`), so
+    data without geometries keeps the geometries of the table."""
+    if with_geometry and 'the_geom' not in columns:
+        columns = columns + ['the_geom']
+    match = ' AND '.join('t.{key} = s.{key}'.format(key=key) for key in keys)
+    updates = ', '.join('{column} = EXCLUDED.{column}'.format(column=column)
+                        for column in columns if column not in keys)
+    queries = []
+
+    if delete_column is not None:
+        queries.append('DELETE FROM {table} t USING {staging} s WHERE {match} AND s.{column} IS NULL'.format(
+            table=table, staging=staging_table, match=match, column=delete_column))
+
+    queries.append('INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging}{where} '
+                   'ON CONFLICT ({keys}) DO UPDATE SET {updates}'.format(
+                       table=table, staging=staging_table, columns=', '.join(columns),
+                       where=' WHERE {} IS NOT NULL'.format(delete_column) if delete_column else '',
+                       keys=', '.join(keys), updates=updates))
+
+    if 'cartodb_id' in columns:
+        # the inserted rows may have ids greater than the ones given by the sequence
+        queries.append("SELECT setval(pg_get_serial_sequence('{table}', 'cartodb_id'), "
+                       "(SELECT max(cartodb_id) FROM {table}))".format(table=table))
+
+    return '; '.join(queries)
+
+
+def _unique_index_query(table, table_name, keys):
+    """Unique index on the `keys` columns, needed by INSERT ... ON CONFLICT"""
+    return 'CREATE UNIQUE INDEX IF NOT EXISTS {index} ON {table} ({keys})'.format(
+        index='{}_{}_key'.format(table_name, '_'.join(keys))[:Column.MAX_LENGTH], table=table, keys=', '.join(keys))
+
+
+def _get_query_columns(table_columns):
+    return [column for column in table_columns if column.name not in NOT_READ_COLUMNS]
+
+
+def _max_value(df, column):
+    values = df.index if column == 'cartodb_id' and column not in df else df[column]
+    value = values.max() if len(values) > 0 else None
+    return None if pd.isnull(value) else value
+
+
+def _sql_value(value):
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return str(value).replace("'", "''")
+
+
 def _save_index_as_column(df):
     index_name = df.index.name
     if index_name is not None:
@@ -442,8 +1156,20 @@ def _save_index_as_column(df):
             df.set_index(index_name, drop=False, inplace=True)
 
 
+def _split_rows(df, max_chunks):
+    chunk_rows = max(int(ceil(len(df) / float(max_chunks))), MIN_UPLOAD_CHUNK_ROWS)
+    if is_arrow_table(df):
+        return [df.slice(start, chunk_rows) for start in range(0, max(len(df), 1), chunk_rows)]
+    return [df.iloc[start:start + chunk_rows] for start in range(0, max(len(df), 1), chunk_rows)]
+
+
+def _column_names(df):
+    """Column names of a DataFrame or an Arrow table"""
+    return df.column_names if is_arrow_table(df) else df.columns
+
+
 def _normalize_column_names(df):
-    column_names = [c for c in df.columns if c not in Column.RESERVED_COLUMN_NAMES]
+    column_names = [c for c in _column_names(df) if c not in Column.RESERVED_COLUMN_NAMES]
     normalized_columns = normalize_names(column_names)
 
     column_tuples = [(norm, orig) for orig, norm in zip(column_names, normalized_columns)]
@@ -480,15 +1206,53 @@ def _get_geom_col_name(df):
     geom_col = getattr(df, '_geometry_column_name', None)
     if geom_col is None:
         try:
-            geom_col = next(x for x in df.columns if x.lower() in Column.SUPPORTED_GEOM_COL_NAMES)
+            geom_col = next(x for x in _column_names(df) if x.lower() in Column.SUPPORTED_GEOM_COL_NAMES)
         except StopIteration:
             pass
 
     return geom_col
 
 
+def _validate_sample(sample, sample_rows, sample_method, limit):
+    if sample is not None and sample_rows is not None:
+        raise ValueError('`sample` and `sample_rows` cannot be used at the same time.')
+
+    if limit is not None:
+        raise ValueError('`limit` cannot be used with `sample` or `sample_rows`.')
+
+    if sample is not None and not (isinstance(sample, (int, float)) and 0 < sample <= 1):
+        raise ValueError('`sample` must be a number greater than 0 and up to 1')
+
+    if sample_rows is not None and not (isinstance(sample_rows, int) and sample_rows > 0):
+        raise ValueError('`sample_rows` must be an integer > 0')
+
+    if sample_method not in (Dataset.SAMPLE_BERNOULLI, Dataset.SAMPLE_SYSTEM):
+        raise ValueError('Wrong sample method `{}`. You can use: {}, {}'.format(
+            sample_method, Dataset.SAMPLE_BERNOULLI, Dataset.SAMPLE_SYSTEM))
+
+
+def _stratified_sample_query(query_columns, source, column, sample=None, sample_rows=None):
+    """Sample the same fraction of the rows with every value of `column`, and
+    at least one row of each value"""
+    if sample is not None:
+        fraction = '{sample:.6g}'.format(sample=sample)
+    else:
+        fraction = '{rows}::float8 / count(*) OVER ()'.format(rows=sample_rows)
+
+    columns = ', '.join(query_columns)
+    return '''SELECT {columns} FROM (
+        SELECT {columns},
+               row_number() OVER (PARTITION BY "{column}" ORDER BY random()) AS _sample_row,
+               count(*) OVER (PARTITION BY "{column}") * {fraction} AS _sample_rows
+        FROM {source}) _s
+    WHERE _sample_row <= ceil(_sample_rows)'''.format(columns=columns, column=column, fraction=fraction,
+                                                      source=source)
+
+
 def _get_geom_col_type(df):
     geom_col = _get_geom_col_name(df)
+    if geom_col is not None and is_arrow_table(df):
+        return arrow_geom_type(df, geom_col)
     if geom_col is not None:
         geom = decode_geometry(_first_value(df[geom_col]))
         if geom is not None:
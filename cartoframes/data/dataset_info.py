@@ -1,12 +1,15 @@
-import time
 from warnings import warn
 
 from carto.datasets import DatasetManager
 from carto.exceptions import CartoException
 
 from .utils import setting_value_exception
+from ..backoff import Backoff
 from ..columns import normalize_name
 
+# seconds waiting for CARTO to register a new table, before giving up
+METADATA_DEADLINE = 60
+
 
 class DatasetInfo(object):
     PRIVATE = 'PRIVATE'
@@ -53,18 +56,16 @@ class DatasetInfo(object):
         if modified:
             self._save_metadata()
 
-    def _get_metadata(self, carto_context, table_name, retries=6, retry_wait_time=1):
+    def _get_metadata(self, carto_context, table_name, deadline=METADATA_DEADLINE):
         ds_manager = DatasetManager(carto_context.auth_client)
-        try:
-            return ds_manager.get(table_name)
-        except Exception as e:
-            if type(e).__name__ == 'NotFoundException' and retries > 0:
-                # if retry_wait_time > 7: # it should be after more than 15 seconds
-                # warn('We are still procesing the CARTO table. Sorry for the delay.')
-                time.sleep(retry_wait_time)
-                self._get_metadata(carto_context=carto_context, table_name=table_name,
-                                   retries=retries-1, retry_wait_time=retry_wait_time*2)
-            else:
+        # new tables are found once CARTO registers them, usually in less than a second
+        backoff = Backoff('metadata', deadline=deadline)
+        while True:
+            try:
+                return ds_manager.get(table_name)
+            except Exception as e:
+                if type(e).__name__ == 'NotFoundException' and backoff.sleep():
+                    continue
                 raise CartoException('We could not get the table metadata.'
                                      'Please, try again in a few seconds or contact support for help')
 
@@ -0,0 +1,388 @@
+import struct
+import binascii as ba
+
+import numpy as np
+import pandas as pd
+
+from carto.exceptions import CartoException
+
+from .encoders import PGCOPY_HEADER, PG_EPOCH_OFFSET_US
+from .utils import decode_wkb
+from ..columns import Column
+
+# wire types of the binary COPY TO query: fixed width ones are never null and
+# go first in every tuple, so only the variable width fields have to be walked
+WIRE_FLOAT8 = 'float8'
+WIRE_INT8 = 'int8'
+WIRE_INT4 = 'int4'
+WIRE_TIMESTAMP = 'timestamp'
+WIRE_NULLABLE_INT8 = 'nullable_int8'
+WIRE_GEOMETRY = 'geometry'
+WIRE_TEXT = 'text'
+
+FIXED_WIRE_TYPES = {
+    WIRE_FLOAT8: '>f8',
+    WIRE_INT8: '>i8',
+    WIRE_INT4: '>i4',
+    WIRE_TIMESTAMP: '>i8'
+}
+
+NULL_BOOL = -1
+NAT = np.iinfo(np.int64).min
+
+# microseconds since the PostgreSQL epoch that fit in a datetime64[ns]
+MAX_TIMESTAMP = np.iinfo(np.int64).max // 1000 - PG_EPOCH_OFFSET_US
+MIN_TIMESTAMP = -(np.iinfo(np.int64).max // 1000) - PG_EPOCH_OFFSET_US
+
+# bytes of the COPY TO result read and decoded at a time
+READ_CHUNK_BYTES = 8 * 1024 * 1024
+
+# fixed width field with the bytes of the variable width fields of each tuple,
+# so the next tuple can be found without reading them
+TUPLE_SIZE_COLUMN = '_cartoframes_tuple_size'
+
+INT16 = struct.Struct('>h')
+INT32 = struct.Struct('>i')
+
+
+class WireColumn(object):
+    def __init__(self, column, position):
+        self.name = column.name
+        self.position = position
+        self.dtype = column.dtype
+        self.wire_type, self.expression = _wire_type(column)
+
+    @property
+    def is_fixed(self):
+        return self.wire_type in FIXED_WIRE_TYPES
+
+
+class TupleLayout(object):
+    """Where the fields of the tuples of a binary COPY TO result are.
+
+    Every tuple has its field count, the fixed width fields, the size of its
+    variable width fields (if there are any) and the variable width fields.
+    """
+    def __init__(self, wire_columns):
+        self.fixed = [column for column in wire_columns if column.is_fixed]
+        self.variable = [column for column in wire_columns if not column.is_fixed]
+        self.nfields = len(wire_columns) + (1 if self.variable else 0)
+
+        # bytes up to the first variable width field
+        self.fixed_size = 2 + sum(4 + np.dtype(FIXED_WIRE_TYPES[c.wire_type]).itemsize for c in self.fixed)
+        if self.variable:
+            self.fixed_size += 8
+            # field count and tuple size
+            self.head = struct.Struct('>h{}xi'.format(self.fixed_size - 6))
+            self.min_size = self.fixed_size + 4 * len(self.variable)
+            # the field count and the lengths of the fixed width fields are the
+            # same in every tuple: (offset, byte) of each of their bytes
+            self.signature = list(enumerate(bytearray(INT16.pack(self.nfields))))
+            offset = 2
+            for size in [np.dtype(FIXED_WIRE_TYPES[c.wire_type]).itemsize for c in self.fixed] + [4]:
+                self.signature += [(offset + i, byte) for i, byte in enumerate(bytearray(INT32.pack(size)))]
+                offset += 4 + size
+
+    def walk(self, buf, position):
+        """Find the complete tuples of `buf` from `position`.
+
+        Returns where the tuples start, where the next one starts and whether
+        the end of the result was found.
+        """
+        end = len(buf)
+        if self.variable:
+            found = self._find_variable(buf, position, end)
+            row_offsets, position = found if found is not None else self._walk_variable(buf, position, end)
+        else:
+            # all the tuples have the same size
+            count = (end - position) // self.fixed_size
+            row_offsets = np.arange(position, position + count * self.fixed_size, self.fixed_size, dtype=np.int64)
+            field_counts = _gather(np.frombuffer(buf, dtype=np.uint8), row_offsets, np.dtype('>i2'))
+            if (field_counts != self.nfields).any():
+                raise CartoException('Unexpected number of fields in the COPY TO result.')
+            position += count * self.fixed_size
+
+        done = end - position >= 2 and INT16.unpack_from(buf, position)[0] == -1
+        return row_offsets, position, done
+
+    def _find_variable(self, buf, position, end):
+        """Find the tuples looking for their signature in the whole buffer.
+
+        Every tuple has to end where the next one starts, otherwise some value
+        looks like a tuple, and None is returned so the tuples are walked.
+        """
+        data = np.frombuffer(buf, dtype=np.uint8)
+        last_head = end - self.fixed_size
+        if last_head < position:
+            return np.empty(0, dtype=np.int64), position
+
+        # the field count low byte discards most positions
+        starts = np.flatnonzero(data[position + 1:last_head + 2] == self.signature[1][1]) + position
+        for offset, byte in self.signature[:1] + self.signature[2:]:
+            starts = starts[data[starts + offset] == byte]
+
+        next_starts = starts + self.min_size + _gather(data, starts + self.fixed_size - 4, np.dtype('>i4'))
+        complete = len(starts) - np.argmax(next_starts[::-1] <= end) if (next_starts <= end).any() else 0
+        if complete == 0 or starts[0] != position or (next_starts[:complete - 1] != starts[1:complete]).any():
+            return None
+        return starts[:complete], int(next_starts[complete - 1])
+
+    def _walk_variable(self, buf, position, end):
+        head = self.head.unpack_from
+        nfields = self.nfields
+        min_size = self.min_size
+        last_head = end - self.fixed_size
+        row_offsets = []
+
+        while position <= last_head:
+            count, size = head(buf, position)
+            if count != nfields:
+                if count == -1:
+                    break
+                raise CartoException('Unexpected number of fields in the COPY TO result.')
+
+            next_position = position + min_size + size
+            if next_position > end:
+                break
+            row_offsets.append(position)
+            position = next_position
+
+        return np.array(row_offsets, dtype=np.int64), position
+
+
+def binary_read_query(query, columns):
+    """Build the binary COPY TO query for `query`, whose result has `columns`.
+
+    Returns the query and the decoding info of its columns, in wire order.
+    """
+    wire_columns = [WireColumn(column, position) for position, column in enumerate(columns)]
+    wire_columns.sort(key=lambda column: not column.is_fixed)
+    expressions = ', '.join(column.expression for column in wire_columns)
+
+    variable = [column for column in wire_columns if not column.is_fixed]
+    if not variable:
+        copy_query = 'COPY (SELECT {expressions} FROM ({query}) _q) TO stdout WITH (FORMAT binary)'.format(
+            expressions=expressions, query=query)
+        return copy_query, wire_columns
+
+    names = ['"{}"'.format(column.name) for column in wire_columns]
+    size = ' + '.join(_field_size(column) for column in variable)
+    names.insert(len(wire_columns) - len(variable), '{} AS "{}"'.format(size, TUPLE_SIZE_COLUMN))
+    copy_query = 'COPY (SELECT {names} FROM (SELECT {expressions} FROM ({query}) _q) _w) ' \
+                 'TO stdout WITH (FORMAT binary)'.format(names=', '.join(names), expressions=expressions,
+                                                         query=query)
+    return copy_query, wire_columns
+
+
+def iter_fields(stream, wire_columns, chunk_bytes=READ_CHUNK_BYTES):
+    """Read a binary COPY TO stream `chunk_bytes` at a time.
+
+    Yields the bytes of the complete tuples read, as a NumPy array, and the
+    fields of each column: the values of the fixed width columns and the
+    offsets and lengths (-1 for nulls) of the variable width ones.
+    """
+    layout = TupleLayout(wire_columns)
+    buf = b''
+    # None until the header is read
+    position = None
+
+    while True:
+        block = stream.read(chunk_bytes)
+        buf = buf[position or 0:] + block
+
+        if position is not None:
+            position = 0
+        elif len(buf) < 19 and block:
+            continue
+        elif buf.startswith(PGCOPY_HEADER[:11]):
+            position = 19 + INT32.unpack_from(buf, 15)[0]
+        else:
+            raise CartoException('The COPY TO result is not in the binary format.')
+
+        row_offsets, position, done = layout.walk(buf, position)
+        if len(row_offsets):
+            data = np.frombuffer(buf, dtype=np.uint8)
+            yield data, _decode_fields(data, row_offsets, layout)
+        if done:
+            return
+        if not block:
+            raise CartoException('The COPY TO result ended unexpectedly.')
+
+
+def read_binary(stream, wire_columns, decode_geom=False):
+    """Decode a binary COPY TO stream into a DataFrame.
+
+    The stream is decoded in chunks, so only the values of the DataFrame and
+    a chunk of the COPY result are in memory at the same time.
+    """
+    chunks = {column.name: [] for column in wire_columns}
+    for data, fields in iter_fields(stream, wire_columns):
+        for column in wire_columns:
+            if column.is_fixed:
+                chunks[column.name].append(fields[column.name])
+            else:
+                offsets, lengths = fields[column.name]
+                chunks[column.name].append(_variable_values(column, data, offsets, lengths, decode_geom))
+
+    values = {}
+    for column in wire_columns:
+        if column.is_fixed:
+            values[column.name] = _fixed_values(column, _concatenate(
+                chunks[column.name], np.dtype(FIXED_WIRE_TYPES[column.wire_type]).newbyteorder('=')))
+        elif column.wire_type == WIRE_NULLABLE_INT8:
+            values[column.name] = _nullable_int_values(
+                _concatenate([v for v, _ in chunks[column.name]], np.int64),
+                _concatenate([n for _, n in chunks[column.name]], bool))
+        else:
+            values[column.name] = _concatenate(chunks[column.name], object)
+
+    df = pd.DataFrame(values, columns=[c.name for c in sorted(wire_columns, key=lambda c: c.position)])
+    if 'cartodb_id' in df:
+        df.set_index('cartodb_id', inplace=True)
+
+    if decode_geom:
+        df.rename({'the_geom': 'geometry'}, axis='columns', inplace=True)
+
+    return df
+
+
+def field_data(data, offsets, lengths):
+    """Bytes of the fields at `offsets`, concatenated in the same order, and
+    the offset of every field in them (one more than fields)"""
+    sizes = np.maximum(lengths, 0)
+    value_offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=value_offsets[1:])
+
+    # position in `data` of every byte of the fields
+    indexes = np.repeat(offsets - value_offsets[:-1], sizes) + np.arange(value_offsets[-1])
+    return data[indexes], value_offsets
+
+
+def timestamp_nulls(values):
+    """Nulls (-infinity), infinity and timestamps out of the datetime64[ns] range"""
+    return (values < MIN_TIMESTAMP) | (values > MAX_TIMESTAMP)
+
+
+def _decode_fields(data, row_offsets, layout):
+    fields = {}
+    position = row_offsets + 2
+    for column in layout.fixed:
+        binary_type = np.dtype(FIXED_WIRE_TYPES[column.wire_type])
+        lengths = _gather(data, position, np.dtype('>i4'))
+        if (lengths != binary_type.itemsize).any():
+            raise CartoException('Unexpected null values in column `{}`.'.format(column.name))
+        fields[column.name] = _gather(data, position + 4, binary_type)
+        position = position + 4 + binary_type.itemsize
+
+    if layout.variable:
+        # tuple size
+        position = position + 8
+
+    for column in layout.variable:
+        lengths = _gather(data, position, np.dtype('>i4'))
+        fields[column.name] = (position + 4, lengths)
+        position = position + 4 + np.maximum(lengths, 0)
+
+    return fields
+
+
+def _gather(data, offsets, dtype):
+    """Read a value of `dtype` at every offset"""
+    if len(offsets) == 0:
+        return np.empty(0, dtype=dtype.newbyteorder('='))
+
+    steps = np.diff(offsets)
+    if len(steps) == 0 or (steps == steps[0]).all() and steps[0] > 0:
+        # evenly spaced values can be read with a strided view of the buffer
+        step = int(steps[0]) if len(steps) else dtype.itemsize
+        view = np.ndarray(shape=(len(offsets),), dtype=dtype, buffer=data, offset=int(offsets[0]), strides=(step,))
+        return view.astype(dtype.newbyteorder('='))
+
+    indexes = offsets[:, None] + np.arange(dtype.itemsize)
+    return data[indexes].reshape(-1).view(dtype).astype(dtype.newbyteorder('='))
+
+
+def _concatenate(arrays, dtype):
+    if not arrays:
+        return np.empty(0, dtype=dtype)
+    return np.concatenate(arrays) if len(arrays) > 1 else arrays[0]
+
+
+def _fixed_values(column, values):
+    if column.wire_type == WIRE_TIMESTAMP:
+        null_mask = timestamp_nulls(values)
+        values = (np.where(null_mask, 0, values) + PG_EPOCH_OFFSET_US).astype('datetime64[us]') \
+            .astype('datetime64[ns]')
+        values[null_mask] = np.datetime64('NaT')
+        return values
+
+    if column.wire_type == WIRE_INT4:
+        # booleans
+        if (values == NULL_BOOL).any():
+            return np.array([bool(v) if v != NULL_BOOL else None for v in values], dtype=object)
+        return values.astype(bool)
+
+    return values
+
+
+def _nullable_int_values(values, nulls):
+    if nulls.any():
+        return pd.arrays.IntegerArray(values, nulls)
+    return values
+
+
+def _variable_values(column, data, offsets, lengths, decode_geom):
+    nulls = lengths < 0
+
+    if column.wire_type == WIRE_NULLABLE_INT8:
+        values = np.zeros(len(lengths), dtype=np.int64)
+        values[~nulls] = _gather(data, offsets[~nulls], np.dtype('>i8'))
+        return values, nulls
+
+    blob, value_offsets = field_data(data, offsets, lengths)
+    blob = blob.tobytes()
+    starts = value_offsets[:-1].tolist()
+    ends = value_offsets[1:].tolist()
+
+    if column.wire_type == WIRE_GEOMETRY:
+        if decode_geom:
+            return decode_wkb([blob[s:e] if not n else None for s, e, n in zip(starts, ends, nulls.tolist())])
+        # hex EWKB, like in the CSV result
+        text = ba.hexlify(blob).decode('ascii').upper()
+        values = [text[2 * s:2 * e] for s, e in zip(starts, ends)]
+    else:
+        try:
+            # ASCII text can be sliced without decoding every value
+            text = blob.decode('ascii')
+            values = [text[s:e] for s, e in zip(starts, ends)]
+        except UnicodeDecodeError:
+            values = [blob[s:e].decode('utf-8') for s, e in zip(starts, ends)]
+
+    values = np.array(values, dtype=object)
+    values[nulls] = np.nan
+    return values
+
+
+def _field_size(column):
+    name = '"{}"'.format(column.name)
+    if column.wire_type == WIRE_NULLABLE_INT8:
+        return '(CASE WHEN {} IS NULL THEN 0 ELSE 8 END)'.format(name)
+    return 'coalesce(octet_length({}), 0)'.format(name)
+
+
+def _wire_type(column):
+    name = '"{}"'.format(column.name)
+
+    if column.name == 'cartodb_id':
+        return WIRE_INT8, '{}::int8 AS {}'.format(name, name)
+    if column.dtype == 'int64':
+        return WIRE_NULLABLE_INT8, '{}::int8 AS {}'.format(name, name)
+    if column.dtype == 'float64':
+        return WIRE_FLOAT8, "coalesce({}::float8, 'NaN'::float8) AS {}".format(name, name)
+    if column.dtype == 'bool':
+        return WIRE_INT4, 'coalesce({}::int4, {}) AS {}'.format(name, NULL_BOOL, name)
+    if column.dtype in Column.DATETIME_DTYPES:
+        return WIRE_TIMESTAMP, "coalesce({}::timestamp, '-infinity'::timestamp) AS {}".format(name, name)
+    if column.pgtype == 'geometry' or column.name in Column.SUPPORTED_GEOM_COL_NAMES:
+        return WIRE_GEOMETRY, 'ST_AsEWKB({}) AS {}'.format(name, name)
+    return WIRE_TEXT, '{}::text AS {}'.format(name, name)
@@ -0,0 +1,235 @@
+import struct
+
+import numpy as np
+import pandas as pd
+
+from .utils import decode_geometries
+
+DEFAULT_CHUNK_ROWS = 50000
+
+CSV_DELIMITER = '|'
+CSV_QUOTE = '"'
+CSV_SPECIAL_CHARS = r'[|"\r\n]'
+
+SRID_PREFIX = 'SRID=4326;'
+SRID = 4326
+
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+PGCOPY_TRAILER = struct.pack('>h', -1)
+
+# microseconds between the unix epoch and the PostgreSQL epoch (2000-01-01)
+PG_EPOCH_OFFSET_US = 946684800000000
+
+EWKB_SRID_FLAG = 0x20000000
+EWKB_POINT_DTYPE = np.dtype([('order', 'u1'), ('type', '<u4'), ('srid', '<u4'), ('x', '<f8'), ('y', '<f8')])
+
+BINARY_DTYPES = {
+    'bool': ('boolean', '?'),
+    'int8': ('smallint', '>i2'),
+    'int16': ('smallint', '>i2'),
+    'int32': ('integer', '>i4'),
+    'int64': ('bigint', '>i8'),
+    'uint8': ('smallint', '>i2'),
+    'uint16': ('integer', '>i4'),
+    'uint32': ('bigint', '>i8'),
+    'uint64': ('bigint', '>i8'),
+    'float32': ('real', '>f4'),
+    'float64': ('double precision', '>f8'),
+}
+
+
+def csv_chunks(df, columns, geom_col=None, with_lnglat=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Encode a DataFrame as COPY FROM csv lines (delimiter `|`), column by column.
+
+    Every chunk of `chunk_rows` rows is yielded as a single bytes object, with
+    the geometry always written as the last column.
+    """
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+
+        encoded = [_encode_column(chunk[col]) for col in columns]
+        if with_lnglat is not None:
+            encoded.append(_encode_lnglat(chunk[with_lnglat[0]], chunk[with_lnglat[1]]))
+        elif geom_col is not None:
+            encoded.append(_encode_geometry(chunk[geom_col]))
+        else:
+            encoded.append([''] * len(chunk))
+
+        lines = '\n'.join(map(CSV_DELIMITER.join, zip(*encoded)))
+        yield (lines + '\n').encode('utf-8')
+
+
+def binary_chunks(df, columns, geom_col=None, with_lnglat=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Encode a DataFrame in the PostgreSQL binary COPY format (PGCOPY).
+
+    Fixed width columns are converted with a single numpy cast and all the
+    fields of a chunk are scattered into one preallocated buffer. The target
+    columns must have the types given by `binary_pgtype`.
+    """
+    yield PGCOPY_HEADER
+
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+
+        fields = [_binary_column(chunk[col]) for col in columns]
+        if with_lnglat is not None:
+            fields.append(_binary_lnglat(chunk[with_lnglat[0]], chunk[with_lnglat[1]]))
+        elif geom_col is not None:
+            fields.append(_binary_geometry(chunk[geom_col]))
+        else:
+            fields.append((np.empty(0, dtype=np.uint8), np.full(len(chunk), -1, dtype=np.int64)))
+
+        yield _pack_tuples(fields, len(chunk))
+
+    yield PGCOPY_TRAILER
+
+
+def binary_pgtype(dtype):
+    """Returns the PostgreSQL type whose binary representation is sent for `dtype`"""
+    if dtype.kind == 'M':
+        return 'timestamp'
+    return BINARY_DTYPES.get(str(dtype).lower(), ('text', None))[0]
+
+
+def _encode_column(series):
+    """Format a whole column as csv text, with nulls as empty strings"""
+    null_mask = np.asarray(series.isnull())
+
+    if series.dtype.kind in 'biuf':
+        values = np.array(series.values.astype(str), dtype=object)
+    else:
+        values = np.array(series.astype(str), dtype=object)
+        if series.dtype.kind == 'O':
+            values = _quote(values, null_mask)
+
+    values[null_mask] = ''
+    return values
+
+
+def _quote(values, null_mask):
+    """Quote the values containing the delimiter, quotes or new lines"""
+    text = pd.Series(values)
+    needs_quote = text.str.contains(CSV_SPECIAL_CHARS, regex=True).fillna(False).values.astype(bool) & ~null_mask
+
+    if needs_quote.any():
+        escaped = text[needs_quote].str.replace(CSV_QUOTE, CSV_QUOTE * 2, regex=False)
+        values[needs_quote] = np.asarray(CSV_QUOTE + escaped + CSV_QUOTE, dtype=object)
+
+    return values
+
+
+def _encode_geometry(series):
+    """Encode a geometry column as EWKB hex strings with the 4326 SRID"""
+    return [SRID_PREFIX + wkb_hex if wkb_hex else '' for wkb_hex in _to_wkb(decode_geometries(series), hex=True)]
+
+
+def _encode_lnglat(lng, lat):
+    """Encode a pair of lng/lat columns as EWKT points with the 4326 SRID"""
+    null_mask = np.asarray(lng.isnull() | lat.isnull())
+    points = SRID_PREFIX + 'POINT(' + lng.astype(str) + ' ' + lat.astype(str) + ')'
+    values = np.array(points, dtype=object)
+    values[null_mask] = ''
+    return values
+
+
+def _binary_column(series):
+    """Returns the concatenated binary values of a column and the length of each field (-1 for nulls)"""
+    null_mask = np.asarray(series.isnull())
+    dtype = series.dtype
+
+    if dtype.kind == 'M':
+        if getattr(dtype, 'tz', None) is not None:
+            series = series.dt.tz_convert('UTC').dt.tz_localize(None)
+        micros = np.asarray(series.values.astype('datetime64[us]').astype(np.int64))
+        return _fixed_width_field(micros - PG_EPOCH_OFFSET_US, '>i8', null_mask)
+
+    binary_type = BINARY_DTYPES.get(str(dtype).lower(), (None, None))[1]
+    if binary_type is not None:
+        values = np.asarray(series.fillna(0) if null_mask.any() else series)
+        return _fixed_width_field(values, binary_type, null_mask)
+
+    texts = series.astype(str).tolist()
+    return _variable_width_field([text.encode('utf-8') if not null else None
+                                  for text, null in zip(texts, null_mask)])
+
+
+def _binary_geometry(series):
+    return _variable_width_field([_ewkb(wkb) if wkb else None
+                                  for wkb in _to_wkb(decode_geometries(series), hex=False)])
+
+
+def _binary_lnglat(lng, lat):
+    null_mask = np.asarray(lng.isnull() | lat.isnull())
+    points = np.zeros(len(lng), dtype=EWKB_POINT_DTYPE)
+    points['order'] = 1
+    points['type'] = 1 | EWKB_SRID_FLAG
+    points['srid'] = SRID
+    points['x'] = np.asarray(lng, dtype=np.float64)
+    points['y'] = np.asarray(lat, dtype=np.float64)
+
+    lengths = np.where(null_mask, -1, EWKB_POINT_DTYPE.itemsize)
+    return points[~null_mask].view(np.uint8), lengths
+
+
+def _fixed_width_field(values, binary_type, null_mask):
+    data = np.ascontiguousarray(values[~null_mask].astype(binary_type)).view(np.uint8)
+    lengths = np.where(null_mask, -1, np.dtype(binary_type).itemsize)
+    return data, lengths
+
+
+def _variable_width_field(values):
+    lengths = np.array([len(value) if value is not None else -1 for value in values], dtype=np.int64)
+    data = np.frombuffer(b''.join(value for value in values if value is not None), dtype=np.uint8)
+    return data, lengths
+
+
+def _pack_tuples(fields, nrows):
+    """Lay out the binary tuples: field count, then length and value of every field"""
+    sizes = [4 + np.maximum(lengths, 0) for data, lengths in fields]
+    row_sizes = 2 + np.sum(sizes, axis=0)
+    offsets = np.cumsum(row_sizes) - row_sizes
+
+    buf = np.empty(int(row_sizes.sum()), dtype=np.uint8)
+    _scatter(buf, offsets, np.full(nrows, len(fields), dtype='>i2').view(np.uint8), 2)
+
+    position = offsets + 2
+    for (data, lengths), size in zip(fields, sizes):
+        _scatter(buf, position, lengths.astype('>i4').view(np.uint8), 4)
+        not_null = lengths >= 0
+        _scatter(buf, position[not_null] + 4, data, lengths[not_null])
+        position = position + size
+
+    return buf.tobytes()
+
+
+def _scatter(buf, offsets, data, lengths):
+    """Copy consecutive slices of `data` (of `lengths` bytes) to `buf` at `offsets`"""
+    lengths = np.broadcast_to(lengths, offsets.shape)
+    if len(data) == 0:
+        return
+
+    sources = np.cumsum(lengths) - lengths
+    buf[np.repeat(offsets - sources, lengths) + np.arange(len(data))] = data
+
+
+def _ewkb(wkb):
+    """Add the 4326 SRID to a WKB geometry"""
+    endian = '<' if wkb[0:1] == b'\x01' else '>'
+    geom_type = struct.unpack(endian + 'I', wkb[1:5])[0]
+    if geom_type & EWKB_SRID_FLAG:
+        # it's already EWKB
+        return wkb
+    return wkb[0:1] + struct.pack(endian + 'II', geom_type | EWKB_SRID_FLAG, SRID) + wkb[5:]
+
+
+def _to_wkb(geoms, hex):
+    try:
+        import shapely
+        to_wkb = shapely.to_wkb
+    except AttributeError:
+        # shapely < 2.0 has no vectorized functions
+        return [(geom.wkb_hex if hex else geom.wkb) if geom else None for geom in geoms]
+
+    array = np.empty(len(geoms), dtype=object)
+    array[:] = [geom if geom else None for geom in geoms]
+    return to_wkb(array, hex=hex)
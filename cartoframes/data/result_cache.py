@@ -0,0 +1,179 @@
+import os
+import glob
+import json
+import hashlib
+import tempfile
+
+from carto.exceptions import CartoException
+
+from .arrow import check_pyarrow, pa
+from .encoders import _to_wkb
+from .schema_cache import normalize_query
+from .utils import decode_geometries
+from ..utils import LazyModule
+
+pq = LazyModule('pyarrow.parquet')
+
+CACHE_OFF = 'off'
+CACHE_USE = 'use'
+CACHE_REFRESH = 'refresh'
+CACHE_MODES = (CACHE_OFF, CACHE_USE, CACHE_REFRESH)
+
+DEFAULT_RESULT_CACHE_SIZE = 1024 ** 3  # 1 GB
+
+RESULT_FILE_EXTENSION = '.parquet'
+
+# Parquet metadata with the columns stored as WKB that were shapely geometries
+GEOMETRY_COLUMNS_METADATA = b'cartoframes.geometry_columns'
+
+
+class ResultCache(object):
+    """DataFrames read from CARTO, stored as files in `directory`.
+
+    Each result is stored with the last update time of the tables used by its
+    query, and it's only valid while they don't change. The least recently
+    used files are removed when the directory takes more than `max_size`
+    bytes. DataFrames are stored as Parquet files with their pandas metadata,
+    so their dtypes (categories, nullable integers...) are restored, and
+    shapely geometries are stored as WKB. It needs pyarrow.
+    """
+    def __init__(self, directory, max_size=DEFAULT_RESULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def load(self, key, version):
+        """DataFrame stored for `key` and `version`, or None"""
+        path = self._path(key, version)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            df = _read_parquet(path)
+        except Exception:
+            # files that can't be read (truncated, written by other versions...) are misses
+            _remove(path)
+            return None
+
+        # mark it as recently used
+        os.utime(path, None)
+        return df
+
+    def store(self, key, version, df):
+        try:
+            table = _to_arrow_table(df)
+        except (pa.ArrowException, TypeError, ValueError):
+            # values that Parquet can't store are never cached
+            return
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        for path in glob.glob(os.path.join(self.directory, _hash(key) + '_*' + RESULT_FILE_EXTENSION)):
+            _remove(path)
+
+        # write to a temporary file first, so an interrupted write is never read
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        os.close(fd)
+        pq.write_table(table, tmp_path)
+        os.rename(tmp_path, self._path(key, version))
+
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used results until they fit in `max_size`"""
+        paths = glob.glob(os.path.join(self.directory, '*' + RESULT_FILE_EXTENSION))
+        stats = sorted(((os.path.getmtime(path), os.path.getsize(path), path) for path in paths), reverse=True)
+
+        size = 0
+        for _, file_size, path in stats:
+            size += file_size
+            if size > self.max_size:
+                _remove(path)
+
+    def clear(self):
+        for path in glob.glob(os.path.join(self.directory, '*' + RESULT_FILE_EXTENSION)):
+            _remove(path)
+
+    def _path(self, key, version):
+        return os.path.join(self.directory, '{}_{}{}'.format(_hash(key), _hash(version), RESULT_FILE_EXTENSION))
+
+
+def cached_read(context, query, cache, options, read):
+    """Return the DataFrame of `read()` for `query`, reusing the cached one if
+    its tables haven't changed (`cache='use'`) or refreshing it (`cache='refresh'`)"""
+    if cache not in CACHE_MODES:
+        raise ValueError('Wrong cache option `{}`. You can use: {}'.format(cache, ', '.join(CACHE_MODES)))
+
+    if cache == CACHE_OFF:
+        return read()
+    check_pyarrow()
+
+    version = get_tables_updated_at(context, query)
+    if version is None:
+        # the result can't be revalidated
+        return read()
+
+    key = result_key(context, query, options)
+    if cache == CACHE_USE:
+        df = context._result_cache.load(key, version)
+        if df is not None:
+            return df
+
+    df = read()
+    context._result_cache.store(key, version, df)
+    return df
+
+
+def get_tables_updated_at(context, query):
+    """Last update time of the tables used by `query`, or None if it's unknown"""
+    try:
+        response = context.sql_client.send(
+            "SELECT max(updated_at) AS updated_at FROM CDB_QueryTables_Updated_At('{query}')".format(
+                query=query.replace("'", "''")),
+            do_post=False)
+    except CartoException as err:
+        context._debug_print(err=err)
+        return None
+
+    rows = response['rows']
+    return rows[0]['updated_at'] if rows else None
+
+
+def result_key(context, query, options):
+    # API keys with different permissions don't share results
+    return '{base_url}|{api_key}|{query}|{options}'.format(
+        base_url=context.creds.base_url(),
+        api_key=hashlib.sha256(str(context.creds.key()).encode('utf-8')).hexdigest(),
+        query=normalize_query(query),
+        options=sorted(options.items()))
+
+
+def _to_arrow_table(df):
+    geometry_columns = [column for column in df.columns if df[column].dtype == object and
+                        hasattr(next(iter(df[column].dropna()), None), 'geom_type')]
+    if geometry_columns:
+        df = df.assign(**{column: _to_wkb(df[column], hex=False) for column in geometry_columns})
+
+    table = pa.Table.from_pandas(df)
+    metadata = dict(table.schema.metadata or {})
+    metadata[GEOMETRY_COLUMNS_METADATA] = json.dumps(geometry_columns).encode('utf-8')
+    return table.replace_schema_metadata(metadata)
+
+
+def _read_parquet(path):
+    table = pq.read_table(path)
+    df = table.to_pandas()
+    for column in json.loads(table.schema.metadata[GEOMETRY_COLUMNS_METADATA].decode('utf-8')):
+        df[column] = decode_geometries(df[column])
+    return df
+
+
+def _hash(text):
+    return hashlib.sha1(str(text).encode('utf-8')).hexdigest()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
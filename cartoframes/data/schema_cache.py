@@ -0,0 +1,66 @@
+import re
+import time
+
+from threading import Lock
+
+# seconds the columns of a query or table are reused before asking the SQL API again
+DEFAULT_SCHEMA_CACHE_TTL = 300
+
+
+class SchemaCache(object):
+    """Columns of the queries and tables read with a context.
+
+    Every read needs the columns of its query to build the COPY and parse the
+    result, so they are kept for `ttl` seconds (0 disables the cache) to
+    avoid planning the same query again on every read. Writes and deletes
+    of a table must invalidate it.
+    """
+    def __init__(self, ttl=DEFAULT_SCHEMA_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = Lock()
+
+    def get(self, key):
+        """Columns stored for the query or table `key`, or None"""
+        if not self.ttl:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(normalize_query(key))
+            if entry is None:
+                return None
+
+            expires, columns = entry
+            if expires < time.time():
+                del self._entries[normalize_query(key)]
+                return None
+
+            return columns
+
+    def set(self, key, columns):
+        if not self.ttl:
+            return
+
+        with self._lock:
+            self._entries[normalize_query(key)] = (time.time() + self.ttl, columns)
+
+    def invalidate(self, table_name=None):
+        """Forget the columns of every query that uses `table_name`, or all of them"""
+        with self._lock:
+            if table_name is None:
+                self._entries.clear()
+                return
+
+            table_regex = re.compile(r'\b{}\b'.format(re.escape(table_name)), re.IGNORECASE)
+            for key in [key for key in self._entries if table_regex.search(key)]:
+                del self._entries[key]
+
+
+def table_key(schema, table_name):
+    """Cache key of the columns of a table"""
+    return 'TABLE "{schema}"."{table_name}"'.format(schema=schema, table_name=table_name)
+
+
+def normalize_query(query):
+    """Query text without differences in spaces or a trailing semicolon"""
+    return ' '.join(query.split()).rstrip(';').strip()
@@ -0,0 +1,67 @@
+"""What the database catalog says about a CARTO table, read in a single
+SQL API call"""
+from ..columns import Column
+
+# one row for the table, or none if it doesn't exist. `publicuser` is the role
+# of the public API keys, that can read the tables with PUBLIC or LINK privacy
+TABLE_METADATA_QUERY = '''
+    SELECT
+        c.reltuples::bigint AS row_estimate,
+        CASE WHEN EXISTS (SELECT 1 FROM pg_catalog.pg_roles WHERE rolname = 'publicuser')
+             THEN has_table_privilege('publicuser', c.oid, 'SELECT')
+             ELSE false
+        END AS is_public,
+        (SELECT json_agg(json_build_object('name', a.attname,
+                                           'type', format_type(a.atttypid, NULL)) ORDER BY a.attnum)
+         FROM pg_catalog.pg_attribute a
+         WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped) AS columns,
+        (SELECT postgis_typmod_type(a.atttypmod)
+         FROM pg_catalog.pg_attribute a
+         WHERE a.attrelid = c.oid AND a.attname = 'the_geom' AND NOT a.attisdropped
+           AND a.atttypmod >= 0) AS geom_type
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = '{schema}' AND c.relname = '{table_name}'
+      AND c.relkind IN ('r', 'v', 'm', 'f', 'p')
+'''
+
+
+class TableMetadata(object):
+    """Existence, columns, estimated number of rows, geometry type and public
+    access of a table.
+
+    `geom_type` is the PostGIS type of the `the_geom` column (`Point`,
+    `MultiPolygon`...) when the column declares it, and `is_public` whether
+    the public API keys can read the table (PUBLIC or LINK privacy).
+    """
+    def __init__(self, exists, columns=None, row_estimate=None, geom_type=None, is_public=None):
+        self.exists = exists
+        self.columns = columns or []
+        self.row_estimate = row_estimate
+        self.geom_type = geom_type
+        self.is_public = is_public
+
+    @staticmethod
+    def from_sql_api_row(row):
+        if row is None:
+            return TableMetadata(exists=False)
+
+        # tables never analyzed have a negative or zero estimate
+        row_estimate = row.get('row_estimate')
+        return TableMetadata(
+            exists=True,
+            columns=[Column(c['name'], pgtype=c['type']) for c in row.get('columns') or []],
+            row_estimate=row_estimate if row_estimate and row_estimate > 0 else None,
+            geom_type=row.get('geom_type'),
+            is_public=row.get('is_public'))
+
+    def __repr__(self):
+        return 'TableMetadata(exists={}, columns={}, row_estimate={}, geom_type={}, is_public={})'.format(
+            self.exists, len(self.columns), self.row_estimate, self.geom_type, self.is_public)
+
+
+def get_table_metadata(context, schema, table_name):
+    """Read the metadata of the table `schema`.`table_name`"""
+    response = context.sql_client.send(TABLE_METADATA_QUERY.format(schema=schema, table_name=table_name))
+    rows = response.get('rows') or []
+    return TableMetadata.from_sql_api_row(rows[0] if rows else None)
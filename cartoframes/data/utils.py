@@ -1,20 +1,40 @@
+import re
 import time
 import binascii as ba
 
+import numpy as np
+
 from warnings import warn
+from requests.exceptions import ConnectionError, ConnectTimeout, Timeout
 from carto.exceptions import CartoException, CartoRateLimitException
 
+from ..backoff import Backoff
 from ..columns import Column
+from ..utils import is_available, LazyModule
 
-try:
-    import geopandas
-    HAS_GEOPANDAS = True
-except ImportError:
-    HAS_GEOPANDAS = False
+# imported when a GeoDataFrame is needed
+geopandas = LazyModule('geopandas')
+HAS_GEOPANDAS = is_available('geopandas')
 
 
 DEFAULT_RETRY_TIMES = 3
 
+HEX_WKB_REGEX = re.compile(r'^(00|01)[0-9a-fA-F]+$')
+
+# text columns with fewer distinct values than this fraction of their rows are read as categories
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+TEXT_PGTYPES = ['string', 'text', 'varchar', 'character varying', 'bpchar', 'character']
+
+GEOM_ENCODING_SHAPELY = 'shapely'
+GEOM_ENCODING_HEX_WKB = 'hex_wkb'
+GEOM_ENCODING_WKB = 'wkb'
+GEOM_ENCODING_WKT = 'wkt'
+
+# gzip is the only Content-Encoding accepted by the COPY FROM endpoint. Levels 1
+# or 2 give the best end-to-end times (compress, send, decompress and load)
+COMPRESSION_GZIP = 'gzip'
+DEFAULT_COMPRESSION_LEVEL = 1
+
 GEOM_COLUMN_NAMES = [
     'geometry',
     'the_geom',
@@ -80,7 +100,7 @@ def _warn_new_geometry_column(df):
 
 
 def _compute_geometry_from_geom(geom):
-    return geom.apply(decode_geometry)
+    return decode_geometries(geom)
 
 
 def _compute_geometry_from_latlng(lat, lng):
@@ -90,10 +110,10 @@ def _compute_geometry_from_latlng(lat, lng):
 
 def _encode_decode_decorator(func):
     """decorator for encoding and decoding geoms"""
-    def wrapper(*args):
+    def wrapper(*args, **kwargs):
         """error catching"""
         try:
-            processed_geom = func(*args)
+            processed_geom = func(*args, **kwargs)
             return processed_geom
         except ImportError as err:
             raise ImportError('The Python package `shapely` needs to be '
@@ -130,26 +150,263 @@ def decode_geometry(ewkb):
                             pass
 
 
-def recursive_read(context, query, retry_times=DEFAULT_RETRY_TIMES):
+@_encode_decode_decorator
+def decode_geometries(values):
+    """Decode a sequence of encoded geometries into shapely geometries.
+
+    The encoding (hex WKB/EWKB, WKB/EWKB bytes or WKT) is detected once from
+    the first value and the whole sequence is decoded in one call. Only the
+    values that can't be decoded that way go through `decode_geometry`.
+    """
+    values = list(values)
+    encoding = _detect_geometry_encoding(next((v for v in values if _is_geometry_value(v)), None))
+
+    if encoding == GEOM_ENCODING_SHAPELY:
+        geoms = [v if hasattr(v, 'geom_type') else None for v in values]
+    elif encoding in (GEOM_ENCODING_HEX_WKB, GEOM_ENCODING_WKB):
+        geoms = decode_wkb([v if isinstance(v, (str, bytes)) else None for v in values], on_invalid='ignore')
+    elif encoding == GEOM_ENCODING_WKT:
+        geoms = _decode_wkt([v if isinstance(v, str) else None for v in values])
+    else:
+        geoms = [None] * len(values)
+
+    result = np.empty(len(values), dtype=object)
+    for i, (value, geom) in enumerate(zip(values, geoms)):
+        if geom is None and _is_geometry_value(value):
+            geom = decode_geometry(value)
+        result[i] = geom
+
+    return result
+
+
+def _detect_geometry_encoding(value):
+    if value is None:
+        return None
+    if hasattr(value, 'geom_type'):
+        return GEOM_ENCODING_SHAPELY
+    if isinstance(value, str) and HEX_WKB_REGEX.match(value):
+        return GEOM_ENCODING_HEX_WKB
+    if isinstance(value, bytes):
+        return GEOM_ENCODING_WKB
+    return GEOM_ENCODING_WKT
+
+
+def _decode_wkt(values):
     try:
-        return context.copy_client.copyto_stream(query)
-    except CartoRateLimitException as err:
-        if retry_times > 0:
-            retry_times -= 1
-            warn('Read call rate limited. Waiting {s} seconds'.format(s=err.retry_after))
-            time.sleep(err.retry_after)
+        import shapely
+        from_wkt = shapely.from_wkt
+    except AttributeError:
+        # shapely < 2.0 has no vectorized functions
+        return [_load_or_none(_wkt_loads, value) for value in values]
+
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return from_wkt(array, on_invalid='ignore')
+
+
+def _is_geometry_value(value):
+    """Whether a value is not null, so it can be decoded as a geometry"""
+    return value is not None and value != '' and not (isinstance(value, float) and np.isnan(value))
+
+
+def _load_or_none(loads, value):
+    if value is None:
+        return None
+    try:
+        return loads(value)
+    except Exception:
+        return None
+
+
+def _wkt_loads(value):
+    from shapely import wkt
+    return wkt.loads(value)
+
+
+def _wkb_loads(value):
+    from shapely import wkb
+    return wkb.loads(value, hex=not isinstance(value, bytes))
+
+
+@_encode_decode_decorator
+def decode_wkb(values, on_invalid='raise'):
+    """Decode a sequence of WKB or EWKB values, as bytes or hex strings (None
+    for nulls), into shapely geometries in one call"""
+    try:
+        import shapely
+        from_wkb = shapely.from_wkb
+    except AttributeError:
+        # shapely < 2.0 has no vectorized functions
+        if on_invalid == 'ignore':
+            return [_load_or_none(_wkb_loads, value) for value in values]
+        return [_wkb_loads(value) if value is not None else None for value in values]
+
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return from_wkb(array, on_invalid=on_invalid)
+
+
+def recursive_read(context, query, retry_times=DEFAULT_RETRY_TIMES):
+    backoff = Backoff('read', max_retries=retry_times)
+    while True:
+        try:
+            return context.copy_client.copyto_stream(query)
+        except CartoRateLimitException as err:
+            delay = backoff.next_delay(err.retry_after)
+            if delay is None:
+                warn(('Read call was rate-limited. '
+                      'This usually happens when there are multiple queries being read at the same time.'))
+                raise err
+
+            warn('Read call rate limited. Waiting {s:.1f} seconds'.format(s=delay))
+            time.sleep(delay)
             warn('Retrying...')
-            return recursive_read(context, query, retry_times=retry_times)
-        else:
-            warn(('Read call was rate-limited. '
-                  'This usually happens when there are multiple queries being read at the same time.'))
-            raise err
+        except CartoException as err:
+            # reads don't change the data, so they can be sent again after any network or server error
+            if not is_transient_error(err):
+                raise err
+
+            delay = backoff.next_delay()
+            if delay is None:
+                raise err
+
+            warn('Read call failed ({err}). Retrying...'.format(err=err))
+            time.sleep(delay)
+
+
+def recursive_write(context, query, data, retry_times=DEFAULT_RETRY_TIMES,
+                    compression=COMPRESSION_GZIP, compression_level=DEFAULT_COMPRESSION_LEVEL):
+    """COPY FROM the iterable returned by `data()`. COPY is atomic, so a failed
+    call can be retried from the beginning of the data. Only the calls that
+    never reached CARTO (rate limited, or that couldn't connect) are retried:
+    after a timeout or a server error the rows may have been committed.
+
+    With gzip `compression` the chunks are compressed one by one while they are
+    being sent, so the payload is never held in memory."""
+    backoff = Backoff('write', max_retries=retry_times)
+    while True:
+        try:
+            return context.copy_client.copyfrom(query, data(), compress=compression == COMPRESSION_GZIP,
+                                                compression_level=compression_level)
+        except CartoRateLimitException as err:
+            delay = backoff.next_delay(err.retry_after)
+            if delay is None:
+                warn(('Write call was rate-limited. '
+                      'This usually happens when there are multiple queries being written at the same time.'))
+                raise err
+
+            warn('Write call rate limited. Waiting {s:.1f} seconds'.format(s=delay))
+            time.sleep(delay)
+            warn('Retrying...')
+        except CartoException as err:
+            if not is_connect_error(err):
+                raise err
+
+            delay = backoff.next_delay()
+            if delay is None:
+                raise err
+
+            warn('Write call failed ({err}). Retrying...'.format(err=err))
+            time.sleep(delay)
+
+
+def validate_compression(compression, compression_level):
+    if compression not in (None, COMPRESSION_GZIP):
+        raise ValueError('Wrong compression `{}`. You can use: None, {}'.format(compression, COMPRESSION_GZIP))
+
+    if not (isinstance(compression_level, int) and 1 <= compression_level <= 9):
+        raise ValueError('`compression_level` must be an integer between 1 and 9')
+
+
+def is_transient_error(err):
+    """Network errors and 5xx responses are worth retrying"""
+    cause = err.args[0] if err.args else None
+    # the errors of the CARTO API responses carry their HTTP status code
+    return isinstance(cause, (ConnectionError, Timeout)) or (getattr(cause, 'status_code', None) or 0) >= 500
+
+
+def is_connect_error(err):
+    """The request couldn't connect to CARTO (refused or timed out), so it was never sent"""
+    cause = err.args[0] if err.args else None
+    if isinstance(cause, ConnectTimeout):
+        return True
+
+    if isinstance(cause, ConnectionError) and cause.args:
+        # requests wraps the connection error of urllib3 (or its subclasses,
+        # like the name resolution errors)
+        reason = getattr(cause.args[0], 'reason', cause.args[0])
+        return any(cls.__name__ == 'NewConnectionError' for cls in type(reason).__mro__)
+
+    return False
 
 
 def get_columns(context, query):
-    col_query = '''SELECT * FROM ({query}) _q LIMIT 0'''.format(query=query)
-    table_info = context.sql_client.send(col_query)
-    return Column.from_sql_api_fields(table_info['fields'])
+    columns = context._schema_cache.get(query)
+    if columns is None:
+        col_query = '''SELECT * FROM ({query}) _q LIMIT 0'''.format(query=query)
+        table_info = context.sql_client.send(col_query)
+        columns = Column.from_sql_api_fields(table_info['fields'])
+        context._schema_cache.set(query, columns)
+    return columns
+
+
+def get_many_columns(context, queries):
+    """Columns of every query. The ones that are not in the schema cache are
+    looked up together, with a request for the names of their columns and
+    another one for their types."""
+    queries_columns = [context._schema_cache.get(query) for query in queries]
+    missing = [i for i, columns in enumerate(queries_columns) if columns is None]
+    if not missing:
+        return queries_columns
+
+    # joined ON false, the queries give a row of nulls with their columns
+    joins = {i: 'LEFT JOIN ({query}) _q{i} ON false'.format(query=queries[i].strip().rstrip(';'), i=i)
+             for i in missing}
+    names_query = 'SELECT {}'.format(', '.join(
+        '(SELECT json_agg(_k.name) FROM json_object_keys((SELECT to_json(_r) FROM '
+        '(SELECT _q{i}.* FROM (SELECT 1) _o {join}) _r)) _k(name)) AS q{i}'.format(i=i, join=joins[i])
+        for i in missing))
+    names = context.sql_client.send(names_query)['rows'][0]
+    names = {i: names['q{}'.format(i)] or [] for i in missing}
+
+    aliases = ['_q{i}."{name}" AS q{i}_{j}'.format(i=i, j=j, name=name.replace('"', '""'))
+               for i in missing for j, name in enumerate(names[i])]
+    fields = {}
+    if aliases:
+        types_query = 'SELECT {aliases} FROM (SELECT 1) _o {joins}'.format(
+            aliases=', '.join(aliases), joins=' '.join(joins[i] for i in missing))
+        fields = context.sql_client.send(types_query)['fields']
+
+    for i in missing:
+        queries_columns[i] = [Column(name, normalize=False, pgtype=fields['q{}_{}'.format(i, j)]['type'],
+                                     dbtype=fields['q{}_{}'.format(i, j)].get('pgtype'))
+                              for j, name in enumerate(names[i])]
+        context._schema_cache.set(queries[i], queries_columns[i])
+
+    return queries_columns
+
+
+def compact_dataframe(df, columns, categories=True):
+    """Cast the columns of a fetched DataFrame to their compact dtypes, and
+    the text ones with few distinct values to categories unless `categories`
+    is False"""
+    for column in columns:
+        if column.name not in df or column.name == 'cartodb_id':
+            continue
+
+        values = df[column.name]
+        if column.compact_dtype != column.dtype:
+            if str(values.dtype) != column.compact_dtype:
+                df[column.name] = values.astype(column.compact_dtype)
+        elif categories and (column.dbtype or column.pgtype) in TEXT_PGTYPES and _is_low_cardinality(values):
+            df[column.name] = values.astype('category')
+
+    return df
+
+
+def _is_low_cardinality(values):
+    is_text = values.dtype == object or values.dtype.name in ('str', 'string')
+    return is_text and len(values) > 0 and values.nunique() <= CATEGORY_MAX_UNIQUE_RATIO * len(values)
 
 
 def setting_value_exception(prop, value):
@@ -110,9 +110,11 @@ class Examples(CartoContext):
     """
 
     def __init__(self):
+        # checked on first use, so importing the examples doesn't call the API
         super(Examples, self).__init__(
             base_url=EXAMPLE_BASE_URL,
-            api_key=EXAMPLE_API_KEY
+            api_key=EXAMPLE_API_KEY,
+            lazy=True
         )
 
     # example dataset read methods
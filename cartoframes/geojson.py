@@ -3,11 +3,11 @@ from __future__ import absolute_import
 import base64
 import numpy as np
 
-try:
-    import geopandas
-    HAS_GEOPANDAS = True
-except ImportError:
-    HAS_GEOPANDAS = False
+from .utils import is_available, LazyModule
+
+# imported when a GeoDataFrame is needed
+geopandas = LazyModule('geopandas')
+HAS_GEOPANDAS = is_available('geopandas')
 
 
 def load_geojson(input_data):
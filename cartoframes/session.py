@@ -0,0 +1,51 @@
+"""requests session shared by the CARTO API clients of a context"""
+from requests import Session
+from requests.adapters import HTTPAdapter, Retry
+
+# connections kept open to the CARTO host, for concurrent reads and writes
+DEFAULT_POOL_SIZE = 10
+
+# retries of the requests that fail to connect, or of the idempotent
+# requests answered with a gateway error
+DEFAULT_HTTP_RETRIES = 3
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUS_CODES = (502, 503, 504)
+
+
+def create_session(pool_size=DEFAULT_POOL_SIZE, retries=DEFAULT_HTTP_RETRIES, session=None):
+    """Session that keeps up to `pool_size` connections alive per host, to
+    reuse them across the SQL, COPY, Batch, Maps and Kuviz API calls instead
+    of opening a connection (and a TLS handshake) per request.
+
+    Requests that can't connect, and GET, PUT or DELETE requests answered
+    with 502, 503 or 504, are retried `retries` times with exponential
+    backoff. Rate limited requests (429) are not retried here: the CARTO
+    clients raise them to be retried after the time the API asks for.
+
+    Args:
+        pool_size (int, optional): Connections kept open per host.
+        retries (int, optional): Retries of a failed request. 0 disables them.
+        session (requests.Session, optional): Session to configure, to keep
+          its settings (e.g. `verify`). A new one by default.
+
+    Returns:
+        requests.Session
+
+    Example:
+
+        .. code:: python
+
+            from cartoframes import CartoContext
+            from cartoframes.session import create_session
+
+            cc = CartoContext(BASEURL, APIKEY, session=create_session(pool_size=20))
+    """
+    session = session or Session()
+    retry = Retry(total=retries, connect=retries, read=0, status=retries,
+                  backoff_factor=RETRY_BACKOFF_FACTOR,
+                  status_forcelist=RETRY_STATUS_CODES,
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_maxsize=pool_size, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
@@ -1,6 +1,7 @@
 """general utility functions"""
 
 import re
+import importlib
 import sys
 import hashlib
 
@@ -117,3 +118,37 @@ def merge_dicts(dict1, dict2):
 
 def text_match(regex, text):
     return len(re.findall(regex, text, re.MULTILINE)) > 0
+
+
+def is_available(module_name):
+    """Whether a module can be imported, without importing it"""
+    try:
+        from importlib.util import find_spec
+    except ImportError:
+        # Python 2
+        import imp
+        try:
+            imp.find_module(module_name)
+            return True
+        except ImportError:
+            return False
+
+    return find_spec(module_name) is not None
+
+
+class LazyModule(object):
+    """Module imported the first time one of its attributes is used, to keep
+    heavy optional dependencies out of `import cartoframes`"""
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+
+def is_geodataframe(data):
+    """Whether `data` is a GeoDataFrame. If geopandas hasn't been imported
+    there can't be one, so it isn't imported to check it."""
+    geopandas = sys.modules.get('geopandas')
+    return geopandas is not None and isinstance(data, geopandas.GeoDataFrame)
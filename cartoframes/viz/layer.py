@@ -7,12 +7,7 @@ from .style import Style
 from .popup import Popup
 from .legend import Legend
 from ..data import Dataset
-
-try:
-    import geopandas
-    HAS_GEOPANDAS = True
-except ImportError:
-    HAS_GEOPANDAS = False
+from ..utils import is_geodataframe
 
 
 class Layer(object):
@@ -111,8 +106,7 @@ class Layer(object):
 
 def _set_source(source, context):
     """Set a Source class from the input"""
-    if isinstance(source, (str, list, dict, Dataset, pandas.DataFrame)) or \
-       HAS_GEOPANDAS and isinstance(source, geopandas.GeoDataFrame):
+    if isinstance(source, (str, list, dict, Dataset, pandas.DataFrame)) or is_geodataframe(source):
         return Source(source, context)
     elif isinstance(source, Source):
         return source
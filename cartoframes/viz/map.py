@@ -4,7 +4,6 @@ import collections
 import numpy as np
 
 from warnings import warn
-from jinja2 import Environment, PackageLoader
 from carto.exceptions import CartoException
 
 from . import constants
@@ -418,6 +417,8 @@ def _conv2nan(val):
 
 class HTMLMap(object):
     def __init__(self, template_path='viz/basic.html.j2'):
+        from jinja2 import Environment, PackageLoader
+
         self.width = None
         self.height = None
         self.srcdoc = None
@@ -6,12 +6,7 @@ import pandas
 from . import defaults
 from ..geojson import get_encoded_data, get_bounds
 from ..data import Dataset, get_query, get_geodataframe
-
-try:
-    import geopandas
-    HAS_GEOPANDAS = True
-except ImportError:
-    HAS_GEOPANDAS = False
+from ..utils import is_geodataframe
 
 
 class SourceType:
@@ -152,7 +147,7 @@ class Source(object):
         elif isinstance(data, (list, dict)):
             self._init_source_geojson(data, bounds)
 
-        elif HAS_GEOPANDAS and isinstance(data, geopandas.GeoDataFrame):
+        elif is_geodataframe(data):
             self._init_source_geodataframe(data, bounds)
 
         elif isinstance(data, pandas.DataFrame):
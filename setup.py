@@ -32,10 +32,14 @@ REQUIRES = [
 EXTRAS_REQUIRE = {
     ':python_version == "2.7"': [
         'IPython>=5.0.0,<6.0.0',
+        'futures>=3.0.5',
     ],
     ':python_version >= "3.4"': [
         'IPython>=6.0.0'
     ],
+    'arrow': [
+        'pyarrow>=0.15.0'
+    ],
 }
 
 PACKAGE_DATA = {
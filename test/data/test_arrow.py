@@ -0,0 +1,143 @@
+"""Unit tests for cartoframes.data.arrow"""
+import io
+import struct
+import unittest
+
+import pandas as pd
+
+from cartoframes.columns import Column
+from cartoframes.data import Dataset
+from cartoframes.data.dataset import _normalize_column_names
+from cartoframes.data.arrow import HAS_PYARROW, read_arrow, read_arrow_batches, arrow_chunks, arrow_pgtype
+from cartoframes.data.decoders import binary_read_query
+from cartoframes.data.encoders import binary_chunks, binary_pgtype, PGCOPY_HEADER, PGCOPY_TRAILER
+
+from mocks.context_mock import ContextMock
+
+if HAS_PYARROW:
+    import pyarrow as pa
+
+POINT_WKB = struct.pack('<BIdd', 1, 1, 1, 2)
+POINT_EWKB = struct.pack('<BIIdd', 1, 0x20000001, 4326, 1, 2)
+
+
+def field(fmt, value):
+    data = struct.pack(fmt, value) if fmt else value
+    return struct.pack('>i', len(data)) + data
+
+
+def null():
+    return struct.pack('>i', -1)
+
+
+def row(fixed, variable=()):
+    fields = list(fixed)
+    if variable:
+        fields.append(field('>i', sum(max(len(f) - 4, 0) for f in variable)))
+    fields.extend(variable)
+    return struct.pack('>h', len(fields)) + b''.join(fields)
+
+
+class CopyClientMock(object):
+    def __init__(self):
+        self.queries = []
+        self.payloads = []
+
+    def copyfrom(self, query, data, compress=True, compression_level=1):
+        self.queries.append(query)
+        self.payloads.append(b''.join(data))
+
+
+@unittest.skipIf(not HAS_PYARROW, 'pyarrow is not installed')
+class TestReadArrow(unittest.TestCase):
+    def setUp(self):
+        columns = [
+            Column('cartodb_id', normalize=False, pgtype='number'),
+            Column('name', normalize=False, pgtype='string'),
+            Column('value', normalize=False, pgtype='number'),
+            Column('flag', normalize=False, pgtype='boolean'),
+            Column('the_geom', normalize=False, pgtype='geometry')
+        ]
+        # wire order: cartodb_id, value, flag, name, the_geom
+        self.tuples = b''.join([
+            row([field('>q', 1), field('>d', 1.5), field('>i', 1)],
+                [field(None, u'caf\xe9'.encode('utf-8')), field(None, POINT_EWKB)]),
+            row([field('>q', 2), field('>d', float('nan')), field('>i', -1)], [null(), null()])
+        ])
+        _, self.wire_columns = binary_read_query('SELECT * FROM fake_table', columns)
+
+    def test_read_arrow(self):
+        stream = PGCOPY_HEADER + self.tuples + PGCOPY_TRAILER
+        table = read_arrow(io.BytesIO(stream), self.wire_columns)
+
+        self.assertEqual(table.column_names, ['cartodb_id', 'name', 'value', 'flag', 'the_geom'])
+        self.assertEqual(table.column('cartodb_id').to_pylist(), [1, 2])
+        self.assertEqual(table.column('name').to_pylist(), [u'caf\xe9', None])
+        self.assertEqual(table.column('value').to_pylist(), [1.5, None])
+        self.assertEqual(table.column('flag').to_pylist(), [True, None])
+        self.assertEqual(table.column('the_geom').to_pylist(), [POINT_EWKB, None])
+
+    def test_read_arrow_batches(self):
+        stream = PGCOPY_HEADER + self.tuples * 20 + PGCOPY_TRAILER
+        batches = list(read_arrow_batches(io.BytesIO(stream), self.wire_columns, chunk_bytes=200))
+        table = pa.Table.from_batches(batches)
+
+        self.assertGreater(len(batches), 1)
+        self.assertEqual(table.num_rows, 40)
+        self.assertEqual(table.column('name').to_pylist()[:4], [u'caf\xe9', None, u'caf\xe9', None])
+        self.assertEqual(table, read_arrow(io.BytesIO(stream), self.wire_columns))
+
+    def test_read_arrow_empty(self):
+        table = read_arrow(io.BytesIO(PGCOPY_HEADER + PGCOPY_TRAILER), self.wire_columns)
+
+        self.assertEqual(table.num_rows, 0)
+        self.assertEqual(table.schema.field('name').type, pa.string())
+        self.assertEqual(table.schema.field('the_geom').type, pa.binary())
+
+
+@unittest.skipIf(not HAS_PYARROW, 'pyarrow is not installed')
+class TestArrowChunks(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'id': [1, 2, 3],
+            'value': [1.5, None, 3.0],
+            'name': ['a', None, 'c|d'],
+            'flag': [True, False, True],
+            'date': pd.to_datetime(['2019-01-01', None, '2019-01-03']),
+            'geom': [POINT_WKB, None, POINT_EWKB]
+        })
+
+    def test_arrow_chunks_as_binary_chunks(self):
+        columns = ['id', 'value', 'name', 'flag', 'date']
+        table = pa.Table.from_pandas(self.df, preserve_index=False)
+
+        self.assertEqual(b''.join(arrow_chunks(table, columns, 'geom', chunk_rows=2)),
+                         b''.join(binary_chunks(self.df, columns, 'geom', chunk_rows=2)))
+
+    def test_arrow_pgtype(self):
+        table = pa.Table.from_pandas(self.df, preserve_index=False)
+
+        for name in ['id', 'value', 'name', 'flag', 'date']:
+            self.assertEqual(arrow_pgtype(table.schema.field(name).type), binary_pgtype(self.df.dtypes[name]))
+
+    def test_dataset_from_arrow(self):
+        batch = pa.RecordBatch.from_pandas(self.df, preserve_index=False)
+        dataset = Dataset.from_arrow([batch, batch])
+
+        self.assertEqual(dataset.to_arrow().num_rows, 6)
+        self.assertEqual(sum(b.num_rows for b in dataset.to_arrow(batches=True)), 6)
+        self.assertIsNone(dataset.dataframe)
+
+    def test_dataset_from_arrow_copyfrom(self):
+        context = ContextMock(username='fake_username', api_key='fake_api_key')
+        context.copy_client = CopyClientMock()
+        dataset = Dataset.from_arrow(pa.Table.from_pandas(self.df, preserve_index=False))
+        dataset._table_name = 'fake_table'
+        dataset._cc = context
+        dataset._normalized_column_names = _normalize_column_names(dataset.to_arrow())
+
+        dataset._copyfrom(format=Dataset.FORMAT_BINARY, max_workers=2)
+
+        self.assertIn('FORMAT binary', context.copy_client.queries[0])
+        self.assertEqual(context.copy_client.payloads[0],
+                         b''.join(binary_chunks(self.df, ['id', 'value', 'name', 'flag', 'date'], 'geom')))
@@ -6,7 +6,7 @@ from shapely.geometry import Point
 from geopandas.geoseries import GeoSeries
 
 from cartoframes.data import Dataset
-from cartoframes.data.utils import compute_query, compute_geodataframe
+from cartoframes.data.utils import compute_query, compute_geodataframe, decode_geometries
 
 from mocks.context_mock import ContextMock
 
@@ -116,3 +116,25 @@ class TestDataUtils(unittest.TestCase):
         ds = Dataset.from_dataframe(pd.DataFrame({'longitude': self.lng}))
         with self.assertRaises(ValueError, msg=self.msg):
             compute_geodataframe(ds)
+
+    def test_decode_geometries_hex_wkb(self):
+        geoms = decode_geometries(self.geom + [None, ''])
+        self.assertEqual(list(geoms[:3]), list(self.geometry))
+        self.assertEqual(list(geoms[3:]), [None, None])
+
+    def test_decode_geometries_ewkb_bytes(self):
+        ewkb = bytes(bytearray.fromhex('0101000020E610000000000000000024400000000000002E40'))
+        geoms = decode_geometries([ewkb, float('nan')])
+        self.assertEqual(list(geoms), [Point([10, 15]), None])
+
+    def test_decode_geometries_wkt(self):
+        geoms = decode_geometries(pd.Series(['POINT (0 0)', 'POINT (10 15)', None]))
+        self.assertEqual(list(geoms), [Point([0, 0]), Point([10, 15]), None])
+
+    def test_decode_geometries_shapely(self):
+        geoms = decode_geometries(self.geometry)
+        self.assertEqual(list(geoms), list(self.geometry))
+
+    def test_decode_geometries_mixed_encodings(self):
+        geoms = decode_geometries([self.geom[1], 'POINT (20 30)', 'wrong'])
+        self.assertEqual(list(geoms), [Point([10, 15]), Point([20, 30]), None])
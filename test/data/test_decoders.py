@@ -0,0 +1,153 @@
+"""Unit tests for cartoframes.data.decoders"""
+import io
+import struct
+import unittest
+
+from carto.exceptions import CartoException
+from shapely.geometry import Point
+
+from cartoframes.columns import Column
+from cartoframes.data.decoders import binary_read_query, iter_fields, read_binary
+from cartoframes.data.encoders import PGCOPY_HEADER, PGCOPY_TRAILER
+
+POINT_EWKB = struct.pack('<BIIdd', 1, 0x20000001, 4326, 1, 2)
+
+
+def field(fmt, value):
+    data = struct.pack(fmt, value) if fmt else value
+    return struct.pack('>i', len(data)) + data
+
+
+def null():
+    return struct.pack('>i', -1)
+
+
+def row(fixed, variable=()):
+    """Tuple with its fixed width fields, the size of the variable width ones and them"""
+    fields = list(fixed)
+    if variable:
+        fields.append(field('>i', sum(max(len(f) - 4, 0) for f in variable)))
+    fields.extend(variable)
+    return struct.pack('>h', len(fields)) + b''.join(fields)
+
+
+class TestReadBinary(unittest.TestCase):
+    """Tests for the COPY TO binary (PGCOPY) decoder"""
+
+    def setUp(self):
+        self.columns = [
+            Column('cartodb_id', normalize=False, pgtype='number'),
+            Column('name', normalize=False, pgtype='string'),
+            Column('value', normalize=False, pgtype='number'),
+            Column('flag', normalize=False, pgtype='boolean'),
+            Column('created', normalize=False, pgtype='date'),
+            Column('the_geom', normalize=False, pgtype='geometry')
+        ]
+        # wire order: cartodb_id, value, flag, created, name, the_geom
+        self.stream = PGCOPY_HEADER + b''.join([
+            row([field('>q', 1), field('>d', 1.5), field('>i', 1), field('>q', 1000000)],
+                [field(None, u'caf\xe9'.encode('utf-8')), field(None, POINT_EWKB)]),
+            row([field('>q', 2), field('>d', float('nan')), field('>i', 0), field('>q', -2 ** 63)],
+                [null(), null()])
+        ]) + PGCOPY_TRAILER
+
+    def test_binary_read_query(self):
+        query, wire_columns = binary_read_query('SELECT * FROM fake_table', self.columns)
+
+        self.assertEqual([c.name for c in wire_columns],
+                         ['cartodb_id', 'value', 'flag', 'created', 'name', 'the_geom'])
+        self.assertTrue(query.startswith('COPY (SELECT "cartodb_id", "value", "flag", "created", '
+                                         'coalesce(octet_length("name"), 0) + coalesce(octet_length("the_geom"), 0) '
+                                         'AS "_cartoframes_tuple_size", "name", "the_geom" FROM '
+                                         '(SELECT "cartodb_id"::int8 AS "cartodb_id", '
+                                         'coalesce("value"::float8, \'NaN\'::float8) AS "value"'))
+        self.assertTrue(query.endswith('FROM (SELECT * FROM fake_table) _q) _w) TO stdout WITH (FORMAT binary)'))
+
+    def test_read_binary(self):
+        _, wire_columns = binary_read_query('SELECT * FROM fake_table', self.columns)
+        df = read_binary(io.BytesIO(self.stream), wire_columns)
+
+        self.assertEqual(list(df.index), [1, 2])
+        self.assertEqual(list(df.columns), ['name', 'value', 'flag', 'created', 'the_geom'])
+        self.assertEqual(df['value'].iloc[0], 1.5)
+        self.assertTrue(df['value'].isnull().iloc[1])
+        self.assertEqual(list(df['flag']), [True, False])
+        self.assertEqual(str(df['created'].iloc[0]), '2000-01-01 00:00:01')
+        self.assertTrue(df['created'].isnull().iloc[1])
+        self.assertEqual(df['name'].iloc[0], u'caf\xe9')
+        self.assertTrue(df['name'].isnull().iloc[1])
+        self.assertEqual(df['the_geom'].iloc[0], '0101000020E6100000000000000000F03F0000000000000040')
+
+    def test_read_binary_decode_geom(self):
+        _, wire_columns = binary_read_query('SELECT * FROM fake_table', self.columns)
+        df = read_binary(io.BytesIO(self.stream), wire_columns, decode_geom=True)
+
+        self.assertTrue(df['geometry'].iloc[0].equals(Point(1, 2)))
+        self.assertIsNone(df['geometry'].iloc[1])
+
+    def test_read_binary_fixed_width_columns(self):
+        _, wire_columns = binary_read_query('SELECT * FROM fake_table', self.columns[:3:2])
+        stream = PGCOPY_HEADER + b''.join([
+            row([field('>q', i), field('>d', i / 2.0)]) for i in range(1, 4)
+        ]) + PGCOPY_TRAILER
+        df = read_binary(io.BytesIO(stream), wire_columns)
+
+        self.assertEqual(list(df.index), [1, 2, 3])
+        self.assertEqual(list(df['value']), [0.5, 1.0, 1.5])
+
+    def test_read_binary_chunks(self):
+        _, wire_columns = binary_read_query('SELECT * FROM fake_table', self.columns)
+        stream = PGCOPY_HEADER + self.stream[len(PGCOPY_HEADER):-2] * 50 + PGCOPY_TRAILER
+        # tuples split between chunks
+        fields = list(iter_fields(io.BytesIO(stream), wire_columns, chunk_bytes=100))
+        df = read_binary(io.BytesIO(stream), wire_columns)
+
+        self.assertGreater(len(fields), 1)
+        self.assertEqual(sum(len(f['cartodb_id']) for _, f in fields), 100)
+        self.assertEqual(len(df), 100)
+        self.assertEqual(list(df['name'].iloc[:2].fillna('')), [u'caf\xe9', ''])
+
+    def test_read_binary_values_like_tuples(self):
+        _, wire_columns = binary_read_query('SELECT * FROM fake_table', self.columns)
+        fake_tuple = row([field('>q', 3), field('>d', 0), field('>i', 0), field('>q', 0)],
+                         [field(None, b''), field(None, b'')])
+        stream = PGCOPY_HEADER + b''.join([
+            row([field('>q', 1), field('>d', 1.5), field('>i', 1), field('>q', 0)],
+                [field(None, fake_tuple), null()]),
+            row([field('>q', 2), field('>d', 2.5), field('>i', 0), field('>q', 0)], [null(), null()])
+        ]) + PGCOPY_TRAILER
+        df = read_binary(io.BytesIO(stream), wire_columns)
+
+        self.assertEqual(list(df.index), [1, 2])
+        self.assertEqual(df['name'].iloc[0], fake_tuple.decode('ascii'))
+
+    def test_read_binary_nullable_integers(self):
+        columns = [Column('cartodb_id', normalize=False, pgtype='number'),
+                   Column('count', normalize=False, pgtype='int')]
+        query, wire_columns = binary_read_query('SELECT * FROM fake_table', columns)
+        stream = PGCOPY_HEADER + row([field('>q', 1)], [field('>q', 10)]) + \
+            row([field('>q', 2)], [null()]) + PGCOPY_TRAILER
+        df = read_binary(io.BytesIO(stream), wire_columns)
+
+        self.assertIn('(CASE WHEN "count" IS NULL THEN 0 ELSE 8 END)', query)
+        self.assertEqual(str(df['count'].dtype), 'Int64')
+        self.assertEqual(df['count'].iloc[0], 10)
+        self.assertTrue(df['count'].isnull().iloc[1])
+
+    def test_read_binary_infinite_timestamps(self):
+        columns = [Column('cartodb_id', normalize=False, pgtype='number'),
+                   Column('created', normalize=False, pgtype='date')]
+        _, wire_columns = binary_read_query('SELECT * FROM fake_table', columns)
+        stream = PGCOPY_HEADER + b''.join([
+            row([field('>q', i), field('>q', value)])
+            for i, value in enumerate([2 ** 63 - 1, -2 ** 63, 2 ** 62, 0])
+        ]) + PGCOPY_TRAILER
+        df = read_binary(io.BytesIO(stream), wire_columns)
+
+        self.assertEqual(list(df['created'].isnull()), [True, True, True, False])
+        self.assertEqual(str(df['created'].iloc[3]), '2000-01-01 00:00:00')
+
+    def test_read_binary_truncated(self):
+        _, wire_columns = binary_read_query('SELECT * FROM fake_table', self.columns)
+        with self.assertRaises(CartoException):
+            read_binary(io.BytesIO(self.stream[:-10]), wire_columns)
@@ -0,0 +1,183 @@
+"""Unit tests for the COPY TO download of cartoframes.data.Dataset"""
+import re
+import unittest
+
+from carto.exceptions import CartoException
+from pyrestcli.exceptions import ServerErrorException
+
+from cartoframes.data import Dataset
+
+from mocks.api_mock import APIContextMock, table_metadata_rows
+
+FIELDS = {
+    'cartodb_id': {'type': 'number'},
+    'value': {'type': 'number'}
+}
+
+
+def table_rows(query):
+    if 'pg_catalog.pg_class' in query:
+        return table_metadata_rows([('cartodb_id', 'integer'), ('value', 'double precision')])
+    if 'min(cartodb_id)' in query:
+        return [{'min_id': 1, 'max_id': 10}]
+
+
+def table_csv(query):
+    match = re.search(r'cartodb_id >= (\d+) AND cartodb_id < (\d+)', query)
+    start, end = (int(match.group(1)), int(match.group(2))) if match else (1, 11)
+    rows = ['{id},{value}'.format(id=i, value=i * 10) for i in range(start, min(end, 11))]
+    return '\n'.join(['cartodb_id,value'] + rows) + '\n'
+
+
+class TestDatasetDownload(unittest.TestCase):
+    def setUp(self):
+        self.context = APIContextMock(fields=FIELDS, csv=table_csv, rows=table_rows)
+        self.dataset = Dataset.from_table('fake_table', context=self.context)
+
+    def test_download(self):
+        df = self.dataset.download()
+
+        self.assertEqual(list(df.index), list(range(1, 11)))
+        self.assertEqual(len(self.context.copy_client.queries), 1)
+
+    def test_download_parallel(self):
+        df = self.dataset.download(max_workers=3)
+
+        self.assertEqual(list(df.index), list(range(1, 11)))
+        self.assertEqual(list(df['value']), [i * 10.0 for i in range(1, 11)])
+        self.assertEqual(len(self.context.copy_client.queries), 3)
+
+    def test_download_retries_server_errors(self):
+        copyto_stream = self.context.copy_client.copyto_stream
+        errors = [CartoException(ServerErrorException('Internal server error', 500))]
+
+        def failing_copyto_stream(query):
+            if errors:
+                raise errors.pop()
+            return copyto_stream(query)
+
+        self.context.copy_client.copyto_stream = failing_copyto_stream
+        df = self.dataset.download()
+
+        self.assertEqual(list(df.index), list(range(1, 11)))
+
+    def test_download_parallel_with_chunksize_fails(self):
+        with self.assertRaises(ValueError):
+            self.dataset.download(max_workers=2, chunksize=10)
+
+    def test_download_reuses_table_columns(self):
+        self.dataset.download()
+        self.dataset.download()
+
+        self.assertEqual(len(self.context.sql_client.queries), 1)
+        self.assertIn('pg_catalog.pg_class', self.context.sql_client.queries[0])
+
+    def test_download_parallel_reuses_table_columns(self):
+        self.dataset.download(max_workers=3)
+
+        self.assertEqual(len([q for q in self.context.sql_client.queries if 'LIMIT 0' in q]), 0)
+
+    def test_delete_invalidates_table_columns(self):
+        self.dataset.download()
+        self.dataset.delete()
+        self.dataset.download()
+
+        self.assertEqual(len([q for q in self.context.sql_client.queries if 'pg_catalog.pg_class' in q]), 2)
+
+    def test_download_parallel_compact_dtypes(self):
+        df = self.dataset.download(max_workers=3, compact_dtypes=True)
+
+        self.assertEqual(list(df.index), list(range(1, 11)))
+        self.assertEqual(str(df.dtypes['value']), 'float64')
+
+
+class TestDatasetDownloadChanges(unittest.TestCase):
+    def setUp(self):
+        self.rows = {1: ('a', '2019-01-01'), 2: ('b', '2019-01-02')}
+        self.context = APIContextMock(
+            fields={'cartodb_id': {'type': 'number'}, 'name': {'type': 'string'},
+                    'updated_at': {'type': 'date'}},
+            csv=self.csv,
+            rows=table_metadata_rows([('cartodb_id', 'integer'), ('name', 'text'),
+                                      ('updated_at', 'timestamp with time zone')]))
+        self.dataset = Dataset.from_table('fake_table', context=self.context)
+
+    def csv(self, query):
+        min_id = re.search(r'cartodb_id > (\d+)', query)
+        min_date = re.search(r'"updated_at" >= \'([\d-]+)', query)
+        rows = [(i, name, date) for i, (name, date) in sorted(self.rows.items())
+                if (min_id is None or i > int(min_id.group(1))) and
+                (min_date is None or date >= min_date.group(1))]
+        return 'cartodb_id,name,updated_at\n' + ''.join('{},{},{}\n'.format(*row) for row in rows)
+
+    def test_download_changes_new_rows(self):
+        self.dataset.download_changes()
+        self.rows[3] = ('c', '2019-01-03')
+        df = self.dataset.download_changes()
+
+        self.assertEqual(list(df.index), [1, 2, 3])
+        self.assertIn('WHERE cartodb_id > 2', self.context.copy_client.queries[-1])
+
+    def test_download_changes_updated_rows(self):
+        self.dataset.download_changes('updated_at')
+        self.rows[1] = ('z', '2019-01-03')
+        self.rows[3] = ('c', '2019-01-03')
+        df = self.dataset.download_changes('updated_at')
+
+        self.assertEqual(list(df.index), [1, 2, 3])
+        self.assertEqual(list(df['name']), ['z', 'b', 'c'])
+        self.assertIn('"updated_at" >= \'2019-01-02T00:00:00', self.context.copy_client.queries[-1])
+
+    def test_download_changes_wrong_column(self):
+        with self.assertRaises(ValueError):
+            self.dataset.download_changes('wrong_column')
+
+
+class TestDatasetDownloadSample(unittest.TestCase):
+    def setUp(self):
+        self.context = APIContextMock(fields=FIELDS, csv=table_csv, rows=self.table_rows)
+        self.dataset = Dataset.from_table('fake_table', context=self.context)
+
+    def table_rows(self, query):
+        if 'pg_catalog.pg_class' in query:
+            return table_metadata_rows([('cartodb_id', 'integer'), ('value', 'double precision')],
+                                       row_estimate=1000)
+
+    def test_download_sample(self):
+        self.dataset.download(sample=0.01)
+
+        self.assertEqual(self.context.copy_client.queries[0].split(' TO stdout')[0],
+                         'COPY (SELECT cartodb_id, value FROM "public"."fake_table" TABLESAMPLE BERNOULLI (1))')
+
+    def test_download_sample_system(self):
+        self.dataset.download(sample=0.5, sample_method=Dataset.SAMPLE_SYSTEM, max_workers=3)
+
+        self.assertIn('TABLESAMPLE SYSTEM (50)', self.context.copy_client.queries[0])
+        self.assertEqual(len(self.context.copy_client.queries), 1)
+
+    def test_download_sample_rows(self):
+        self.dataset.download(sample_rows=100)
+
+        self.assertIn('"public"."fake_table" TABLESAMPLE BERNOULLI (12) ORDER BY random() LIMIT 100',
+                      self.context.copy_client.queries[0])
+
+    def test_download_sample_query(self):
+        dataset = Dataset.from_query('SELECT * FROM fake_table', context=self.context)
+        dataset.download(sample=0.01)
+
+        self.assertIn('FROM (SELECT * FROM fake_table) _q WHERE random() < 0.01', self.context.copy_client.queries[0])
+
+    def test_download_sample_stratified(self):
+        self.dataset.download(sample_rows=100, stratify_by='value')
+
+        query = self.context.copy_client.queries[0]
+        self.assertIn('row_number() OVER (PARTITION BY "value" ORDER BY random())', query)
+        self.assertIn('count(*) OVER (PARTITION BY "value") * 100::float8 / count(*) OVER ()', query)
+        self.assertNotIn('TABLESAMPLE', query)
+
+    def test_download_sample_wrong_parameters(self):
+        for kwargs in [{'sample': 0}, {'sample': 1.5}, {'sample_rows': 0}, {'sample': 0.1, 'sample_rows': 10},
+                       {'sample': 0.1, 'limit': 10}, {'sample': 0.1, 'sample_method': 'random'},
+                       {'stratify_by': 'value'}, {'sample': 0.1, 'stratify_by': 'wrong_column'}]:
+            with self.assertRaises(ValueError):
+                self.dataset.download(**kwargs)
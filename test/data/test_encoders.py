@@ -0,0 +1,105 @@
+"""Unit tests for cartoframes.data.encoders"""
+import struct
+import unittest
+import numpy as np
+import pandas as pd
+
+from shapely.geometry import Point
+
+from cartoframes.data.encoders import csv_chunks, binary_chunks, binary_pgtype, PGCOPY_HEADER, PGCOPY_TRAILER
+
+
+class TestCsvChunks(unittest.TestCase):
+    """Tests for the COPY FROM csv encoder"""
+
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'num': [1, 2, None],
+            'text': ['a|b', 'say "hi"', None],
+            'flag': [True, False, True],
+            'geom': [Point(0, 0), None, '010100000000000000000024400000000000002e40']
+        })
+
+    def _encode(self, *args, **kwargs):
+        return b''.join(csv_chunks(*args, **kwargs)).decode('utf-8')
+
+    def test_csv_chunks(self):
+        result = self._encode(self.df, ['num', 'text', 'flag'], 'geom')
+        self.assertEqual(result.split('\n'), [
+            '1.0|"a|b"|True|SRID=4326;010100000000000000000000000000000000000000',
+            '2.0|"say ""hi"""|False|',
+            '||True|SRID=4326;010100000000000000000024400000000000002E40',
+            ''
+        ])
+
+    def test_csv_chunks_without_geometry(self):
+        result = self._encode(self.df, ['flag'])
+        self.assertEqual(result, 'True|\nFalse|\nTrue|\n')
+
+    def test_csv_chunks_lnglat(self):
+        df = pd.DataFrame({'lng': [1.5, None], 'lat': [2.5, 3.5]})
+        result = self._encode(df, ['lng', 'lat'], with_lnglat=('lng', 'lat'))
+        self.assertEqual(result, '1.5|2.5|SRID=4326;POINT(1.5 2.5)\n|3.5|\n')
+
+    def test_csv_chunks_size(self):
+        chunks = list(csv_chunks(self.df, ['flag'], chunk_rows=2))
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(chunks[1], b'True|\n')
+
+
+class TestBinaryChunks(unittest.TestCase):
+    """Tests for the COPY FROM binary (PGCOPY) encoder"""
+
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'num': np.array([1, 2], dtype='int32'),
+            'value': [1.5, None],
+            'text': [u'h\xe9', None],
+            'date': pd.to_datetime(['2000-01-01 00:00:01', None]),
+            'geom': [Point(1, 2), None]
+        })
+
+    def _tuples(self, data):
+        self.assertTrue(data.startswith(PGCOPY_HEADER))
+        self.assertTrue(data.endswith(PGCOPY_TRAILER))
+        data = data[len(PGCOPY_HEADER):-len(PGCOPY_TRAILER)]
+
+        tuples = []
+        while data:
+            nfields = struct.unpack('>h', data[:2])[0]
+            data = data[2:]
+            fields = []
+            for _ in range(nfields):
+                length = struct.unpack('>i', data[:4])[0]
+                data = data[4:]
+                fields.append(data[:length] if length >= 0 else None)
+                data = data[max(length, 0):]
+            tuples.append(fields)
+        return tuples
+
+    def test_binary_chunks(self):
+        data = b''.join(binary_chunks(self.df, ['num', 'value', 'text', 'date'], 'geom'))
+        self.assertEqual(self._tuples(data), [
+            [
+                struct.pack('>i', 1),
+                struct.pack('>d', 1.5),
+                u'h\xe9'.encode('utf-8'),
+                struct.pack('>q', 1000000),
+                struct.pack('<BIIdd', 1, 0x20000001, 4326, 1, 2)
+            ],
+            [struct.pack('>i', 2), None, None, None, None]
+        ])
+
+    def test_binary_chunks_lnglat(self):
+        df = pd.DataFrame({'lng': [1.0, None], 'lat': [2.0, 3.0]})
+        data = b''.join(binary_chunks(df, [], with_lnglat=('lng', 'lat'), chunk_rows=1))
+        self.assertEqual(self._tuples(data), [
+            [struct.pack('<BIIdd', 1, 0x20000001, 4326, 1, 2)],
+            [None]
+        ])
+
+    def test_binary_pgtype(self):
+        self.assertEqual(binary_pgtype(self.df.dtypes['num']), 'integer')
+        self.assertEqual(binary_pgtype(self.df.dtypes['value']), 'double precision')
+        self.assertEqual(binary_pgtype(self.df.dtypes['text']), 'text')
+        self.assertEqual(binary_pgtype(self.df.dtypes['date']), 'timestamp')
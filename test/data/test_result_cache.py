@@ -0,0 +1,143 @@
+"""Unit tests for cartoframes.data.result_cache"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+from shapely.geometry import Point
+
+from cartoframes.data.arrow import HAS_PYARROW
+from cartoframes.data.result_cache import ResultCache, cached_read, result_key
+
+from mocks.api_mock import APIContextMock
+from mocks.context_mock import CredsMock
+
+
+@unittest.skipIf(not HAS_PYARROW, 'pyarrow is not installed')
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.df = pd.DataFrame({'value': range(100)})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_load_stored(self):
+        cache = ResultCache(self.directory)
+        cache.store('query', '2019-01-01', self.df)
+
+        self.assertTrue(cache.load('query', '2019-01-01').equals(self.df))
+        self.assertIsNone(cache.load('query', '2019-01-02'))
+        self.assertIsNone(cache.load('other query', '2019-01-01'))
+
+    def test_load_stored_dtypes(self):
+        cache = ResultCache(self.directory)
+        df = pd.DataFrame({
+            'name': pd.Series(['a', 'b', 'a'], dtype='category'),
+            'count': pd.Series([1, None, 3], dtype='Int16'),
+            'created': pd.to_datetime(['2019-01-01', None, '2019-01-03']),
+            'geometry': [Point(1, 2), None, Point(3, 4)]
+        }, index=pd.Index([1, 2, 3], name='cartodb_id'))
+        cache.store('query', 'v', df)
+
+        loaded = cache.load('query', 'v')
+        self.assertEqual(list(loaded.index), [1, 2, 3])
+        self.assertEqual(loaded.index.name, 'cartodb_id')
+        for column in ['name', 'count']:
+            self.assertEqual(loaded.dtypes[column], df.dtypes[column])
+        self.assertTrue(str(loaded.dtypes['created']).startswith('datetime64'))
+        self.assertEqual(list(loaded['geometry']), [Point(1, 2), None, Point(3, 4)])
+
+    def test_load_unreadable_file(self):
+        cache = ResultCache(self.directory)
+        cache.store('query', 'v', self.df)
+        with open(cache._path('query', 'v'), 'r+b') as f:
+            f.truncate(100)
+
+        self.assertIsNone(cache.load('query', 'v'))
+        self.assertFalse(os.path.exists(cache._path('query', 'v')))
+
+    def test_store_replaces_old_versions(self):
+        cache = ResultCache(self.directory)
+        cache.store('query', '2019-01-01', self.df)
+        cache.store('query', '2019-01-02', self.df)
+
+        self.assertIsNone(cache.load('query', '2019-01-01'))
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+    def test_evict_least_recently_used(self):
+        cache = ResultCache(self.directory)
+        cache.store('query 1', 'v', self.df)
+        cache.store('query 2', 'v', self.df)
+        os.utime(cache._path('query 1', 'v'), (0, 0))
+
+        cache.max_size = os.path.getsize(cache._path('query 2', 'v'))
+        cache.evict()
+
+        self.assertIsNone(cache.load('query 1', 'v'))
+        self.assertIsNotNone(cache.load('query 2', 'v'))
+
+
+@unittest.skipIf(not HAS_PYARROW, 'pyarrow is not installed')
+class TestCachedRead(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.updated_at = '2019-01-01T00:00:00Z'
+        self.context = APIContextMock(fields={}, csv='', rows=lambda query: [{'updated_at': self.updated_at}])
+        self.context._result_cache = ResultCache(self.directory)
+        self.reads = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self):
+        self.reads.append(1)
+        return pd.DataFrame({'value': [len(self.reads)]})
+
+    def test_cached_read_use(self):
+        cached_read(self.context, 'SELECT * FROM fake_table', 'use', {}, self.read)
+        df = cached_read(self.context, 'SELECT * FROM fake_table', 'use', {}, self.read)
+
+        self.assertEqual(len(self.reads), 1)
+        self.assertEqual(list(df['value']), [1])
+        self.assertIn('CDB_QueryTables_Updated_At', self.context.sql_client.queries[0])
+
+    def test_cached_read_table_updated(self):
+        cached_read(self.context, 'SELECT * FROM fake_table', 'use', {}, self.read)
+        self.updated_at = '2019-01-02T00:00:00Z'
+        df = cached_read(self.context, 'SELECT * FROM fake_table', 'use', {}, self.read)
+
+        self.assertEqual(list(df['value']), [2])
+
+    def test_cached_read_other_api_key(self):
+        cached_read(self.context, 'SELECT * FROM fake_table', 'use', {}, self.read)
+        self.context.creds = CredsMock(key='limited_api_key', username='fake_username')
+        df = cached_read(self.context, 'SELECT * FROM fake_table', 'use', {}, self.read)
+
+        self.assertEqual(list(df['value']), [2])
+        self.assertNotIn('limited_api_key', result_key(self.context, 'SELECT 1', {}))
+
+    def test_cached_read_refresh(self):
+        cached_read(self.context, 'SELECT * FROM fake_table', 'use', {}, self.read)
+        cached_read(self.context, 'SELECT * FROM fake_table', 'refresh', {}, self.read)
+        df = cached_read(self.context, 'SELECT * FROM fake_table', 'use', {}, self.read)
+
+        self.assertEqual(list(df['value']), [2])
+
+    def test_cached_read_off(self):
+        cached_read(self.context, 'SELECT * FROM fake_table', 'off', {}, self.read)
+
+        self.assertEqual(self.context.sql_client.queries, [])
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_cached_read_without_tables(self):
+        self.updated_at = None
+        cached_read(self.context, 'SELECT 1', 'use', {}, self.read)
+        cached_read(self.context, 'SELECT 1', 'use', {}, self.read)
+
+        self.assertEqual(len(self.reads), 2)
+
+    def test_cached_read_wrong_option(self):
+        with self.assertRaises(ValueError):
+            cached_read(self.context, 'SELECT * FROM fake_table', 'always', {}, self.read)
@@ -0,0 +1,50 @@
+"""Unit tests for cartoframes.data.schema_cache"""
+import time
+import unittest
+
+from cartoframes.columns import Column
+from cartoframes.data.schema_cache import SchemaCache, table_key
+
+COLUMNS = [Column('cartodb_id', pgtype='number')]
+
+
+class TestSchemaCache(unittest.TestCase):
+    def test_get_normalized_query(self):
+        cache = SchemaCache()
+        cache.set('SELECT *\n  FROM table_a;', COLUMNS)
+
+        self.assertEqual(cache.get(' SELECT * FROM table_a '), COLUMNS)
+        self.assertIsNone(cache.get('SELECT * FROM table_b'))
+
+    def test_get_expired(self):
+        cache = SchemaCache(ttl=0.01)
+        cache.set('SELECT * FROM table_a', COLUMNS)
+        time.sleep(0.02)
+
+        self.assertIsNone(cache.get('SELECT * FROM table_a'))
+
+    def test_disabled(self):
+        cache = SchemaCache(ttl=0)
+        cache.set('SELECT * FROM table_a', COLUMNS)
+
+        self.assertIsNone(cache.get('SELECT * FROM table_a'))
+
+    def test_invalidate_table(self):
+        cache = SchemaCache()
+        cache.set('SELECT * FROM table_a', COLUMNS)
+        cache.set('SELECT * FROM table_a_2', COLUMNS)
+        cache.set(table_key('public', 'table_a'), COLUMNS)
+
+        cache.invalidate('table_a')
+
+        self.assertIsNone(cache.get('SELECT * FROM table_a'))
+        self.assertIsNone(cache.get(table_key('public', 'table_a')))
+        self.assertEqual(cache.get('SELECT * FROM table_a_2'), COLUMNS)
+
+    def test_invalidate_all(self):
+        cache = SchemaCache()
+        cache.set('SELECT * FROM table_a', COLUMNS)
+
+        cache.invalidate()
+
+        self.assertIsNone(cache.get('SELECT * FROM table_a'))
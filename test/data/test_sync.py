@@ -0,0 +1,133 @@
+"""Unit tests for the diff-based sync of cartoframes.data.Dataset"""
+import io
+import unittest
+
+import pandas as pd
+
+from cartoframes.data import Dataset
+from cartoframes.data.dataset import ROW_HASH_COLUMN, _merge_query, _row_hashes
+
+from mocks.api_mock import APIContextMock, table_metadata_rows
+
+FIELDS = {
+    'cartodb_id': {'type': 'number'},
+    'value': {'type': 'number'},
+    ROW_HASH_COLUMN: {'type': 'string'}
+}
+
+
+class CopyFromClientMock(object):
+    def __init__(self, csv):
+        self.csv = csv
+        self.queries = []
+        self.payloads = []
+
+    def copyto_stream(self, query):
+        self.queries.append(query)
+        return io.BytesIO(self.csv(query).encode('utf-8'))
+
+    def copyfrom(self, query, data, compress=True, compression_level=1):
+        self.queries.append(query)
+        self.payloads.append(b''.join(data).decode('utf-8'))
+
+
+class BatchSQLClientMock(object):
+    def __init__(self):
+        self.queries = []
+
+    def create(self, query):
+        self.queries.append(query)
+        return {'job_id': str(len(self.queries)), 'status': 'done'}
+
+
+class TestDatasetSync(unittest.TestCase):
+    def setUp(self):
+        synced = pd.DataFrame({'value': [1.0, 2.0, 3.0]}, index=pd.Index([1, 2, 3], name='cartodb_id'))
+        self.remote_hashes = _row_hashes(synced[['value']])
+
+        self.context = APIContextMock(fields=FIELDS, csv=None, rows=self.table_rows)
+        self.context.copy_client = CopyFromClientMock(self.csv)
+        self.context.batch_sql_client = BatchSQLClientMock()
+
+    def table_rows(self, query):
+        if 'pg_catalog.pg_class' in query:
+            return table_metadata_rows([('cartodb_id', 'integer'), ('value', 'double precision'),
+                                        (ROW_HASH_COLUMN, 'text')])
+
+    def csv(self, query):
+        rows = ['{},{}'.format(i, h) for i, h in self.remote_hashes.items()]
+        return '\n'.join(['cartodb_id,' + ROW_HASH_COLUMN] + rows) + '\n'
+
+    def test_sync(self):
+        # 1 unchanged, 2 updated, 3 deleted, 4 inserted
+        df = pd.DataFrame({'cartodb_id': [1, 2, 4], 'value': [1.0, 20.0, 4.0]})
+
+        result = Dataset.from_dataframe(df).sync(table_name='fake_table', context=self.context)
+
+        self.assertEqual(result, {'inserted': 1, 'updated': 1, 'deleted': 1})
+
+        changed, deleted = self.context.copy_client.payloads
+        self.assertEqual([line.split('|')[:2] for line in changed.splitlines()], [['2', '20.0'], ['4', '4.0']])
+        self.assertEqual(deleted, '3|\n')
+
+        merge = self.context.batch_sql_client.queries[0]
+        self.assertIn('DELETE FROM "public"."fake_table"', merge)
+        self.assertIn('ON CONFLICT (cartodb_id)', merge)
+        self.assertTrue(any(q.startswith('DROP TABLE IF EXISTS') for q in self.context.sql_client.queries))
+
+    def test_sync_without_changes(self):
+        df = pd.DataFrame({'cartodb_id': [1, 2, 3], 'value': [1.0, 2.0, 3.0]})
+
+        result = Dataset.from_dataframe(df).sync(table_name='fake_table', context=self.context)
+
+        self.assertEqual(result, {'inserted': 0, 'updated': 0, 'deleted': 0})
+        self.assertEqual(self.context.copy_client.payloads, [])
+        self.assertEqual(self.context.batch_sql_client.queries, [])
+
+    def test_sync_downloaded_frame(self):
+        # a frame read back from the synced table has the hash column
+        df = pd.DataFrame({'cartodb_id': [1, 2, 3], 'value': [1.0, 20.0, 3.0],
+                           ROW_HASH_COLUMN: self.remote_hashes.values})
+
+        result = Dataset.from_dataframe(df).sync(table_name='fake_table', context=self.context)
+
+        self.assertEqual(result, {'inserted': 0, 'updated': 1, 'deleted': 0})
+        copy_query = [q for q in self.context.copy_client.queries if q.startswith('COPY')][0]
+        self.assertEqual(copy_query.count(ROW_HASH_COLUMN), 1)
+        changed, = self.context.copy_client.payloads
+        self.assertEqual(changed.split('|')[:3], ['2', '20.0', _row_hashes(df.iloc[[1]][['value']]).iloc[0]])
+
+        merge = self.context.batch_sql_client.queries[0]
+        self.assertIn('(cartodb_id, value, {h}) SELECT cartodb_id, value, {h} FROM'.format(h=ROW_HASH_COLUMN), merge)
+        self.assertNotIn('the_geom', merge)
+
+    def test_sync_without_cartodb_id_fails(self):
+        df = pd.DataFrame({'value': [1.0]})
+        df.index.name = 'id'
+
+        with self.assertRaises(ValueError):
+            Dataset(df=df).sync(table_name='fake_table', context=self.context)
+
+
+class TestMergeQuery(unittest.TestCase):
+    def test_merge_query(self):
+        query = _merge_query('t', 's', ['id', 'value'], ['id'], with_geometry=True)
+
+        self.assertEqual(query, 'INSERT INTO t (id, value, the_geom) SELECT id, value, the_geom FROM s '
+                                'ON CONFLICT (id) DO UPDATE SET value = EXCLUDED.value, '
+                                'the_geom = EXCLUDED.the_geom')
+
+    def test_merge_query_without_geometry(self):
+        query = _merge_query('t', 's', ['id', 'value'], ['id'])
+
+        self.assertEqual(query, 'INSERT INTO t (id, value) SELECT id, value FROM s '
+                                'ON CONFLICT (id) DO UPDATE SET value = EXCLUDED.value')
+        self.assertIn('the_geom = EXCLUDED.the_geom', _merge_query('t', 's', ['id', 'the_geom'], ['id']))
+
+    def test_merge_query_delete(self):
+        query = _merge_query('t', 's', ['cartodb_id', 'h'], ['cartodb_id'], delete_column='h')
+
+        self.assertTrue(query.startswith('DELETE FROM t t USING s s WHERE t.cartodb_id = s.cartodb_id '
+                                         'AND s.h IS NULL; '))
+        self.assertIn('WHERE h IS NOT NULL ON CONFLICT', query)
+        self.assertIn("setval(pg_get_serial_sequence('t', 'cartodb_id')", query)
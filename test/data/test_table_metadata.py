@@ -0,0 +1,85 @@
+"""Unit tests for the table metadata of cartoframes.data.Dataset"""
+import unittest
+
+from carto.exceptions import CartoException
+
+from cartoframes.data import Dataset
+from cartoframes.data.table_metadata import TableMetadata
+
+from mocks.api_mock import APIContextMock, table_metadata_rows
+
+
+class AccessDeniedSQLClientMock(object):
+    def __init__(self):
+        self.queries = []
+
+    def send(self, query, **kwargs):
+        self.queries.append(query)
+        if 'pg_catalog' in query:
+            raise CartoException('Access denied')
+        return {'fields': {'value': {'type': 'number'}}, 'rows': []}
+
+
+class TestTableMetadata(unittest.TestCase):
+    def setUp(self):
+        self.context = APIContextMock(fields={}, csv='', rows=self.table_rows)
+        self.dataset = Dataset.from_table('fake_table', context=self.context)
+
+    def table_rows(self, query):
+        if 'pg_catalog.pg_class' in query:
+            return table_metadata_rows([('cartodb_id', 'integer'), ('the_geom', 'geometry')],
+                                       row_estimate=1000, geom_type='MultiPolygon', is_public=True)
+
+    def test_table_metadata(self):
+        metadata = self.dataset.get_table_metadata()
+
+        self.assertTrue(metadata.exists)
+        self.assertEqual([c.name for c in metadata.columns], ['cartodb_id', 'the_geom'])
+        self.assertEqual(metadata.row_estimate, 1000)
+        self.assertEqual(metadata.geom_type, 'MultiPolygon')
+        self.assertTrue(metadata.is_public)
+        self.assertIn("c.relname = 'fake_table'", self.context.sql_client.queries[0])
+        self.assertIn("n.nspname = 'public'", self.context.sql_client.queries[0])
+
+    def test_table_metadata_is_reused(self):
+        self.assertTrue(self.dataset.exists())
+        self.assertEqual(self.dataset.get_table_column_names(), ['cartodb_id', 'the_geom'])
+        self.assertEqual(self.dataset.compute_geom_type(), Dataset.GEOM_TYPE_POLYGON)
+
+        self.assertEqual(len(self.context.sql_client.queries), 1)
+
+    def test_delete_invalidates_table_metadata(self):
+        self.dataset.delete()
+        self.dataset.exists()
+
+        self.assertEqual(len([q for q in self.context.sql_client.queries if 'pg_catalog.pg_class' in q]), 2)
+
+    def test_table_metadata_not_exists(self):
+        self.context.sql_client.rows = None
+
+        self.assertFalse(self.dataset.exists())
+        self.assertEqual(self.dataset.get_table_columns(), [])
+        with self.assertRaises(CartoException):
+            self.dataset.dataset_info
+
+    def test_table_metadata_access_denied(self):
+        self.context.sql_client = AccessDeniedSQLClientMock()
+
+        self.assertIsNone(self.dataset.get_table_metadata())
+        self.assertTrue(self.dataset.exists())
+        self.assertEqual(self.dataset.get_table_column_names(), ['value'])
+        self.assertTrue(self.context.sql_client.queries[-1].strip().endswith('LIMIT 0'))
+
+    def test_query_dataset_has_no_table_metadata(self):
+        dataset = Dataset.from_query('SELECT 1', context=self.context)
+
+        self.assertIsNone(dataset.get_table_metadata())
+        self.assertEqual(self.context.sql_client.queries, [])
+
+    def test_from_sql_api_row(self):
+        self.assertFalse(TableMetadata.from_sql_api_row(None).exists)
+
+        metadata = TableMetadata.from_sql_api_row({'row_estimate': -1, 'columns': None})
+        self.assertTrue(metadata.exists)
+        self.assertEqual(metadata.columns, [])
+        self.assertIsNone(metadata.row_estimate)
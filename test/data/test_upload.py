@@ -0,0 +1,215 @@
+"""Unit tests for the COPY FROM upload of cartoframes.data.Dataset"""
+import re
+import unittest
+import pandas as pd
+
+from carto.exceptions import CartoException, CartoRateLimitException
+from pyrestcli.exceptions import ServerErrorException
+from requests.exceptions import ConnectionError, ConnectTimeout, ReadTimeout
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from cartoframes.data import Dataset
+from cartoframes.data.dataset import _normalize_column_names, SWAP_TABLE_QUERY
+
+from mocks.api_mock import APIContextMock, table_metadata_rows
+from mocks.context_mock import ContextMock
+
+
+class CopyClientMock(object):
+    def __init__(self, errors=None):
+        self.errors = list(errors or [])
+        self.queries = []
+        self.payloads = []
+        self.compression = []
+
+    def copyfrom(self, query, data, compress=True, compression_level=1):
+        payload = b''.join(data)
+        self.compression.append((compress, compression_level))
+        if self.errors:
+            raise self.errors.pop(0)
+        self.queries.append(query)
+        self.payloads.append(payload)
+        return {'total_rows': payload.count(b'\n')}
+
+
+class BatchSQLClientMock(object):
+    def __init__(self):
+        self.queries = []
+
+    def create(self, query):
+        self.queries.append(query)
+        return {'job_id': str(len(self.queries)), 'status': 'done'}
+
+
+class DatasetInfoMock(object):
+    def __init__(self, privacy):
+        self.privacy = privacy
+        self.updates = []
+
+    def update(self, privacy=None, name=None):
+        self.updates.append(privacy)
+
+
+class RateLimitResponseMock(object):
+    text = 'Rate limit exceeded'
+    headers = {
+        'Carto-Rate-Limit-Limit': '1',
+        'Carto-Rate-Limit-Remaining': '0',
+        'Retry-After': '0',
+        'Carto-Rate-Limit-Reset': '0'
+    }
+
+
+class TestDatasetCopyfrom(unittest.TestCase):
+    def setUp(self):
+        self.context = ContextMock(username='fake_username', api_key='fake_api_key')
+        self.dataset = Dataset.from_dataframe(pd.DataFrame({'value': range(25000)}))
+        self.dataset._table_name = 'fake_table'
+        self.dataset._cc = self.context
+        self.dataset._normalized_column_names = _normalize_column_names(self.dataset.dataframe)
+
+    def test_copyfrom(self):
+        self.context.copy_client = CopyClientMock()
+        self.dataset._copyfrom()
+
+        self.assertEqual(len(self.context.copy_client.payloads), 1)
+        self.assertIn("FORMAT csv, DELIMITER '|'", self.context.copy_client.queries[0])
+
+    def test_copyfrom_parallel_chunks(self):
+        self.context.copy_client = CopyClientMock()
+        self.dataset._copyfrom(max_workers=2)
+
+        payloads = self.context.copy_client.payloads
+        self.assertEqual(len(payloads), 3)
+        self.assertEqual(sorted(payload.count(b'\n') for payload in payloads), [5000, 10000, 10000])
+
+    def test_copyfrom_retries_failed_chunk(self):
+        self.context.copy_client = CopyClientMock(errors=[
+            CartoRateLimitException(RateLimitResponseMock()),
+            CartoException(ConnectionError(MaxRetryError(None, '/copyfrom', NewConnectionError(None, 'refused')))),
+            CartoException(ConnectTimeout('Connect timeout'))
+        ])
+        self.dataset._copyfrom(max_workers=2)
+
+        self.assertEqual(sum(payload.count(b'\n') for payload in self.context.copy_client.payloads), 25000)
+
+    def test_copyfrom_does_not_retry_sent_data(self):
+        # the rows may have been committed
+        for error in [ConnectionError('Connection reset'), ReadTimeout('Read timeout'),
+                      ServerErrorException('Internal server error', 500)]:
+            self.context.copy_client = CopyClientMock(errors=[CartoException(error)])
+            with self.assertRaises(CartoException):
+                self.dataset._copyfrom()
+
+            self.assertEqual(self.context.copy_client.payloads, [])
+
+    def test_copyfrom_does_not_retry_client_errors(self):
+        self.context.copy_client = CopyClientMock(errors=[CartoException('column "value" does not exist')])
+        with self.assertRaises(CartoException):
+            self.dataset._copyfrom(max_workers=2)
+
+        self.assertEqual(len(self.context.copy_client.payloads), 2)
+
+    def test_copyfrom_compression(self):
+        self.context.copy_client = CopyClientMock()
+        self.dataset._copyfrom(compression='gzip', compression_level=6)
+        self.dataset._copyfrom(compression=None)
+
+        self.assertEqual(self.context.copy_client.compression, [(True, 6), (False, 1)])
+
+    def test_upload_compression_validation(self):
+        with self.assertRaises(ValueError):
+            self.dataset.upload(context=self.context, compression='zstd')
+        with self.assertRaises(ValueError):
+            self.dataset.upload(context=self.context, compression_level=0)
+
+
+class TestDatasetUpsert(unittest.TestCase):
+    def setUp(self):
+        self.context = APIContextMock(fields={}, csv='', rows=table_metadata_rows([('code', 'text')]))
+        self.context.copy_client = CopyClientMock()
+        self.context.batch_sql_client = BatchSQLClientMock()
+        self.df = pd.DataFrame({'Code': ['a', 'b'], 'value': [1, 2]})
+
+    def test_upsert(self):
+        Dataset.from_dataframe(self.df).upload(table_name='fake_table', context=self.context,
+                                               if_exists=Dataset.UPSERT, upsert_keys=['Code'])
+
+        staging_query = self.context.copy_client.queries[0]
+        self.assertIn('"public"."fake_table_staging_', staging_query)
+        self.assertEqual(self.context.copy_client.payloads, [b'a|1|\nb|2|\n'])
+
+        merge = self.context.batch_sql_client.queries[0]
+        self.assertIn('CREATE UNIQUE INDEX IF NOT EXISTS fake_table_code_key ON "public"."fake_table" (code)', merge)
+        self.assertIn('ON CONFLICT (code) DO UPDATE SET value = EXCLUDED.value', merge)
+        self.assertNotIn('the_geom', merge)
+        self.assertNotIn('DROP TABLE "public"."fake_table"', merge)
+        self.assertTrue(self.context.sql_client.queries[-1].startswith('DROP TABLE IF EXISTS "public"."fake_table_'))
+
+    def test_upsert_with_geometry(self):
+        df = self.df.assign(the_geom=['0101000020E6100000000000000000F03F0000000000000040', None])
+        Dataset.from_dataframe(df).upload(table_name='fake_table', context=self.context,
+                                          if_exists=Dataset.UPSERT, upsert_keys=['Code'])
+
+        merge = self.context.batch_sql_client.queries[0]
+        self.assertIn('SELECT code, value, the_geom FROM', merge)
+        self.assertIn('the_geom = EXCLUDED.the_geom', merge)
+
+    def test_upsert_needs_keys(self):
+        with self.assertRaises(ValueError):
+            Dataset.from_dataframe(self.df).upload(table_name='fake_table', context=self.context,
+                                                   if_exists=Dataset.UPSERT)
+
+    def test_upsert_duplicated_keys(self):
+        df = pd.DataFrame({'code': ['a', 'a'], 'value': [1, 2]})
+        with self.assertRaises(ValueError):
+            Dataset.from_dataframe(df).upload(table_name='fake_table', context=self.context,
+                                              if_exists=Dataset.UPSERT, upsert_keys=['code'])
+
+
+class TestDatasetReplace(unittest.TestCase):
+    def setUp(self):
+        self.context = APIContextMock(fields={}, csv='', rows=table_metadata_rows([('value', 'integer')]))
+        self.context.batch_sql_client = BatchSQLClientMock()
+        self.dataset = Dataset.from_dataframe(pd.DataFrame({'value': [1, 2]}))
+        self.dataset_info = DatasetInfoMock(Dataset.LINK)
+        self.dataset._get_dataset_info = lambda: self.dataset_info
+
+    def test_replace_swaps_shadow_table(self):
+        self.context.copy_client = CopyClientMock()
+        self.dataset.upload(table_name='fake_table', context=self.context, if_exists=Dataset.REPLACE)
+
+        create, swap = self.context.batch_sql_client.queries
+        shadow_table = re.search(r'CREATE TABLE (fake_table_shadow_\w+)', create).group(1)
+        self.assertNotIn('DROP TABLE IF EXISTS fake_table;', create)
+        self.assertIn("CDB_CartodbfyTable('public', '{}')".format(shadow_table), create)
+        self.assertIn('COPY {}(value,the_geom)'.format(shadow_table), self.context.copy_client.queries[0])
+        self.assertEqual(swap, 'BEGIN; {}; COMMIT;'.format(
+            SWAP_TABLE_QUERY.format(shadow_table=shadow_table, table_name='fake_table')))
+        self.assertIn("to_regclass(quote_ident('fake_table'))", swap)
+        self.assertIn("replace(item.relname, '{}', 'fake_table')".format(shadow_table), swap)
+
+    def test_replace_keeps_privacy(self):
+        self.context.copy_client = CopyClientMock()
+        self.dataset.upload(table_name='fake_table', context=self.context, if_exists=Dataset.REPLACE)
+
+        self.assertEqual(self.dataset_info.updates, [Dataset.LINK])
+
+    def test_replace_without_privacy(self):
+        def get_dataset_info():
+            raise CartoException('We could not get the table metadata.')
+
+        self.dataset._get_dataset_info = get_dataset_info
+        self.context.copy_client = CopyClientMock()
+        self.dataset.upload(table_name='fake_table', context=self.context, if_exists=Dataset.REPLACE)
+
+        self.assertEqual(len(self.context.batch_sql_client.queries), 2)
+
+    def test_replace_drops_shadow_table_on_error(self):
+        self.context.copy_client = CopyClientMock(errors=[CartoException('column "value" does not exist')])
+        with self.assertRaises(CartoException):
+            self.dataset.upload(table_name='fake_table', context=self.context, if_exists=Dataset.REPLACE)
+
+        self.assertEqual(len(self.context.batch_sql_client.queries), 1)
+        self.assertTrue(self.context.sql_client.queries[-1].startswith('DROP TABLE IF EXISTS fake_table_shadow_'))
+        self.assertEqual(self.dataset_info.updates, [])
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import io
+
+from cartoframes.context import CartoContext
+from cartoframes.data.schema_cache import SchemaCache
+
+from .context_mock import CredsMock
+
+
+def table_metadata_rows(columns, row_estimate=None, geom_type=None, is_public=False):
+    """SQL API rows of the table metadata query for a table with `columns`
+    (a list of (name, type) pairs)"""
+    return [{'row_estimate': row_estimate, 'is_public': is_public, 'geom_type': geom_type,
+             'columns': [{'name': name, 'type': pgtype} for name, pgtype in columns]}]
+
+
+class SQLClientMock(object):
+    def __init__(self, fields, rows=None):
+        self.fields = fields
+        self.rows = rows
+        self.queries = []
+
+    def send(self, query, **kwargs):
+        self.queries.append(query)
+        fields = self.fields(query) if callable(self.fields) else self.fields
+        rows = self.rows(query) if callable(self.rows) else self.rows
+        return {'fields': fields, 'rows': rows or []}
+
+
+class CopyClientMock(object):
+    def __init__(self, csv):
+        self.csv = csv
+        self.queries = []
+
+    def copyto_stream(self, query):
+        self.queries.append(query)
+        csv = self.csv(query) if callable(self.csv) else self.csv
+        return io.BytesIO(csv.encode('utf-8'))
+
+
+class APIContextMock(object):
+    """Context with the CartoContext read methods and fake SQL and COPY clients.
+
+    `rows` and `csv` are the SQL API rows and COPY TO output, or functions
+    returning them for a query.
+    """
+    def __init__(self, fields, csv, rows=None):
+        self.is_org = False
+        self.creds = CredsMock(key='fake_api_key', username='fake_username')
+        self.sql_client = SQLClientMock(fields, rows)
+        self.copy_client = CopyClientMock(csv)
+        self._schema_cache = SchemaCache()
+
+    def get_default_schema(self):
+        return 'public'
+
+    def fetch(self, *args, **kwargs):
+        return CartoContext.fetch(self, *args, **kwargs)
+
+    def _fetch(self, *args, **kwargs):
+        return CartoContext._fetch(self, *args, **kwargs)
+
+    def fetch_many(self, *args, **kwargs):
+        return CartoContext.fetch_many(self, *args, **kwargs)
+
+    def _coalesced_fetch(self, *args, **kwargs):
+        return CartoContext._coalesced_fetch(self, *args, **kwargs)
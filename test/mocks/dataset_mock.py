@@ -24,10 +24,10 @@ class DatasetMock(Dataset):
         self._df = pd.DataFrame({'column_name': [1]})
         return self._df
 
-    def _copyfrom(self, _):
+    def _copyfrom(self, *_):
         return True
 
-    def _create_table(self, _):
+    def _create_table(self, *_):
         return True
 
     def _create_table_from_query(self):
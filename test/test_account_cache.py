@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+"""Unit tests for cartoframes.account_cache"""
+import shutil
+import tempfile
+import time
+import unittest
+
+from cartoframes import context
+from cartoframes.account_cache import AccountCache
+from cartoframes.context import CartoContext
+
+BASE_URL = 'https://fake_username.carto.com/'
+
+
+class TestAccountCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_memory(self):
+        cache = AccountCache(self.directory)
+        cache.set(BASE_URL, 'fake_api_key', True)
+
+        self.assertTrue(cache.get(BASE_URL, 'fake_api_key')['is_org'])
+        self.assertIsNone(cache.get(BASE_URL, 'other_api_key'))
+        self.assertIsNone(AccountCache(self.directory).get(BASE_URL, 'fake_api_key', ttl=60))
+
+    def test_file(self):
+        AccountCache(self.directory).set(BASE_URL, 'fake_api_key', False, ttl=60)
+
+        with open(AccountCache(self.directory).path) as f:
+            self.assertNotIn('fake_api_key', f.read())
+        self.assertFalse(AccountCache(self.directory).get(BASE_URL, 'fake_api_key', ttl=60)['is_org'])
+        self.assertIsNone(AccountCache(self.directory).get(BASE_URL, 'fake_api_key'))
+
+    def test_file_expired(self):
+        cache = AccountCache(self.directory)
+        cache.set(BASE_URL, 'fake_api_key', False, ttl=60)
+        cache._write_file({k: dict(a, checked_at=time.time() - 120) for k, a in cache._read_file().items()})
+
+        self.assertIsNone(AccountCache(self.directory).get(BASE_URL, 'fake_api_key', ttl=60))
+
+    def test_invalidate(self):
+        cache = AccountCache(self.directory)
+        cache.set(BASE_URL, 'fake_api_key', False, ttl=60)
+        cache.invalidate(BASE_URL, 'fake_api_key')
+
+        self.assertIsNone(cache.get(BASE_URL, 'fake_api_key', ttl=60))
+
+
+class TestLazyCartoContext(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.account_cache = context._account_cache
+        context._account_cache = AccountCache(self.directory)
+
+    def tearDown(self):
+        context._account_cache = self.account_cache
+        shutil.rmtree(self.directory)
+
+    def test_lazy_context_uses_checked_account(self):
+        cc = CartoContext(base_url=BASE_URL, api_key='fake_api_key', lazy=True)
+        self.assertIsNone(cc._is_org)
+
+        context._account_cache.set(cc.creds.base_url(), 'fake_api_key', True)
+
+        self.assertTrue(cc.is_org)
+        self.assertEqual(cc.get_default_schema(), 'fake_username')
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+"""Unit tests for cartoframes.async_context"""
+import sys
+import threading
+import time
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from cartoframes.async_context import AsyncCartoContext
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'asyncio coroutines need Python 3.5+')
+class TestAsyncCartoContext(unittest.TestCase):
+    def setUp(self):
+        # without the network calls of CartoContext.__init__
+        self.context = AsyncCartoContext.__new__(AsyncCartoContext)
+        self.context._executor = ThreadPoolExecutor(max_workers=4)
+        self.threads = set()
+
+        def fetch(query, **kwargs):
+            self.threads.add(threading.current_thread().name)
+            time.sleep(0.2)
+            return query, kwargs
+
+        self.context.fetch = fetch
+
+    def tearDown(self):
+        self.context.close()
+
+    def run_in_loop(self, awaitable):
+        """Run the coroutine or future returned by `awaitable()` in a new event loop"""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            return loop.run_until_complete(awaitable())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    def test_afetch(self):
+        result = self.run_in_loop(lambda: self.context.afetch('SELECT 1', decode_geom=True))
+
+        self.assertEqual(result, ('SELECT 1', {'decode_geom': True}))
+
+    def test_afetch_concurrently(self):
+        queries = ['SELECT {}'.format(i) for i in range(4)]
+        results = self.run_in_loop(lambda: asyncio.gather(*[self.context.afetch(query) for query in queries]))
+
+        self.assertEqual([query for query, _ in results], queries)
+        self.assertEqual(len(self.threads), 4)
+
+    def test_adownload_needs_table_or_query(self):
+        with self.assertRaises(ValueError):
+            self.run_in_loop(self.context.adownload)
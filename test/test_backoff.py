@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+"""Unit tests for cartoframes.backoff"""
+import unittest
+
+from carto.exceptions import CartoException
+
+from cartoframes.backoff import Backoff, get_stats, reset_stats
+from cartoframes.data import dataset_info
+from cartoframes.data.dataset_info import DatasetInfo
+
+
+class NotFoundException(Exception):
+    pass
+
+
+class DatasetManagerMock(object):
+    def __init__(self, auth_client, not_found=2):
+        self.not_found = not_found
+
+    def get(self, table_name):
+        if self.not_found > 0:
+            self.not_found -= 1
+            raise NotFoundException()
+        return table_name
+
+
+class TestBackoff(unittest.TestCase):
+    def setUp(self):
+        reset_stats()
+
+    def test_delays(self):
+        backoff = Backoff('test', initial_delay=1, max_delay=4, multiplier=2)
+        delays = [backoff.next_delay() for _ in range(4)]
+
+        for delay, expected in zip(delays, [1, 2, 4, 4]):
+            self.assertTrue(expected / 2.0 <= delay <= expected)
+        self.assertEqual(backoff.retries, 4)
+
+    def test_retry_after(self):
+        backoff = Backoff('test', initial_delay=0.1)
+
+        self.assertGreaterEqual(backoff.next_delay(retry_after=3), 3)
+
+    def test_max_retries(self):
+        backoff = Backoff('test', initial_delay=0.001, max_retries=2)
+
+        self.assertTrue(backoff.sleep())
+        self.assertTrue(backoff.sleep())
+        self.assertFalse(backoff.sleep())
+
+    def test_deadline(self):
+        backoff = Backoff('test', initial_delay=1, deadline=0.5)
+
+        self.assertIsNone(backoff.next_delay())
+
+    def test_stats(self):
+        backoff = Backoff('test', initial_delay=0.001, max_retries=1)
+        backoff.sleep()
+        backoff.sleep()
+
+        stats = get_stats()['test']
+        self.assertEqual(stats['retries'], 1)
+        self.assertEqual(stats['exhausted'], 1)
+        self.assertGreater(stats['seconds'], 0)
+
+        reset_stats()
+        self.assertEqual(get_stats(), {})
+
+
+class ContextMock(object):
+    auth_client = None
+
+
+class TestMetadataBackoff(unittest.TestCase):
+    def setUp(self):
+        reset_stats()
+        self.original_manager = dataset_info.DatasetManager
+        dataset_info.DatasetManager = DatasetManagerMock
+
+    def tearDown(self):
+        dataset_info.DatasetManager = self.original_manager
+
+    def test_get_metadata_retries_not_found(self):
+        metadata = DatasetInfo.__new__(DatasetInfo)._get_metadata(ContextMock(), 'fake_table')
+
+        self.assertEqual(metadata, 'fake_table')
+        self.assertEqual(get_stats()['metadata']['retries'], 2)
+        self.assertLess(get_stats()['metadata']['seconds'], 1)
+
+    def test_get_metadata_deadline(self):
+        with self.assertRaises(CartoException):
+            DatasetInfo.__new__(DatasetInfo)._get_metadata(ContextMock(), 'fake_table', deadline=0)
+
+        self.assertEqual(get_stats()['metadata']['exhausted'], 1)
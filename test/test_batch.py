@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+"""Unit tests for cartoframes.batch"""
+import unittest
+
+from carto.exceptions import CartoException
+
+from cartoframes import batch
+from cartoframes.batch import BatchJob, wait_all
+
+
+class BatchSQLClientMock(object):
+    """Jobs that are `running` for `reads` status reads and then end with `status`"""
+    def __init__(self, reads=1, status='done'):
+        self.reads = reads
+        self.status = status
+        self.jobs = {}
+
+    def create(self, query):
+        job_id = str(len(self.jobs))
+        self.jobs[job_id] = 0
+        return {'job_id': job_id, 'status': 'pending', 'query': query}
+
+    def read(self, job_id):
+        self.jobs[job_id] += 1
+        if self.jobs[job_id] < self.reads:
+            return {'job_id': job_id, 'status': 'running'}
+        return {'job_id': job_id, 'status': self.status, 'failed_reason': 'syntax error'}
+
+    def cancel(self, job_id):
+        return 'cancelled'
+
+
+class ContextMock(object):
+    def __init__(self, client):
+        self.batch_sql_client = client
+
+
+class TestBatchJob(unittest.TestCase):
+    def setUp(self):
+        self.min_poll_seconds = batch.MIN_POLL_SECONDS
+        batch.MIN_POLL_SECONDS = 0.001
+
+    def tearDown(self):
+        batch.MIN_POLL_SECONDS = self.min_poll_seconds
+
+    def test_job_does_not_block(self):
+        job = BatchJob(ContextMock(BatchSQLClientMock(reads=2)), 'SELECT 1')
+
+        self.assertEqual(job.status, 'pending')
+        self.assertFalse(job.done())
+        self.assertTrue(job.done())
+
+    def test_wait(self):
+        finished = []
+        job = BatchJob(ContextMock(BatchSQLClientMock(reads=3)), 'SELECT 1', on_done=lambda: finished.append(1))
+
+        self.assertEqual(job.wait()['status'], 'done')
+        self.assertEqual(finished, [1])
+
+    def test_wait_failed_job(self):
+        job = BatchJob(ContextMock(BatchSQLClientMock(status='failed')), 'SELECT 1')
+
+        with self.assertRaises(CartoException):
+            job.wait()
+        self.assertEqual(job.wait(raise_errors=False)['failed_reason'], 'syntax error')
+
+    def test_wait_timeout(self):
+        job = BatchJob(ContextMock(BatchSQLClientMock(reads=100)), 'SELECT 1')
+
+        with self.assertRaises(CartoException):
+            job.wait(timeout=0.01)
+
+    def test_cancel(self):
+        job = BatchJob(ContextMock(BatchSQLClientMock()), 'SELECT 1')
+
+        self.assertEqual(job.cancel(), 'cancelled')
+        self.assertTrue(job.done())
+
+    def test_wait_all(self):
+        client = BatchSQLClientMock(reads=2)
+        jobs = [BatchJob(ContextMock(client), 'SELECT {}'.format(i)) for i in range(3)]
+
+        self.assertEqual([job['status'] for job in wait_all(jobs)], ['done'] * 3)
+        self.assertEqual(list(client.jobs.values()), [2, 2, 2])
@@ -3,7 +3,7 @@
 """Unit tests for cartoframes.columns"""
 import unittest
 
-from cartoframes.columns import Column, normalize_names, pg2dtypes
+from cartoframes.columns import Column, normalize_names, pg2dtypes, pg2compact_dtypes
 
 
 class TestColumns(unittest.TestCase):
@@ -82,3 +82,20 @@ class TestColumns(unittest.TestCase):
         for i in results:
             result = pg2dtypes(i)
             self.assertEqual(result, results[i])
+
+    def test_pg2compact_dtypes(self):
+        results = {
+            'int2': 'Int16',
+            'integer': 'Int32',
+            'bigint': 'Int64',
+            'real': 'float32',
+            'number': None,
+            'text': None
+        }
+        for i in results:
+            result = pg2compact_dtypes(i)
+            self.assertEqual(result, results[i])
+
+    def test_column_compact_dtype(self):
+        self.assertEqual(Column('a', pgtype='number', dbtype='int4').compact_dtype, 'Int32')
+        self.assertEqual(Column('a', pgtype='number').compact_dtype, 'float64')
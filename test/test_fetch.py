@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+"""Unit tests for cartoframes.context.CartoContext.fetch"""
+import unittest
+
+from mocks.api_mock import APIContextMock
+
+
+class TestFetch(unittest.TestCase):
+    def setUp(self):
+        self.context = APIContextMock(
+            fields={
+                'cartodb_id': {'type': 'number'},
+                'name': {'type': 'string'},
+                'value': {'type': 'number'},
+                'created': {'type': 'date'}
+            },
+            csv=('cartodb_id,name,value,created\n'
+                 '1,a,1.5,2019-01-01\n'
+                 '2,b,,2019-01-02\n'
+                 '3,c,3,\n'))
+
+    def test_fetch(self):
+        df = self.context.fetch('SELECT * FROM fake_table')
+
+        self.assertEqual(list(df.index), [1, 2, 3])
+        self.assertEqual(list(df.columns), ['name', 'value', 'created'])
+        self.assertTrue(str(df.dtypes['created']).startswith('datetime64'))
+
+    def test_fetch_chunksize(self):
+        chunks = list(self.context.fetch('SELECT * FROM fake_table', chunksize=2))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+        for chunk in chunks:
+            self.assertEqual(chunk.index.name, 'cartodb_id')
+            self.assertEqual(str(chunk.dtypes['value']), 'float64')
+            self.assertTrue(str(chunk.dtypes['created']).startswith('datetime64'))
+
+    def test_fetch_compact_dtypes(self):
+        context = APIContextMock(
+            fields={
+                'cartodb_id': {'type': 'number', 'pgtype': 'int4'},
+                'category': {'type': 'string', 'pgtype': 'text'},
+                'name': {'type': 'string', 'pgtype': 'text'},
+                'count': {'type': 'number', 'pgtype': 'int2'},
+                'value': {'type': 'number', 'pgtype': 'float4'}
+            },
+            csv=('cartodb_id,category,name,count,value\n'
+                 '1,a,x,1,1.5\n'
+                 '2,a,y,,2.5\n'
+                 '3,a,z,3,\n'))
+
+        df = context.fetch('SELECT * FROM fake_table', compact_dtypes=True)
+
+        self.assertEqual(str(df.index.dtype), 'int64')
+        self.assertEqual(str(df.dtypes['category']), 'category')
+        self.assertNotEqual(str(df.dtypes['name']), 'category')
+        self.assertEqual(str(df.dtypes['count']), 'Int16')
+        self.assertEqual(str(df.dtypes['value']), 'float32')
+        self.assertEqual(df['count'].isnull().sum(), 1)
+
+    def test_fetch_compact_dtypes_chunksize(self):
+        context = APIContextMock(
+            fields={
+                'cartodb_id': {'type': 'number', 'pgtype': 'int4'},
+                'name': {'type': 'string', 'pgtype': 'text'},
+                'count': {'type': 'number', 'pgtype': 'int2'}
+            },
+            csv=('cartodb_id,name,count\n'
+                 '1,a,1\n'
+                 '2,a,2\n'
+                 '3,b,\n'
+                 '4,c,4\n'))
+
+        chunks = list(context.fetch('SELECT * FROM fake_table', chunksize=2, compact_dtypes=True))
+
+        self.assertEqual(list(chunks[0].dtypes), list(chunks[1].dtypes))
+        self.assertNotEqual(str(chunks[0].dtypes['name']), 'category')
+        self.assertEqual(str(chunks[0].dtypes['count']), 'Int16')
+
+    def test_fetch_many(self):
+        dfs = self.context.fetch_many(['SELECT * FROM fake_table', 'SELECT * FROM other_table'], max_workers=2)
+
+        self.assertEqual(len(dfs), 2)
+        for df in dfs:
+            self.assertEqual(list(df.index), [1, 2, 3])
+            self.assertEqual(str(df.dtypes['value']), 'float64')
+        self.assertEqual(len(dfs.timings), 2)
+        self.assertEqual(len(self.context.copy_client.queries), 2)
+
+    def test_fetch_many_coalesce(self):
+        rows = {
+            'q0': [{'cartodb_id': 1, 'name': 'a', 'value': 1.5, 'created': '2019-01-01T00:00:00'},
+                   {'cartodb_id': 2, 'name': 'b', 'value': None, 'created': None}],
+            'q1': None
+        }
+        names = ['cartodb_id', 'name', 'value', 'created']
+        fields = {'q{}_{}'.format(i, j): self.context.sql_client.fields[name]
+                  for i in range(2) for j, name in enumerate(names)}
+
+        def sql_rows(query):
+            if 'json_object_keys' in query:
+                return [{'q0': names, 'q1': names}]
+            return [rows] if 'json_agg' in query else []
+
+        context = APIContextMock(fields=lambda query: fields if 'ON false' in query else {}, csv='', rows=sql_rows)
+        queries = ['SELECT * FROM fake_table', 'SELECT * FROM fake_table WHERE false']
+
+        dfs = context.fetch_many(queries, coalesce=True)
+
+        self.assertEqual(list(dfs[0].index), [1, 2])
+        self.assertEqual(list(dfs[0].columns), ['name', 'value', 'created'])
+        self.assertEqual(str(dfs[0].dtypes['value']), 'float64')
+        self.assertTrue(str(dfs[0].dtypes['created']).startswith('datetime64'))
+        self.assertEqual(len(dfs[1]), 0)
+        self.assertEqual(len(dfs.timings), 2)
+        self.assertEqual(context.copy_client.queries, [])
+        # the columns of both queries, their types and their rows
+        self.assertEqual(len(context.sql_client.queries), 3)
+        self.assertIn('_q1."created" AS q1_3', context.sql_client.queries[1])
+
+        context.fetch_many(queries, coalesce=True)
+        self.assertEqual(len(context.sql_client.queries), 4)
+
+    def test_fetch_many_coalesce_quotes_column_names(self):
+        fields = {'q0_0': {'type': 'string', 'pgtype': 'text'}}
+
+        def sql_rows(query):
+            if 'json_object_keys' in query:
+                return [{'q0': ['say "hi"']}]
+            return [{'q0': [{'say "hi"': 'hello'}]}] if 'json_agg' in query else []
+
+        context = APIContextMock(fields=lambda query: fields if 'ON false' in query else {}, csv='', rows=sql_rows)
+
+        dfs = context.fetch_many(['SELECT \'hello\' AS "say ""hi"""'], coalesce=True)
+
+        self.assertEqual(list(dfs[0]['say "hi"']), ['hello'])
+        self.assertIn('SELECT "say ""hi""" FROM', context.sql_client.queries[-1])
+
+    def test_fetch_many_coalesce_with_fetch_options_fails(self):
+        with self.assertRaises(ValueError):
+            self.context.fetch_many(['SELECT 1'], coalesce=True, format='binary')
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+"""Import time of the cartoframes package"""
+import subprocess
+import sys
+import unittest
+
+# heavy optional dependencies that are only imported by the features using them
+DEFERRED_MODULES = ['IPython', 'matplotlib', 'geopandas', 'shapely', 'jinja2']
+
+# microseconds `import cartoframes` may take, including pandas and the carto SDK
+IMPORT_TIME_BUDGET = 3000000
+
+
+def run_python(code, *options):
+    return subprocess.check_output([sys.executable] + list(options) + ['-c', code],
+                                   stderr=subprocess.STDOUT).decode('utf-8')
+
+
+class TestImport(unittest.TestCase):
+    def test_import_defers_heavy_modules(self):
+        output = run_python('import sys, cartoframes, cartoframes.viz; '
+                            'print(",".join(m for m in {} if m in sys.modules))'.format(DEFERRED_MODULES))
+
+        self.assertEqual(output.strip(), '')
+
+    @unittest.skipIf(sys.version_info < (3, 7), '-X importtime needs Python 3.7+')
+    def test_import_time(self):
+        output = run_python('import cartoframes', '-X', 'importtime')
+
+        # import time: self [us] | cumulative | imported package
+        cumulative = [int(line.split('|')[1]) for line in output.splitlines()
+                      if line.strip().endswith('| cartoframes')][0]
+        self.assertLess(cumulative, IMPORT_TIME_BUDGET)
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+"""Unit tests for cartoframes.session"""
+import unittest
+
+from requests import Session
+
+from cartoframes.session import create_session, RETRY_STATUS_CODES
+
+
+class TestCreateSession(unittest.TestCase):
+    def test_create_session(self):
+        session = create_session(pool_size=20, retries=5)
+        adapter = session.get_adapter('https://fake_username.carto.com/api/v2/sql')
+
+        self.assertEqual(adapter._pool_maxsize, 20)
+        self.assertEqual(adapter.max_retries.total, 5)
+        self.assertEqual(adapter.max_retries.read, 0)
+        self.assertEqual(tuple(adapter.max_retries.status_forcelist), RETRY_STATUS_CODES)
+        self.assertNotIn(429, adapter.max_retries.status_forcelist)
+
+    def test_create_session_keeps_settings(self):
+        session = Session()
+        session.verify = False
+
+        self.assertIs(create_session(session=session), session)
+        self.assertFalse(session.verify)
+        self.assertEqual(session.get_adapter('http://localhost/user/fake_username').max_retries.total, 3)